@@ -0,0 +1,293 @@
+"""Frozen copy of the per-parameter extractor the compiled engine replaced
+
+benchmark.py extraction runs it next to CompiledExtractionEngine to check
+that the engine still finds what it found, and to measure the speedup.
+Keep it as it is: it is the reference, not production code.
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MEDICAL_PATTERNS = {
+    "Hemoglobin": {
+        "patterns": [
+            r"Hemoglobin\s*(?:\(Hb\))?\s*[:\-\s]*(\d+\.?\d*)",
+            r"Hb\s*[:\-\s]*(\d+\.?\d*)",
+            r"Haemoglobin\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["hemoglobin", "hb", "haemoglobin", "hemoglobin (hb)"],
+        "unit": "g/dl",
+        "normal_range": "12-15",
+        "category": "Blood Counts"
+    },
+    "RBC": {
+        "patterns": [
+            r"Total\s+RBC\s+Count\s*[:\-\s]*(\d+\.?\d*)",
+            r"RBC\s+Count\s*[:\-\s]*(\d+\.?\d*)",
+            r"Red\s+Blood\s+Cell\s*[:\-\s]*(\d+\.?\d*)",
+            r"Total\s+RBC\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["total rbc count", "rbc count", "rbc", "red blood cell", "total rbc"],
+        "unit": "Millions/cumm",
+        "normal_range": "3.8-4.8",
+        "category": "Blood Counts"
+    },
+    "WBC": {
+        "patterns": [
+            r"Total\s+Leucocyte\s+Count\s*(?:\(TLC\))?\s*[:\-\s]*(\d+)",
+            r"TLC\s*[:\-\s]*(\d+)",
+            r"WBC\s*[:\-\s]*(\d+)",
+            r"White\s+Blood\s+Cell\s*[:\-\s]*(\d+)",
+            r"Total\s+Leukocyte\s+Count\s*[:\-\s]*(\d+)"
+        ],
+        "fuzzy_names": ["total leucocyte count", "tlc", "wbc", "white blood cell", "total leukocyte count"],
+        "unit": "Cells/cumm",
+        "normal_range": "4000-10000",
+        "category": "Blood Counts"
+    },
+    "Platelets": {
+        "patterns": [
+            r"Platelet\s+Count\s*[:\-\s]*(\d+\.?\d*)",
+            r"Platelets\s*[:\-\s]*(\d+\.?\d*)",
+            r"PLT\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["platelet count", "platelets", "plt"],
+        "unit": "Lakhs/cumm",
+        "normal_range": "1.5-4.5",
+        "category": "Blood Counts"
+    },
+    "PCV": {
+        "patterns": [
+            r"PCV\s*[:\-\s]*(\d+\.?\d*)",
+            r"Packed\s+Cell\s+Volume\s*[:\-\s]*(\d+\.?\d*)",
+            r"Hematocrit\s*[:\-\s]*(\d+\.?\d*)",
+            r"HCT\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["pcv", "packed cell volume", "hematocrit", "hct"],
+        "unit": "%",
+        "normal_range": "40-50",
+        "category": "Blood Counts"
+    },
+    "MCV": {
+        "patterns": [
+            r"MCV\s*[:\-\s]*(\d+\.?\d*)",
+            r"Mean\s+Cell\s+Volume\s*[:\-\s]*(\d+\.?\d*)",
+            r"Mcv\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["mcv", "mean cell volume"],
+        "unit": "fl",
+        "normal_range": "83-101",
+        "category": "Red Cell Indices"
+    },
+    "MCH": {
+        "patterns": [
+            r"MCH\s*[:\-\s]*(\d+\.?\d*)",
+            r"Mean\s+Cell\s+Hemoglobin\s*[:\-\s]*(\d+\.?\d*)",
+            r"Mch\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["mch", "mean cell hemoglobin"],
+        "unit": "pg",
+        "normal_range": "27-32",
+        "category": "Red Cell Indices"
+    },
+    "MCHC": {
+        "patterns": [
+            r"MCHC\s*[:\-\s]*(\d+\.?\d*)",
+            r"Mean\s+Cell\s+Hemoglobin\s+Concentration\s*[:\-\s]*(\d+\.?\d*)",
+            r"Mchc\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["mchc", "mean cell hemoglobin concentration"],
+        "unit": "g/dl",
+        "normal_range": "31.5-34.5",
+        "category": "Red Cell Indices"
+    },
+    "RDW-CV": {
+        "patterns": [
+            r"RDW-CV\s*[:\-\s]*(\d+\.?\d*)",
+            r"RDW\s*CV\s*[:\-\s]*(\d+\.?\d*)",
+            r"Red\s+Cell\s+Distribution\s+Width\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["rdw-cv", "rdw cv", "red cell distribution width", "rdw"],
+        "unit": "%",
+        "normal_range": "11.6-14.0",
+        "category": "Red Cell Indices"
+    },
+    "Polymorphs": {
+        "patterns": [
+            r"Polymorphs\s*[:\-\s]*(\d+\.?\d*)",
+            r"Neutrophils\s*[:\-\s]*(\d+\.?\d*)",
+            r"PMN\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["polymorphs", "neutrophils", "pmn"],
+        "unit": "%",
+        "normal_range": "40-80",
+        "category": "Differential Count"
+    },
+    "Lymphocytes": {
+        "patterns": [
+            r"Lymphocytes\s*[:\-\s]*(\d+\.?\d*)",
+            r"Lymphs\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["lymphocytes", "lymphs"],
+        "unit": "%",
+        "normal_range": "20-40",
+        "category": "Differential Count"
+    },
+    "Monocytes": {
+        "patterns": [
+            r"Monocytes\s*[:\-\s]*(\d+\.?\d*)",
+            r"Monos\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["monocytes", "monos"],
+        "unit": "%",
+        "normal_range": "2-10",
+        "category": "Differential Count"
+    },
+    "Eosinophils": {
+        "patterns": [
+            r"Eosinophils\s*[:\-\s]*(\d+\.?\d*)",
+            r"Eos\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["eosinophils", "eos"],
+        "unit": "%",
+        "normal_range": "1-6",
+        "category": "Differential Count"
+    },
+    "Basophils": {
+        "patterns": [
+            r"Basophils\s*[:\-\s]*(\d+\.?\d*)",
+            r"Basos\s*[:\-\s]*(\d+\.?\d*)"
+        ],
+        "fuzzy_names": ["basophils", "basos"],
+        "unit": "%",
+        "normal_range": "0-2",
+        "category": "Differential Count"
+    }
+}
+
+
+class BaselineExtractor:
+    """FuzzyParameterExtractor as it was before CompiledExtractionEngine, up to scan_text"""
+
+    def __init__(self):
+        self.medical_patterns = MEDICAL_PATTERNS
+
+    def preprocess_text(self, text: str) -> str:
+        """Clean and preprocess text for better matching"""
+        # Fix common OCR errors
+        replacements = {
+            '0': ['O', 'o', '°'],
+            '1': ['I', 'l', '|'],
+            '5': ['S', 's'],
+            '6': ['G', 'g'],
+            '8': ['B'],
+            '.': [','],
+            ':': [';'],
+            '-': ['—', '–', '_'],
+            '%': ['X', 'x'],
+            ' ': ['  ', '\t']
+        }
+
+        processed_text = text
+        for correct, wrong_list in replacements.items():
+            for wrong in wrong_list:
+                processed_text = processed_text.replace(wrong, correct)
+
+        return processed_text
+
+    def extract_value_near_parameter(self, text: str, param_name: str) -> Optional[float]:
+        """Extract value near a parameter name using context"""
+        lines = text.split('\n')
+
+        for i, line in enumerate(lines):
+            # Check if parameter name is in current line
+            if any(fuzzy_name.lower() in line.lower()
+                   for fuzzy_name in self.medical_patterns[param_name]["fuzzy_names"]):
+                # Look for value in current line and next few lines
+                search_lines = lines[i:i+3]  # Current and next 2 lines
+
+                for search_line in search_lines:
+                    # Find numbers in the line
+                    numbers = re.findall(r'\d+\.?\d*', search_line)
+                    for num_str in numbers:
+                        try:
+                            value = float(num_str)
+                            # Basic range validation to avoid extracting irrelevant numbers
+                            if self.is_reasonable_value(param_name, value):
+                                return value
+                        except ValueError:
+                            continue
+
+        return None
+
+    def is_reasonable_value(self, param_name: str, value: float) -> bool:
+        """Check if extracted value is within reasonable medical range"""
+        reasonable_ranges = {
+            "Hemoglobin": (5.0, 25.0),
+            "RBC": (1.0, 10.0),
+            "WBC": (1000, 50000),
+            "Platelets": (0.5, 10.0),
+            "PCV": (15.0, 70.0),
+            "MCV": (50.0, 150.0),
+            "MCH": (15.0, 50.0),
+            "MCHC": (25.0, 45.0),
+            "RDW-CV": (8.0, 25.0),
+            "Polymorphs": (10.0, 95.0),
+            "Lymphocytes": (5.0, 70.0),
+            "Monocytes": (0.0, 20.0),
+            "Eosinophils": (0.0, 15.0),
+            "Basophils": (0.0, 5.0)
+        }
+
+        if param_name in reasonable_ranges:
+            min_val, max_val = reasonable_ranges[param_name]
+            return min_val <= value <= max_val
+
+        return True  # If no range defined, accept value
+
+    def scan_text(self, text: str, best: Dict[str, Tuple[float, float]]) -> None:
+        """Update best (param -> (value, confidence)) with the matches found in one OCR text"""
+        processed_text = self.preprocess_text(text)
+
+        for param_name, config in self.medical_patterns.items():
+            best_value, best_confidence = best.get(param_name, (None, 0))
+
+            # Method 1: Try regex patterns
+            for pattern in config["patterns"]:
+                try:
+                    matches = re.finditer(pattern, processed_text, re.IGNORECASE)
+                    for match in matches:
+                        if match.group(1):
+                            try:
+                                value = float(match.group(1))
+                                if self.is_reasonable_value(param_name, value):
+                                    confidence = 0.9  # High confidence for regex match
+                                    if confidence > best_confidence:
+                                        best_value = value
+                                        best_confidence = confidence
+                            except ValueError:
+                                continue
+                except Exception as e:
+                    logger.warning(f"Regex pattern failed for {param_name}: {str(e)}")
+                    continue
+
+            # Method 2: Context-based extraction
+            if best_confidence < 0.8:  # Only if regex didn't find good match
+                context_value = self.extract_value_near_parameter(processed_text, param_name)
+                if context_value is not None:
+                    confidence = 0.7  # Medium confidence for context match
+                    if confidence > best_confidence:
+                        best_value = context_value
+                        best_confidence = confidence
+
+            if best_value is not None:
+                best[param_name] = (best_value, best_confidence)
+
+    def extract(self, texts: List[str]) -> Dict[str, Tuple[float, float]]:
+        """Best (value, confidence) per parameter over a report's texts"""
+        best = {}
+        for text in texts:
+            self.scan_text(text, best)
+        return best
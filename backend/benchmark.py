@@ -0,0 +1,913 @@
+"""Offline benchmarks for the report analysis pipeline
+
+Run from the backend directory, e.g.
+
+    python benchmark.py extraction
+    python benchmark.py backends
+    python benchmark.py predict
+    python benchmark.py decode
+    python benchmark.py history --patients 20000
+    python benchmark.py payload --reports 100
+    python benchmark.py concurrency --workers 1 2 4 --cpus 1 2 4 8
+    python benchmark.py near-duplicates --reports 20 --entries 100000
+    python benchmark.py crop --reports 50 --noise 6 --skew 1.5
+    python benchmark.py orientation --reports 20 --noise 6
+    python benchmark.py pipeline --reports 20 --noise 6 --skew 1.5 --save-baseline baseline.json
+    python benchmark.py pipeline --reports 20 --noise 6 --skew 1.5 --baseline baseline.json
+
+pipeline exits with status 1 when accuracy, latency or peak memory regress
+past the thresholds relative to the baseline, so it can gate CI. crop exits
+with status 1 when the results-region crop leaves out a report's label column,
+orientation when OSD at the configured cut-off turns any page the wrong way.
+extraction exits with status 1 when the compiled engine reads a random report
+differently from baseline_extractor.py where both should agree, when one of
+the documented divergences no longer holds, or when the engine's speedup over
+the baseline drops below --min-speedup.
+"""
+import argparse
+import asyncio
+import copy
+import gzip
+import json
+import math
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import ocr_backends
+from baseline_extractor import MEDICAL_PATTERNS, BaselineExtractor
+from catalog import FUZZY_LABEL_THRESHOLD, ReportCatalog, process
+from concurrency import OPENMP_VARIABLES, available_cpus
+from main import (CompiledExtractionEngine, EnhancedTextExtractor, FuzzyParameterExtractor, ImageNormalizer,
+                  PageOrienter, PerceptualHash, analyze_contents, build_summary, compact_result, decode_image,
+                  near_duplicate_index, report_catalog)
+from lab_history import LabHistory
+from lazy_imports import module_available
+from metrics import track_request
+from near_duplicates import NEAR_DUP_DHASH_DISTANCE, NEAR_DUP_PHASH_DISTANCE, MultiIndexHash, hamming
+from ocr_pool import OCRWorkerPool
+from predict import RiskModel
+from responses import GZIP_LEVEL, dumps_json, msgpack, orjson
+from synthetic_reports import (REPORT_LABELS, TABLE_COLUMNS, VALUE_RANGES, degrade, encode_report, format_value,
+                               render_cbc_report, values_match)
+
+OCR_NOISE = "Ol|SsGgBxX,;_—–°\t "
+
+# Look-alikes OCR prints for the characters of a value, which both extractors read back
+VALUE_SLIPS = {"0": "Oo°", "1": "Il|", "5": "Ss", "6": "Gg", "8": "B", ".": ","}
+
+# Where the compiled engine means to read a report differently from baseline_extractor.py:
+# one text each, with what the baseline and the engine find for the parameter
+DIVERGENCES = [
+    {"case": "label rewritten by the OCR fixes", "texts": ["Platelet Count: 2.5"], "param": "Platelets",
+     "baseline": None, "engine": (2.5, 0.9),
+     "reason": 'the baseline fixes look-alikes in the whole text, so "Platelet Count" becomes "P1ate1et C0unt" '
+               "and matches nothing; the catalog folds labels instead"},
+    {"case": "long label read by its short alias", "texts": ["Hemoglobin (Hb) 13.5 g/dl"], "param": "Hemoglobin",
+     "baseline": (13.5, 0.7), "engine": (13.5, 0.9),
+     "reason": 'only "hb" survives the baseline\'s fixes, as a context match; the engine reads the whole label'},
+    {"case": "alias inside a longer label", "texts": ["MCHC: 33.0"], "param": "MCH",
+     "baseline": (33.0, 0.7), "engine": None,
+     "reason": 'the baseline\'s context search finds "mch" anywhere in a line; aliases only match whole words'},
+    {"case": "value on the next line", "texts": ["Hb\n13.5"], "param": "Hemoglobin",
+     "baseline": (13.5, 0.9), "engine": (13.5, 0.7),
+     "reason": "the baseline's patterns let \\s cross the line break; a value below its label is a context match"},
+    {"case": "context runs into the next rows", "texts": ["PCV 5.5\nMCV 96.7\nMCH 34.0"], "param": "PCV",
+     "baseline": (34.0, 0.7), "engine": None,
+     "reason": "the baseline takes any plausible number from the two lines below, even another label's value; "
+               "the engine stops at the next label"},
+    {"case": "reference range", "texts": ["PCV O5.5 % 40-50"], "param": "PCV",
+     "baseline": (40.0, 0.7), "engine": None,
+     "reason": "the baseline reads the low end of a range as a value; the engine skips ranges"},
+    {"case": "digits inside a garbled token", "texts": ["Hb 1x.9 g/dl"], "param": "Hemoglobin",
+     "baseline": (9.0, 0.7), "engine": None,
+     "reason": 'the baseline picks "9" out of "1%.9"; the engine reads a token from its start or not at all'},
+    {"case": "unit in parentheses", "texts": ["Hb (g/dl) 13.5"], "param": "Hemoglobin",
+     "baseline": (6.0, 0.7), "engine": (13.5, 0.9),
+     "reason": 'the baseline turns "g/dl" into "6/d1" and reads the 6; the engine skips one parenthetical'},
+    {"case": "thousands separator", "texts": ["TLC 7,500"], "param": "WBC",
+     "baseline": None, "engine": (7500.0, 0.9),
+     "reason": 'the baseline turns the comma into a decimal point, and 7.5 is no leucocyte count'},
+    {"case": "two labels for one parameter", "texts": ["HCT 42.0\nPCV 40.1"], "param": "PCV",
+     "baseline": (40.1, 0.9), "engine": (42.0, 0.9),
+     "reason": "the baseline tries its patterns in list order; the engine takes the first label in the text"},
+    {"case": "value without a digit", "texts": ["pmn: sO"], "param": "Polymorphs",
+     "baseline": (50.0, 0.9), "engine": None,
+     "reason": 'the baseline reads "sO" as 50; the engine wants at least one real digit, as words are all letters'},
+]
+
+
+def synthetic_ocr_text(rng: random.Random, catalog: ReportCatalog, panel: str,
+                       noise: float = 0.03) -> Tuple[str, Dict[str, float]]:
+    """One OCR-like rendering of a panel's table with random values and character noise;
+    returns (text, golden values)"""
+    lines = ["CITY PATHOLOGY LAB", "Patient: Test Subject   Age: 34 Y   Sex: F", ""]
+    golden = {}
+    for param_name in catalog.panels[panel]["analytes"]:
+        if rng.random() < 0.15:
+            continue  # Some rows get lost by OCR
+        analyte = catalog.analytes[param_name]
+        low, high = analyte.plausible
+        value = round(rng.uniform(low, high), 1 if high < 1000 else 0)
+        golden[param_name] = value
+        separator = rng.choice([" ", " : ", ": ", "  ", "\t", " - "])
+        if rng.random() < 0.2:
+            separator = "\n"  # Label and value on separate lines, as with psm 4 on wide tables
+        lines.append(f"{rng.choice(analyte.aliases)}{separator}{value} {analyte.unit} {analyte.normal_range}")
+    text = "\n".join(lines)
+    return "".join(rng.choice(OCR_NOISE) if rng.random() < noise else char for char in text), golden
+
+
+def baseline_labels(baseline: BaselineExtractor) -> Dict[str, List[str]]:
+    """Labels whose value the baseline's own patterns read, by parameter; its OCR fixes garble the rest"""
+    labels = {}
+    for param_name, config in MEDICAL_PATTERNS.items():
+        value = format_value(param_name, VALUE_RANGES[param_name][0])
+        readable = [
+            label for label in dict.fromkeys(config["fuzzy_names"] + REPORT_LABELS[param_name])
+            if baseline.preprocess_text(label) == label
+            and baseline.extract([f"{label} {value}"]).get(param_name) == (float(value), 0.9)
+        ]
+        if readable:
+            labels[param_name] = readable
+    return labels
+
+
+def baseline_ocr_text(rng: random.Random, labels: Dict[str, List[str]]) -> str:
+    """One CBC table both extractors should read alike: labels the baseline knows, each with
+    its value on the same line and OCR look-alikes in some of the value's characters"""
+    lines = ["CITY PATHOLOGY LAB", "Patient: Test Subject   Age: 34 Y   Sex: F", ""]
+    for param_name, readable in labels.items():
+        low, high, decimals = VALUE_RANGES[param_name]
+        value = format_value(param_name, round(rng.uniform(low, high), decimals))
+        slipped = "".join(rng.choice(VALUE_SLIPS[char]) if char in VALUE_SLIPS and rng.random() < 0.1 else char
+                          for char in value)
+        if any(char.isdigit() for char in slipped):  # See "value without a digit" in DIVERGENCES
+            value = slipped
+        analyte = report_catalog.analytes[param_name]
+        tail = rng.choice(["", f" {analyte.unit}", f" {analyte.unit} {analyte.normal_range}"])
+        separator = rng.choice([" ", " : ", ": ", "  ", "\t", " - "])
+        lines.append(f"{rng.choice(readable)}{separator}{value}{tail}")
+    return "\n".join(lines)
+
+
+def compare_with_baseline(extractors: Dict[str, FuzzyParameterExtractor], reports: int, seed: int) -> int:
+    """Check each engine against baseline_extractor.py; returns the number of failed checks"""
+    baseline = BaselineExtractor()
+    labels = baseline_labels(baseline)
+    rng = random.Random(seed)
+    samples = [[baseline_ocr_text(rng, labels) for _ in range(rng.randint(1, 5))] for _ in range(reports)]
+    expected = [baseline.extract(texts) for texts in samples]
+    failures = 0
+
+    for name, extractor in extractors.items():
+        if extractor.catalog.fuzzy is not None and not module_available(process):
+            print(f"baseline, {name}: skipped, rapidfuzz is not installed")
+            continue
+
+        def read(texts: List[str]) -> Dict[str, Tuple[float, float]]:
+            best = {}
+            for text in texts:
+                extractor.engine.scan(text, best)
+            return {param_name: found for param_name, found in best.items() if param_name in MEDICAL_PATTERNS}
+
+        mismatches = [index for index, texts in enumerate(samples) if read(texts) != expected[index]]
+        print(f"baseline, {name}: {reports - len(mismatches)}/{reports} random reports read alike "
+              f"({len(labels)} of {len(MEDICAL_PATTERNS)} parameters have labels the baseline reads)")
+        for index in mismatches[:3]:
+            found = read(samples[index])
+            changed = sorted(key for key in expected[index].keys() | found.keys()
+                             if expected[index].get(key) != found.get(key))
+            print(f"  report {index}: " + ", ".join(f"{key} {expected[index].get(key)} -> {found.get(key)}"
+                                                     for key in changed))
+        failures += len(mismatches)
+
+        stale = []
+        for divergence in DIVERGENCES:
+            param_name = divergence["param"]
+            outcome = (baseline.extract(divergence["texts"]).get(param_name), read(divergence["texts"]).get(param_name))
+            if outcome != (divergence["baseline"], divergence["engine"]):
+                stale.append(divergence)
+                print(f"  divergence {divergence['case']!r}: expected baseline {divergence['baseline']}, "
+                      f"engine {divergence['engine']}; found {outcome[0]}, {outcome[1]}")
+        print(f"baseline, {name}: {len(DIVERGENCES) - len(stale)}/{len(DIVERGENCES)} documented divergences hold")
+        failures += len(stale)
+    return failures
+
+
+def time_call(fn: Callable[[], object], repeat: int) -> float:
+    """Best-of-three mean seconds per call"""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+
+def enlarged_catalog(rng: random.Random, extra_analytes: int) -> ReportCatalog:
+    """The shipped catalog plus made-up analytes, three aliases each"""
+    data = copy.deepcopy(report_catalog.data)
+    data["panels"]["Synthetic"] = {"name": "Synthetic Panel"}
+    for index in range(extra_analytes):
+        data["analytes"][f"Synthetic {index}"] = {
+            "panel": "Synthetic", "category": "Synthetic", "unit": "U/L", "normal_range": "1-2",
+            "plausible": [0, 1000000],
+            "aliases": [" ".join("".join(rng.choice("acdefhkmnprtuvwxyz") for _ in range(rng.randint(3, 9)))
+                                 for _ in range(rng.randint(1, 3))) for _ in range(3)],
+        }
+    return ReportCatalog(data)
+
+
+def bench_extraction(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    extractors = {
+        "exact": FuzzyParameterExtractor(ReportCatalog(report_catalog.data, fuzzy_threshold=101)),
+        "fuzzy": FuzzyParameterExtractor(),
+    }
+
+    # Accuracy against golden values, for every panel and noise level, with and without fuzzy labels
+    clean_misses = 0
+    for noise in (0.0, 0.02, 0.08):
+        samples = [
+            synthetic_ocr_text(rng, report_catalog, rng.choice(list(report_catalog.panels)), noise)
+            for _ in range(args.checks)
+        ]
+        total = sum(len(golden) for _, golden in samples)
+        scores = []
+        for name, extractor in extractors.items():
+            correct = 0
+            for text, golden in samples:
+                parameters = extractor.extract_parameters_fuzzy([text])[0]
+                correct += sum(
+                    1 for param_name, value in golden.items()
+                    if values_match(parameters.get(param_name, {}).get("value"), value)
+                )
+            if noise == 0.0:
+                clean_misses += total - correct
+            scores.append(f"{name} {correct}/{total} ({correct / max(total, 1):.1%})")
+        print(f"noise {noise:.2f}: " + ", ".join(scores))
+
+    baseline_failures = compare_with_baseline(extractors, args.baseline_reports, args.seed)
+
+    # One report's texts: the same page read by different passes, each with its own OCR slips
+    page_rng = random.Random(args.seed)
+    texts = [synthetic_ocr_text(random.Random(args.seed), report_catalog, "CBC", 0.0)[0] for _ in range(args.texts)]
+    texts = ["".join(page_rng.choice(OCR_NOISE) if page_rng.random() < 0.02 else char for char in text)
+             for text in texts]
+
+    def report_scanner(engine: CompiledExtractionEngine) -> Callable[[], None]:
+        def scan_report():
+            # Token, line and label reuse only within the report
+            engine.values.clear()
+            engine.line_labels.clear()
+            if engine.catalog.fuzzy is not None:
+                for matcher in [engine.catalog.fuzzy, *engine.catalog.panel_fuzzy.values()]:
+                    matcher.cache.clear()
+            for text in texts:
+                engine.scan(text, {})
+        return scan_report
+
+    # Cost per report against the extractor the engine replaced
+    baseline = BaselineExtractor()
+    baseline_seconds = time_call(lambda: baseline.extract(texts), max(args.repeat // 4, 1))
+    timings = [f"baseline {baseline_seconds * 1000:.2f} ms"]
+    # Fuzzy labels are extra work the baseline never did
+    min_speedups = {"exact": args.min_speedup, "fuzzy": args.min_fuzzy_speedup}
+    slow = []
+    for name, extractor in extractors.items():
+        seconds = time_call(report_scanner(extractor.engine), args.repeat)
+        timings.append(f"{name} {seconds * 1000:.2f} ms ({baseline_seconds / seconds:.1f}x)")
+        if baseline_seconds / seconds < min_speedups[name]:
+            slow.append(f"{name} below its {min_speedups[name]:.1f}x minimum speedup over the baseline")
+    print(f"{', '.join(timings)} per report of {args.texts} texts")
+    for message in slow:
+        print(f"  {message}")
+
+    # Cost per report as the catalog grows; fuzzy labels only score against the detected panels' aliases
+    for extra in (0, 500, 2000, 8000):
+        catalog = enlarged_catalog(rng, extra) if extra else report_catalog
+        timings = []
+        for name, threshold in (("exact", 101), ("fuzzy", FUZZY_LABEL_THRESHOLD)):
+            engine = FuzzyParameterExtractor(ReportCatalog(catalog.data, fuzzy_threshold=threshold)).engine
+            timings.append(f"{name} {time_call(report_scanner(engine), args.repeat) * 1000:.2f} ms")
+        print(f"{len(catalog.analytes):5d} analytes, {len(catalog.alias_analytes):5d} aliases: "
+              f"{', '.join(timings)} per report of {args.texts} texts")
+
+    return 1 if clean_misses or baseline_failures or slow else 0
+
+
+def bench_backends(args: argparse.Namespace) -> int:
+    img = cv2.cvtColor(render_cbc_report(random.Random(args.seed))[0], cv2.COLOR_BGR2GRAY)
+    configs = EnhancedTextExtractor.OCR_CONFIGS
+    candidates = {
+        "pytesseract": ocr_backends.PytesseractBackend,
+        "tesserocr": ocr_backends.TesserocrBackend,
+    }
+
+    results = {}
+    for name, backend_class in candidates.items():
+        try:
+            backend = backend_class()
+            backend.image_to_string(img, configs[0])  # Warm-up, and proves the backend works here
+        except Exception as e:
+            print(f"{name}: unavailable ({str(e).splitlines()[0]})")
+            continue
+        per_pass = time_call(lambda: [backend.image_to_string(img, config) for config in configs], args.repeat) / len(configs)
+        results[name] = per_pass
+        print(f"{name}: {per_pass * 1000:.1f} ms per pass over {len(configs)} configs")
+
+    if len(results) == 2:
+        print(f"tesserocr speedup: {results['pytesseract'] / results['tesserocr']:.2f}x")
+    return 0
+
+
+def bench_predict(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    model = RiskModel.load()
+    for size in args.sizes:
+        records = [{"Hb": round(rng.uniform(5, 18), 1)} for _ in range(size)]
+        batched = time_call(lambda: model.predict(records), args.repeat)
+
+        # The old predict_risk: one model.predict call per record, timed on a sample
+        sample = records[:args.per_record_sample]
+        per_record = time_call(lambda: [model.model.predict([[record["Hb"]]]) for record in sample], 1)
+        per_record *= size / len(sample)
+
+        print(f"{size} records: batched {batched * 1000:.2f} ms ({size / batched:,.0f} records/s), "
+              f"per-record {per_record * 1000:.2f} ms, speedup {per_record / batched:.1f}x")
+    return 0
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    """Peak bytes traced while fn runs (numpy and OpenCV arrays included)"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_decode(args: argparse.Namespace) -> int:
+    page = np.full((args.height, args.width, 3), 255, np.uint8)
+    y = 200
+    while y < args.height:
+        cv2.putText(page, "Hemoglobin (Hb)   13.5 g/dl   12-15", (150, y), cv2.FONT_HERSHEY_SIMPLEX, 4, (0, 0, 0), 8)
+        y += 250
+    contents = bytearray(cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    del page
+
+    full = lambda: cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    reduced = lambda: decode_image(contents)
+    for name, fn in (("full decode", full), ("reduced decode", reduced)):
+        seconds = time_call(fn, args.repeat)
+        print(f"{name}: {seconds * 1000:.1f} ms, peak {peak_memory(fn) / 2**20:.1f} MiB")
+    print(f"({args.width}x{args.height} JPEG, {len(contents) / 2**20:.1f} MiB upload)")
+    return 0
+
+
+def bench_history(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    path = os.path.join(tempfile.mkdtemp(), "lab_history.db")
+    history = LabHistory(path)
+    parameters = list(VALUE_RANGES)
+    now = time.time()
+
+    started = time.perf_counter()
+    for first in range(0, args.patients, 1000):
+        rows = []
+        for patient in range(first, min(first + 1000, args.patients)):
+            for report in range(args.reports):
+                taken = now - rng.uniform(0, 365 * 86400)
+                for name in parameters:
+                    low, high, decimals = VALUE_RANGES[name]
+                    rows.append((f"patient-{patient}", name, taken, f"report-{report}",
+                                 round(rng.uniform(low, high), decimals), None, 0.9))
+        history.record_many(rows)
+    rows_total = args.patients * args.reports * len(parameters)
+    print(f"loaded {rows_total} rows in {time.perf_counter() - started:.1f} s "
+          f"({os.path.getsize(path) / 2**20:.0f} MiB)")
+
+    samples = []
+    for _ in range(args.queries):
+        patient_id = f"patient-{rng.randrange(args.patients)}"
+        started = time.perf_counter()
+        history.trends(patient_id, ["Hemoglobin", "Platelets"])
+        samples.append(time.perf_counter() - started)
+    print(f"trends (2 parameters): mean {statistics.mean(samples) * 1000:.2f} ms, "
+          f"max {max(samples) * 1000:.2f} ms")
+
+    for label, since in (("30 days", now - 30 * 86400), ("all time", None)):
+        patients = history.cohort("Hemoglobin", below=10, since=since, limit=10 ** 9)
+        seconds = time_call(lambda: history.cohort("Hemoglobin", below=10, since=since, limit=10 ** 9), 1)
+        print(f"cohort Hb < 10, {label}: {len(patients)} patients in {seconds * 1000:.1f} ms")
+
+    history.close()
+    shutil.rmtree(os.path.dirname(path))
+    return 0
+
+
+async def run_pipeline(reports: List, args: argparse.Namespace) -> Dict:
+    """Analyze every synthetic report in-process and score it against its golden values"""
+    slots = asyncio.Semaphore(max(1, args.concurrency))
+    outcomes: List[Optional[Dict]] = [None] * len(reports)
+
+    async def analyze(index: int, filename: str, contents: bytes) -> None:
+        async with slots:
+            started = time.perf_counter()
+            with track_request() as timings:
+                try:
+                    result = await analyze_contents(contents, filename, args.mode, args.time_budget, cache=False)
+                    parameters = result["parameters"]
+                except Exception as e:
+                    print(f"{filename}: failed ({str(e)})")
+                    parameters = None
+            outcomes[index] = {"parameters": parameters, "seconds": time.perf_counter() - started,
+                               "timings": timings.as_dict()}
+
+    started = time.perf_counter()
+    await asyncio.gather(*(analyze(i, filename, contents) for i, (filename, contents, _) in enumerate(reports)))
+    wall = time.perf_counter() - started
+
+    # Peak memory of one report on its own, measured separately so tracing doesn't skew the timings
+    filename, contents, _ = reports[0]
+    tracemalloc.start()
+    try:
+        await analyze_contents(contents, filename, args.mode, args.time_budget, cache=False)
+    except Exception:
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    per_parameter = {name: {"correct": 0, "found": 0} for name in REPORT_LABELS}
+    stages: Dict[str, float] = {}
+    for outcome, (_, _, golden) in zip(outcomes, reports):
+        parameters = outcome["parameters"] or {}
+        for name, value in golden.items():
+            found = parameters.get(name, {}).get("value")
+            per_parameter[name]["found"] += found is not None
+            per_parameter[name]["correct"] += values_match(found, value)
+        for group in ("stages", "variants"):
+            for name, span in outcome["timings"].get(group, {}).items():
+                key = name if group == "stages" else f"variant:{name}"
+                stages[key] = stages.get(key, 0.0) + span["ms"]
+        stages["ocr"] = stages.get("ocr", 0.0) + sum(
+            span["ms"] for span in outcome["timings"].get("ocr_passes", {}).values()
+        )
+
+    total = len(reports) * len(REPORT_LABELS)
+    latencies = sorted(outcome["seconds"] * 1000 for outcome in outcomes)
+    return {
+        "reports": len(reports),
+        "mode": args.mode,
+        "options": {key: getattr(args, key) for key in ("font", "noise", "skew", "blur", "scale", "format", "seed")},
+        "failed_reports": sum(1 for outcome in outcomes if outcome["parameters"] is None),
+        "throughput_rps": round(len(reports) / wall, 3),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 1),
+            "p95": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 1),
+            "max": round(latencies[-1], 1)
+        },
+        "stage_ms_per_report": {name: round(ms / len(reports), 1) for name, ms in sorted(stages.items())},
+        "peak_memory_mib": round(peak / 2 ** 20, 1),
+        "accuracy": round(sum(p["correct"] for p in per_parameter.values()) / total, 4),
+        "found": round(sum(p["found"] for p in per_parameter.values()) / total, 4),
+        "parameter_accuracy": {
+            name: round(counts["correct"] / len(reports), 4) for name, counts in per_parameter.items()
+        }
+    }
+
+
+def synthetic_result(rng: random.Random, extractor: FuzzyParameterExtractor) -> Dict:
+    """An /analyze-report result for random values of one or two panels"""
+    panels = rng.sample(list(report_catalog.panels), rng.choice((1, 2)))
+    texts = [synthetic_ocr_text(rng, report_catalog, panel, 0.0)[0] for panel in panels]
+    parameters, categories, confidence_scores = extractor.extract_parameters_fuzzy(texts)
+    report_type = report_catalog.report_type(parameters)
+    return {
+        "status": "success",
+        "summary": build_summary(parameters, confidence_scores, report_type),
+        "report_type": report_type,
+        "patient": {"sex": "F", "age": 34},
+        "parameters": parameters,
+        "categories": categories,
+        "confidence_scores": confidence_scores,
+        "processing_info": {"images_processed": 4, "ocr_passes": 6, "ocr_stop_reason": "complete",
+                            "text_extractions": 6, "ocr_mode": "cascade", "cache": "miss",
+                            "total_patterns_tried": len(report_catalog.alias_analytes)},
+        "filename": f"report-{rng.randrange(10**6)}.jpg",
+    }
+
+
+def bench_payload(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    extractor = FuzzyParameterExtractor()
+    results = [synthetic_result(rng, extractor) for _ in range(args.reports)]
+
+    # The old path: jsonable_encoder then the stdlib encoder in JSONResponse
+    encoders = {"stdlib json": lambda content: JSONResponse(jsonable_encoder(content)).body,
+                "fast json": dumps_json}
+    if msgpack is not None:
+        encoders["msgpack"] = lambda content: msgpack.packb(content, use_bin_type=True)
+    print(f"orjson {'installed' if orjson is not None else 'missing'}, "
+          f"msgpack {'installed' if msgpack is not None else 'missing'}; {args.reports} reports")
+
+    baseline = None
+    for format_name, payloads in (("full", results), ("compact", [compact_result(result) for result in results])):
+        for encoder_name, encode in encoders.items():
+            bodies = [encode(payload) for payload in payloads]
+            seconds = time_call(lambda: [encode(payload) for payload in payloads], args.repeat) / len(payloads)
+            zipped = time_call(lambda: [gzip.compress(body, GZIP_LEVEL) for body in bodies], args.repeat) / len(payloads)
+            size = sum(len(body) for body in bodies) / len(bodies)
+            gzip_size = sum(len(gzip.compress(body, GZIP_LEVEL)) for body in bodies) / len(bodies)
+            baseline = baseline or (size, seconds)
+            print(f"{format_name:7s} {encoder_name:11s}: {size:8,.0f} B ({size / baseline[0]:.0%}), "
+                  f"{seconds * 1e6:7.1f} us ({baseline[1] / seconds:.1f}x); "
+                  f"gzip {gzip_size:6,.0f} B (+{zipped * 1e6:.1f} us)")
+
+    catalog_body = dumps_json({"fingerprint": report_catalog.fingerprint, **report_catalog.data})
+    print(f"/catalog: {len(catalog_body):,} B, gzip {len(gzip.compress(catalog_body, GZIP_LEVEL)):,} B, "
+          f"fetched once per catalog fingerprint")
+    return 0
+
+
+def bench_ocr_load(args: argparse.Namespace) -> int:
+    """One server worker's share of the concurrency load test; prints its timings as JSON"""
+    img = cv2.cvtColor(render_cbc_report(random.Random(args.seed))[0], cv2.COLOR_BGR2GRAY)
+    img = img[:img.shape[0] * 2 // 5]  # The results table's first rows keep each job short
+    config = EnhancedTextExtractor.OCR_CONFIGS[0]
+    backend = ocr_backends.get_backend()
+    backend.image_to_string(img, config)
+    pool = OCRWorkerPool()
+    started = time.time()
+    asyncio.run(pool.map(backend.image_to_string, [(img, config)] * args.jobs))
+    print(json.dumps({"started": started, "finished": time.time(), "jobs": args.jobs,
+                      "ocr_workers": pool.max_workers, "omp": os.environ.get("OMP_THREAD_LIMIT")}))
+    pool.shutdown()
+    return 0
+
+
+def bench_concurrency(args: argparse.Namespace) -> int:
+    """OCR throughput of several server workers on 1..n cores, with and without the governor
+
+    Ungoverned is the old sizing: every worker's pool has cpu_count()
+    workers and Tesseract uses as many OpenMP threads as it likes.
+    Cores are limited with CPU affinity and CPU_LIMIT, as a container's
+    cgroup would.
+    """
+    cpus_here = available_cpus()[0]
+    allowed = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(cpus_here))
+    core_counts = sorted({cpus for cpus in args.cpus if cpus <= cpus_here}) or [cpus_here]
+    if len(core_counts) < len(set(args.cpus)):
+        print(f"Only {cpus_here} CPU(s) here; skipping larger core counts")
+
+    for workers in args.workers:
+        base = None
+        for cpus in core_counts:
+            line = []
+            for policy in ("ungoverned", "governed"):
+                env = {key: value for key, value in os.environ.items()
+                       if key not in OPENMP_VARIABLES and key != "OCR_MAX_WORKERS"}
+                env.update({"WEB_CONCURRENCY": str(workers), "CPU_LIMIT": str(cpus), "WARMUP_MODE": "off"})
+                if policy == "ungoverned":
+                    host = str(os.cpu_count() or 1)
+                    env.update({"OCR_MAX_WORKERS": host, **{variable: host for variable in OPENMP_VARIABLES}})
+                cores = set(allowed[:cpus])
+                processes = [
+                    subprocess.Popen(
+                        [sys.executable, os.path.abspath(__file__), "ocr-load", "--jobs", str(args.jobs),
+                         "--seed", str(args.seed)],
+                        env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                        preexec_fn=(lambda: os.sched_setaffinity(0, cores)) if hasattr(os, "sched_setaffinity") else None
+                    )
+                    for _ in range(workers)
+                ]
+                reports = [json.loads(process.communicate()[0].decode().strip().splitlines()[-1])
+                           for process in processes]
+                wall = max(report["finished"] for report in reports) - min(report["started"] for report in reports)
+                throughput = workers * args.jobs / wall
+                if policy == "governed":
+                    base = base or throughput / cpus
+                    line.append(f"governed {throughput:.2f} jobs/s "
+                                f"({reports[0]['ocr_workers']} OCR workers x {reports[0]['omp']} threads, "
+                                f"{throughput / (base * cpus):.0%} of linear)")
+                else:
+                    line.append(f"ungoverned {throughput:.2f} jobs/s")
+            print(f"{workers} worker(s), {cpus} CPU(s): " + ", ".join(line))
+    return 0
+
+
+def rephotograph(img: np.ndarray, rng: random.Random, skew: float = 0.0, scale: float = 0.0) -> bytes:
+    """Another phone photo of the same page: shifted crop, exposure, noise and JPEG,
+    plus up to skew degrees of rotation and a resampling jitter of up to scale"""
+    h, w = img.shape[:2]
+    top, bottom, left, right = (rng.randint(0, 60) for _ in range(4))
+    img = cv2.copyMakeBorder(img, 40, 40, 40, 40, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+    img = img[top:h + 80 - bottom, left:w + 80 - right]
+    img = cv2.convertScaleAbs(img, alpha=rng.uniform(0.9, 1.1), beta=rng.uniform(-20, 10))
+    img = degrade(img, rng, noise=rng.uniform(0, 3), skew=skew, scale=rng.uniform(1 - scale, 1 + scale))
+    return encode_report(img, "jpg", rng.randint(75, 95))
+
+
+def page_hashes(contents: bytes) -> Tuple[int, int]:
+    """The hashes the pipeline computes for an upload"""
+    return PerceptualHash.hashes(decode_image(contents)[0])
+
+
+def bench_near_duplicates(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    pages = [render_cbc_report(rng)[0] for _ in range(args.reports)]
+    originals = [encode_report(page) for page in pages]
+    hashes = [page_hashes(contents) for contents in originals]
+
+    same, mates = [], []
+    for index, page in enumerate(pages):
+        for _ in range(args.photos):
+            phash, dhash = page_hashes(rephotograph(page, rng, skew=1.0, scale=0.1))
+            same.append((hamming(phash, hashes[index][0]), hamming(dhash, hashes[index][1])))
+        for other in range(index + 1, len(pages)):
+            mates.append((hamming(hashes[other][0], hashes[index][0]), hamming(hashes[other][1], hashes[index][1])))
+
+    def within(pairs: List[Tuple[int, int]]) -> float:
+        return sum(p <= NEAR_DUP_PHASH_DISTANCE and d <= NEAR_DUP_DHASH_DISTANCE for p, d in pairs) / len(pairs)
+
+    for label, pairs in (("re-photos of the same page", same), ("other reports, same template", mates)):
+        print(f"{label}: pHash {min(p for p, _ in pairs)}-{max(p for p, _ in pairs)}, "
+              f"dHash {min(d for _, d in pairs)}-{max(d for _, d in pairs)}, "
+              f"{within(pairs):.0%} within ({NEAR_DUP_PHASH_DISTANCE}, {NEAR_DUP_DHASH_DISTANCE})")
+
+    # Index lookups: multi-index radius search against a linear scan of the same hashes
+    keys = [rng.getrandbits(64) for _ in range(args.entries)]
+    index = MultiIndexHash()
+    for value, key in enumerate(keys):
+        index.add(key, value)
+    queries = [keys[rng.randrange(len(keys))] ^ (1 << rng.randrange(64)) for _ in range(args.queries)]
+    index_seconds = time_call(lambda: [index.search(query, NEAR_DUP_PHASH_DISTANCE) for query in queries], 1)
+    scan_seconds = time_call(
+        lambda: [[key for key in keys if hamming(query, key) <= NEAR_DUP_PHASH_DISTANCE] for query in queries], 1
+    )
+    print(f"lookup in {args.entries:,} hashes: multi-index {index_seconds / len(queries) * 1000:.2f} ms, "
+          f"linear scan {scan_seconds / len(queries) * 1000:.2f} ms ({scan_seconds / index_seconds:.0f}x)")
+
+    # End to end: analyze an original, then its re-photos and a template-mate. Every
+    # re-photo must be verified and reused, and the template-mate must not be
+    async def analyze(uploads: List[Tuple[str, bytes]]) -> Dict[str, str]:
+        outcomes = {}
+        for filename, contents in uploads:
+            started = time.perf_counter()
+            result = await analyze_contents(contents, filename)
+            info = result["processing_info"]
+            outcomes[filename] = info.get("cache")
+            print(f"{filename}: {time.perf_counter() - started:.2f} s, {info.get('ocr_passes')} OCR passes, "
+                  f"cache {info.get('cache')}, {len(result['parameters'])} parameters")
+        return outcomes
+
+    uploads = [("original.png", originals[0])]
+    uploads += [(f"photo-{i + 1}.jpg", rephotograph(pages[0], rng)) for i in range(args.photos)]
+    if len(originals) > 1:
+        uploads.append(("template-mate.png", originals[1]))
+    outcomes = asyncio.run(analyze(uploads))
+    print(f"index: {near_duplicate_index.stats()}")
+
+    regressions = [f"{filename} was not reused" for filename, cache in outcomes.items()
+                   if filename.startswith("photo-") and cache != "near_duplicate"]
+    if outcomes.get("template-mate.png") == "near_duplicate":
+        regressions.append("template-mate.png reused another report's result")
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+def bench_crop(args: argparse.Namespace) -> int:
+    """The results-region crop on degraded, re-exposed JPEGs; fails when a crop starts right of the labels"""
+    rng = random.Random(args.seed)
+    misses, cropped = [], 0
+    for i in range(args.reports):
+        img, _ = render_cbc_report(rng, font=args.font, noise=args.noise, skew=args.skew, scale=args.scale)
+        img = cv2.convertScaleAbs(img, alpha=rng.uniform(0.9, 1.1), beta=rng.uniform(-20, 10))
+        page, _ = decode_image(encode_report(img, "jpg", rng.randint(75, 95)))
+        _, info = ImageNormalizer.normalize(page, crop=True)
+        roi = info["roi"]
+        if roi is None:
+            continue
+        cropped += 1
+        # Rotation moves the label column's left edge by up to half the page height times sin(skew)
+        label_x = (TABLE_COLUMNS[0] + page.shape[0] / 2 * math.sin(math.radians(args.skew))) * args.scale
+        if roi["x"] > label_x:
+            misses.append(f"report {i}: crop starts at x={roi['x']}, labels at x<={label_x:.0f} ({roi})")
+    print(f"{cropped}/{args.reports} reports cropped, {len(misses)} without their label column")
+    for miss in misses:
+        print(f"REGRESSION: {miss}")
+    return 1 if misses else 0
+
+
+def bench_orientation(args: argparse.Namespace) -> int:
+    """OSD on re-exposed JPEGs of reports turned every quarter; scores the confidence cut-offs"""
+    rng = random.Random(args.seed)
+    # Counter-clockwise turn that rights the page -> how the upload is turned
+    upload_turns = {0: None, 90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+    samples = []
+    for _ in range(args.reports):
+        img, _ = render_cbc_report(rng, font=args.font, noise=args.noise, skew=args.skew)
+        img = cv2.convertScaleAbs(img, alpha=rng.uniform(0.9, 1.1), beta=rng.uniform(-20, 10))
+        for needed, code in upload_turns.items():
+            upload = img if code is None else cv2.rotate(img, code)
+            page, _ = decode_image(encode_report(upload, "jpg", rng.randint(75, 95)))
+            page, _ = ImageNormalizer.normalize(page, crop=False)
+            rotation = PageOrienter.detect_rotation(page)
+            samples.append((needed, rotation[0] if rotation else 0, rotation[1] if rotation else 0.0))
+
+    for needed in upload_turns:
+        confidences = sorted(round(c, 1) for n, d, c in samples if n == needed and d == needed)
+        wrong = sorted(round(c, 1) for n, d, c in samples if n == needed and d != needed)
+        print(f"needs {needed:3d}: OSD right {sum(1 for n, d, _ in samples if n == needed and d == needed)}/"
+              f"{args.reports} {confidences}, wrong at confidence {wrong}")
+
+    cutoffs = sorted({0.5, 1.0, 1.5, 2.0, 3.0, 5.0, PageOrienter.OSD_MIN_CONFIDENCE})
+    print("cut-off  turned right  turned wrong  left sideways")
+    wrong_at_default = 0
+    for cutoff in cutoffs:
+        turned = [(n, d) for n, d, c in samples if d in PageOrienter.ROTATIONS and c >= cutoff]
+        right = sum(1 for n, d in turned if n == d)
+        wrong = len(turned) - right
+        sideways = sum(1 for n, d, c in samples if n and not (d == n and c >= cutoff))
+        marker = " (OCR_OSD_MIN_CONFIDENCE)" if cutoff == PageOrienter.OSD_MIN_CONFIDENCE else ""
+        print(f"{cutoff:7.1f}  {right:12d}  {wrong:12d}  {sideways:13d}{marker}")
+        if cutoff == PageOrienter.OSD_MIN_CONFIDENCE:
+            wrong_at_default = wrong
+    if wrong_at_default:
+        print(f"REGRESSION: {wrong_at_default} pages turned the wrong way at the configured cut-off")
+    return 1 if wrong_at_default else 0
+
+
+def find_regressions(summary: Dict, baseline: Dict, args: argparse.Namespace) -> List[str]:
+    regressions = []
+    if summary["accuracy"] < baseline["accuracy"] - args.max_accuracy_drop:
+        regressions.append(f"accuracy {summary['accuracy']:.3f} < baseline {baseline['accuracy']:.3f}")
+    for name, accuracy in summary["parameter_accuracy"].items():
+        before = baseline.get("parameter_accuracy", {}).get(name)
+        if before is not None and accuracy < before - args.max_parameter_drop:
+            regressions.append(f"{name} accuracy {accuracy:.3f} < baseline {before:.3f}")
+    if summary["latency_ms"]["p50"] > baseline["latency_ms"]["p50"] * (1 + args.max_slowdown):
+        regressions.append(f"p50 latency {summary['latency_ms']['p50']} ms > baseline {baseline['latency_ms']['p50']} ms")
+    if summary["peak_memory_mib"] > baseline["peak_memory_mib"] * (1 + args.max_memory_growth):
+        regressions.append(f"peak memory {summary['peak_memory_mib']} MiB > baseline {baseline['peak_memory_mib']} MiB")
+    if baseline.get("options") != summary["options"] or baseline.get("reports") != summary["reports"]:
+        print("warning: baseline was recorded with different options")
+    return regressions
+
+
+def bench_pipeline(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    reports = []
+    for i in range(args.reports):
+        img, golden = render_cbc_report(rng, font=args.font, noise=args.noise, skew=args.skew,
+                                        blur=args.blur, scale=args.scale)
+        reports.append((f"synthetic-{i}.{args.format}", encode_report(img, args.format), golden))
+
+    summary = asyncio.run(run_pipeline(reports, args))
+    print(json.dumps(summary, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"baseline written to {args.save_baseline}")
+
+    regressions = []
+    if summary["accuracy"] < args.min_accuracy:
+        regressions.append(f"accuracy {summary['accuracy']:.3f} below minimum {args.min_accuracy:.3f}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions.extend(find_regressions(summary, json.load(f), args))
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extraction = subparsers.add_parser("extraction", help="catalog extraction accuracy and cost as the catalog grows")
+    extraction.add_argument("--texts", type=int, default=25, help="OCR texts per report")
+    extraction.add_argument("--repeat", type=int, default=20)
+    extraction.add_argument("--checks", type=int, default=500, help="random texts per noise level")
+    extraction.add_argument("--seed", type=int, default=7)
+    extraction.add_argument("--baseline-reports", type=int, default=3000,
+                            help="random reports compared with baseline_extractor.py")
+    extraction.add_argument("--min-speedup", type=float, default=3.0,
+                            help="fail when the exact engine is not this many times faster than the baseline")
+    extraction.add_argument("--min-fuzzy-speedup", type=float, default=1.5,
+                            help="the same for the engine with fuzzy labels")
+    extraction.set_defaults(func=bench_extraction)
+
+    backends = subparsers.add_parser("backends", help="pytesseract CLI calls vs warm tesserocr handles")
+    backends.add_argument("--repeat", type=int, default=3)
+    backends.add_argument("--seed", type=int, default=7)
+    backends.set_defaults(func=bench_backends)
+
+    predict = subparsers.add_parser("predict", help="batched /predict scoring vs one model call per record")
+    predict.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    predict.add_argument("--repeat", type=int, default=5)
+    predict.add_argument("--per-record-sample", type=int, default=200, help="records timed on the per-record path")
+    predict.add_argument("--seed", type=int, default=7)
+    predict.set_defaults(func=bench_predict)
+
+    decode = subparsers.add_parser("decode", help="full vs reduced-resolution JPEG decode")
+    decode.add_argument("--width", type=int, default=9000)
+    decode.add_argument("--height", type=int, default=12000)
+    decode.add_argument("--repeat", type=int, default=3)
+    decode.set_defaults(func=bench_decode)
+
+    history = subparsers.add_parser("history", help="lab history trend and cohort queries over a synthetic store")
+    history.add_argument("--patients", type=int, default=20000)
+    history.add_argument("--reports", type=int, default=8, help="reports per patient")
+    history.add_argument("--queries", type=int, default=200, help="trend lookups timed")
+    history.add_argument("--seed", type=int, default=7)
+    history.set_defaults(func=bench_history)
+
+    payload = subparsers.add_parser("payload", help="response size and serialization time per format and encoder")
+    payload.add_argument("--reports", type=int, default=100)
+    payload.add_argument("--repeat", type=int, default=5)
+    payload.add_argument("--seed", type=int, default=7)
+    payload.set_defaults(func=bench_payload)
+
+    concurrency = subparsers.add_parser("concurrency", help="OCR throughput as cores and server workers grow")
+    concurrency.add_argument("--workers", type=int, nargs="+", default=[1, 2], help="server worker processes")
+    concurrency.add_argument("--cpus", type=int, nargs="+", default=[1, 2, 4, 8])
+    concurrency.add_argument("--jobs", type=int, default=8, help="OCR jobs per worker")
+    concurrency.add_argument("--seed", type=int, default=7)
+    concurrency.set_defaults(func=bench_concurrency)
+
+    ocr_load = subparsers.add_parser("ocr-load", help="one worker of the concurrency load test (spawned by it)")
+    ocr_load.add_argument("--jobs", type=int, default=8)
+    ocr_load.add_argument("--seed", type=int, default=7)
+    ocr_load.set_defaults(func=bench_ocr_load)
+
+    near_duplicates = subparsers.add_parser("near-duplicates",
+                                            help="perceptual hash distances, index lookups and reuse of re-photos")
+    near_duplicates.add_argument("--reports", type=int, default=20)
+    near_duplicates.add_argument("--photos", type=int, default=3, help="re-photos per report")
+    near_duplicates.add_argument("--entries", type=int, default=100000, help="hashes in the lookup benchmark")
+    near_duplicates.add_argument("--queries", type=int, default=200)
+    near_duplicates.add_argument("--seed", type=int, default=7)
+    near_duplicates.set_defaults(func=bench_near_duplicates)
+
+    crop = subparsers.add_parser("crop", help="results-region crop on degraded JPEGs keeps the label column")
+    crop.add_argument("--reports", type=int, default=50)
+    crop.add_argument("--font", default="sans", help="sans, serif, mono, hershey or a .ttf path")
+    crop.add_argument("--noise", type=float, default=6.0, help="Gaussian noise sigma in grey levels")
+    crop.add_argument("--skew", type=float, default=1.5, help="max rotation in degrees")
+    crop.add_argument("--scale", type=float, default=1.0, help="resampling factor from 150 dpi")
+    crop.add_argument("--seed", type=int, default=7)
+    crop.set_defaults(func=bench_crop)
+
+    orientation = subparsers.add_parser("orientation", help="OSD quarter-turn accuracy per confidence cut-off")
+    orientation.add_argument("--reports", type=int, default=20)
+    orientation.add_argument("--font", default="sans", help="sans, serif, mono, hershey or a .ttf path")
+    orientation.add_argument("--noise", type=float, default=6.0, help="Gaussian noise sigma in grey levels")
+    orientation.add_argument("--skew", type=float, default=1.5, help="max rotation in degrees")
+    orientation.add_argument("--seed", type=int, default=7)
+    orientation.set_defaults(func=bench_orientation)
+
+    pipeline = subparsers.add_parser("pipeline", help="full in-process pipeline on synthetic CBC reports")
+    pipeline.add_argument("--reports", type=int, default=10)
+    pipeline.add_argument("--mode", default="cascade", choices=["cascade", "exhaustive", "layout", "table"])
+    pipeline.add_argument("--time-budget", type=float, default=20.0)
+    pipeline.add_argument("--concurrency", type=int, default=1, help="reports analyzed at once")
+    pipeline.add_argument("--font", default="sans", help="sans, serif, mono, hershey or a .ttf path")
+    pipeline.add_argument("--noise", type=float, default=0.0, help="Gaussian noise sigma in grey levels")
+    pipeline.add_argument("--skew", type=float, default=0.0, help="max rotation in degrees")
+    pipeline.add_argument("--blur", type=float, default=0.0, help="Gaussian blur sigma in pixels")
+    pipeline.add_argument("--scale", type=float, default=1.0, help="resampling factor from 150 dpi")
+    pipeline.add_argument("--format", default="png", choices=["png", "jpg"])
+    pipeline.add_argument("--seed", type=int, default=7)
+    pipeline.add_argument("--baseline", help="summary JSON to compare against")
+    pipeline.add_argument("--save-baseline", help="write this run's summary JSON here")
+    pipeline.add_argument("--min-accuracy", type=float, default=0.0)
+    pipeline.add_argument("--max-accuracy-drop", type=float, default=0.02)
+    pipeline.add_argument("--max-parameter-drop", type=float, default=0.1)
+    pipeline.add_argument("--max-slowdown", type=float, default=0.25, help="allowed p50 latency growth")
+    pipeline.add_argument("--max-memory-growth", type=float, default=0.25)
+    pipeline.set_defaults(func=bench_pipeline)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,456 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from lazy_imports import LazyModule, module_available
+
+logger = logging.getLogger(__name__)
+
+# Optional: labels only match exactly (after folding) when rapidfuzz isn't installed
+fuzz = LazyModule("rapidfuzz.fuzz")
+process = LazyModule("rapidfuzz.process")
+
+# Analytes, aliases, units, ranges and interpretations; REPORT_CATALOG can point at another file with the same layout
+REPORT_CATALOG = os.getenv("REPORT_CATALOG", str(Path(__file__).resolve().parent / "report_catalog.json"))
+
+# A panel counts as present on a report once this many of its analytes were found,
+# unless the panel sets its own min_matches (single-analyte panels like HbA1c)
+PANEL_MIN_MATCHES = int(os.getenv("PANEL_MIN_MATCHES", "2"))
+
+# Letters OCR mixes up with digits fold to the digit, so "Hem0globin" and
+# "HbAlc" still hit their aliases (the value fixes in OCR_REPLACEMENTS go the other way)
+LOOKALIKE_FOLD = str.maketrans({"o": "0", "i": "1", "l": "1", "|": "1", "s": "5", "g": "6", "b": "8"})
+
+# Label separators; any run of them matches a single space in an alias ("RDW-CV", "Total  RBC")
+LABEL_SPACES = frozenset(" \t-_–—")
+LABEL_SPACES_RE = re.compile("[" + re.escape("".join(sorted(LABEL_SPACES))) + "]+")
+
+# Minimum rapidfuzz ratio (0-100) for an OCR label to resolve to an alias; above 100 turns fuzzy matching off
+FUZZY_LABEL_THRESHOLD = float(os.getenv("FUZZY_LABEL_THRESHOLD", "85"))
+# Shorter labels ("hb", "eos") are too ambiguous to match fuzzily
+FUZZY_MIN_LABEL_LENGTH = int(os.getenv("FUZZY_MIN_LABEL_LENGTH", "4"))
+# Distinct characters whose folded form the alias matcher remembers
+FOLD_CACHE_SIZE = 4096
+# Labels whose match is remembered; the passes over one report mostly repeat the same labels
+FUZZY_CACHE_SIZE = int(os.getenv("FUZZY_CACHE_SIZE", "4096"))
+
+
+class CatalogError(Exception):
+    """Raised when the catalog file is malformed"""
+
+
+def fold(text: str) -> str:
+    """Lowercase with look-alikes folded; always as long as text, so offsets carry over"""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = "".join(char.lower()[:1] for char in text)
+    return lowered.translate(LOOKALIKE_FOLD)
+
+
+def canonical_alias(alias: str) -> str:
+    """Folded alias with separator runs collapsed, as the matcher sees it"""
+    return LABEL_SPACES_RE.sub(" ", fold(alias.strip())).strip()
+
+
+def parse_range(text: str) -> Tuple[Optional[float], Optional[float]]:
+    """(low, high) from "12-15", "<200" or ">40"; None for an open end"""
+    text = text.strip()
+    try:
+        if text.startswith("<"):
+            return None, float(text.lstrip("<=").strip())
+        if text.startswith(">"):
+            return float(text.lstrip(">=").strip()), None
+        low, high = text.split("-")
+        return float(low), float(high)
+    except ValueError:
+        raise CatalogError(f"Unreadable range: {text!r}")
+
+
+class AliasMatcher:
+    """Trie over the canonical form of every alias
+
+    The trie is compiled into one regex over ASCII text: each canonical
+    character becomes the class of ASCII characters that fold to it and
+    the word boundaries become lookarounds, so the scan runs in C. Other
+    characters in a text are first swapped for ASCII stand-ins that fold
+    the same way and are letters, digits or neither just like them. A text
+    with a character that has no stand-in walks the trie in Python from
+    each word start instead. Either way the cost per text does not grow
+    with the number of aliases in the catalog.
+    """
+
+    NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+
+    def __init__(self, aliases: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        # The alias ending at each node, if any
+        self.output: List[Optional[str]] = [None]
+        # "|" folds to "1"; other non-alphanumeric first characters are rare but allowed
+        first_chars = {"|"}
+
+        for alias in aliases:
+            node = 0
+            for char in alias:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.output.append(None)
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node] = alias
+            if alias and not alias[0].isalnum():
+                first_chars.add(alias[0])
+
+        self.word_start = re.compile(r"[^\W_]+|[" + re.escape("".join(sorted(first_chars))) + "]")
+        # Folded form of every character read so far (fold() one character at a time)
+        self.folded: Dict[str, str] = {}
+
+        # ASCII characters by what they fold to; a space stands for any run of separators
+        ascii_folds: Dict[str, List[str]] = {}
+        for code in range(128):
+            ascii_folds.setdefault(fold(chr(code)), []).append(chr(code))
+        ascii_folds[" "] = [char for char in LABEL_SPACES if char.isascii()]
+        self.ascii_folds = ascii_folds
+        self.ascii_classes = {
+            char: "[" + "".join(re.escape(member) for member in members) + "]" + ("+" if char == " " else "")
+            for char, members in ascii_folds.items()
+        }
+        pattern = self.node_pattern(0)
+        self.ascii_re = re.compile(r"(?<![A-Za-z0-9])" + pattern) if pattern is not None else None
+        # Matched text -> alias, since the same spellings recur across a report's texts
+        self.ascii_aliases: Dict[str, str] = {}
+
+        # ASCII characters matching no alias character, by (isalpha, isalnum)
+        alias_chars = {char for node in self.goto for char in node}
+        self.neutral: Dict[Tuple[bool, bool], str] = {}
+        for code in range(128):
+            char = chr(code)
+            if fold(char) not in alias_chars and fold(char) not in LABEL_SPACES:
+                self.neutral.setdefault((char.isalpha(), char.isalnum()), char)
+        self.alias_chars = alias_chars
+        self.stand_ins: Dict[str, Optional[str]] = {}
+
+    def node_pattern(self, node: int) -> Optional[str]:
+        """Regex for the aliases below a trie node, longest first; None if none can occur in ASCII text"""
+        branches = [
+            self.ascii_classes[char] + rest
+            for char, child in self.goto[node].items()
+            if char in self.ascii_classes and (rest := self.node_pattern(child)) is not None
+        ]
+        if self.output[node] is not None:
+            branches.append("(?![A-Za-z])")  # Ends here, unless a letter follows
+        if not branches:
+            return None
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """(start, end, alias) of the aliases standing as whole words in text, leftmost-longest
+
+        Offsets are into text. A value may follow an alias without a space
+        ("Hb13.5"), a letter may not; of the aliases starting at the same
+        place the longest wins, and hits never overlap.
+        """
+        ascii_text = text if text.isascii() else self.ascii_stand_in(text)
+        if ascii_text is not None:
+            return self.find_ascii(ascii_text)
+        goto, output, folded = self.goto, self.output, self.folded
+        length = len(text)
+        matches = []
+        last_end = 0
+        for word in self.word_start.finditer(text):
+            start = word.start()
+            if start < last_end:
+                continue  # Inside the previous hit, e.g. "hemoglobin" in "mean cell hemoglobin"
+            if start and text[start - 1].isalnum():
+                continue  # "|" right after a word
+            char = text[start]
+            node = goto[0].get(folded.get(char) or self.fold_char(char))
+            index = start
+            found = None
+            previous_space = False
+            while node is not None:
+                alias = output[node]
+                if alias is not None and (index + 1 >= length or not text[index + 1].isalpha()):
+                    found = (index + 1, alias)
+                # Next character, with a run of separators read as one space
+                index += 1
+                while index < length:
+                    char = text[index]
+                    char = folded.get(char) or self.fold_char(char)
+                    if char not in LABEL_SPACES:
+                        previous_space = False
+                        break
+                    if not previous_space:
+                        char = " "
+                        previous_space = True
+                        break
+                    index += 1
+                else:
+                    break
+                node = goto[node].get(char)
+            if found is not None:
+                matches.append((start, found[0], found[1]))
+                last_end = found[0]
+        return matches
+
+    def stand_in(self, char: str) -> Optional[str]:
+        """ASCII character the matcher treats exactly like char, or None"""
+        folded = fold(char)
+        kind = (char.isalpha(), char.isalnum())
+        if folded in LABEL_SPACES:
+            folded = " "
+        if folded in self.ascii_classes:
+            members = self.ascii_folds[folded]
+        elif folded in self.alias_chars:
+            return None
+        else:
+            members = self.neutral.values()
+        return next((member for member in members if (member.isalpha(), member.isalnum()) == kind), None)
+
+    def ascii_stand_in(self, text: str) -> Optional[str]:
+        """text with every non-ASCII character swapped for its stand-in; None if one has none"""
+        stand_ins = self.stand_ins
+        for char in set(self.NON_ASCII_RE.findall(text)):
+            if char not in stand_ins:
+                if len(stand_ins) > FOLD_CACHE_SIZE:
+                    stand_ins.clear()
+                stand_ins[char] = self.stand_in(char)
+            if stand_ins[char] is None:
+                return None
+        return self.NON_ASCII_RE.sub(lambda match: stand_ins[match.group()], text)
+
+    def find_ascii(self, text: str) -> List[Tuple[int, int, str]]:
+        matches = []
+        if self.ascii_re is None:
+            return matches
+        aliases = self.ascii_aliases
+        for match in self.ascii_re.finditer(text):
+            spelling = match.group()
+            alias = aliases.get(spelling)
+            if alias is None:
+                if len(aliases) > FOLD_CACHE_SIZE:
+                    aliases.clear()
+                alias = aliases[spelling] = canonical_alias(spelling)
+            matches.append((match.start(), match.end(), alias))
+        return matches
+
+    def fold_char(self, char: str) -> str:
+        if len(self.folded) > FOLD_CACHE_SIZE:
+            self.folded.clear()
+        self.folded[char] = folded = fold(char)
+        return folded
+
+
+class FuzzyLabelMatcher:
+    """Resolves OCR-mangled labels ("Haemoglobn", "Platelts") to aliases
+
+    All labels of a text are scored against every alias in one rapidfuzz
+    cdist call on the canonical forms, so one text costs a single
+    vectorized matrix computation rather than a Python loop per pair.
+    Labels already resolved (by earlier passes over the same page) skip
+    the matrix entirely.
+    """
+
+    def __init__(self, alias_analytes: Dict[str, FrozenSet[str]], threshold: float = FUZZY_LABEL_THRESHOLD,
+                 cache_size: int = FUZZY_CACHE_SIZE):
+        self.aliases = list(alias_analytes)
+        self.analytes = [alias_analytes[alias] for alias in self.aliases]
+        self.threshold = threshold
+        self.available: Optional[bool] = None
+        self.cache_size = cache_size
+        self.cache: Dict[str, Optional[Tuple[FrozenSet[str], float]]] = {}
+
+    def match(self, labels: List[str]) -> List[Optional[Tuple[FrozenSet[str], float]]]:
+        """(analytes, score) of the best alias for each canonical label, None below the threshold"""
+        if self.available is None:
+            self.available = module_available(process)
+            if not self.available:
+                logger.warning("rapidfuzz is not installed; fuzzy label matching is off")
+        if not labels or not self.available:
+            return [None] * len(labels)
+
+        cache = self.cache
+        resolved = {label: cache[label] for label in labels if label in cache}
+        new_labels = [label for label in dict.fromkeys(labels) if label not in resolved]
+        if new_labels:
+            scores = process.cdist(new_labels, self.aliases, scorer=fuzz.ratio,
+                                   score_cutoff=self.threshold, workers=1)
+            for label, row in zip(new_labels, scores):
+                column = int(row.argmax())
+                score = float(row[column])
+                resolved[label] = (self.analytes[column], score) if score >= self.threshold else None
+            if len(cache) + len(new_labels) > self.cache_size:
+                cache = self.cache = {}
+            cache.update((label, resolved[label]) for label in new_labels)
+        return [resolved[label] for label in labels]
+
+
+class Analyte:
+    """One catalog entry with its ranges parsed once"""
+
+    def __init__(self, name: str, entry: Dict, default_interpretations: Dict[str, str]):
+        try:
+            self.name = name
+            self.panel = entry["panel"]
+            self.category = entry["category"]
+            self.unit = entry["unit"]
+            self.normal_range = entry["normal_range"]
+            self.aliases: List[str] = entry["aliases"]
+            self.optional = entry.get("optional", False)
+            self.plausible = (float(entry["plausible"][0]), float(entry["plausible"][1]))
+            self.interpretations = {**default_interpretations, **entry.get("interpretations", {})}
+            # (sex, age_min, age_max, text, low, high); first match wins, the default range last
+            self.ranges = [
+                (item.get("sex"), item.get("age_min"), item.get("age_max"), item["range"]) + parse_range(item["range"])
+                for item in entry.get("ranges", [])
+            ]
+            self.ranges.append((None, None, None, self.normal_range) + parse_range(self.normal_range))
+        except (KeyError, IndexError, TypeError) as e:
+            raise CatalogError(f"Analyte {name}: missing or malformed {str(e)}")
+
+    def reference_range(self, sex: Optional[str] = None,
+                        age: Optional[float] = None) -> Tuple[str, Optional[float], Optional[float]]:
+        """(text, low, high) of the most specific range for the patient"""
+        for range_sex, age_min, age_max, text, low, high in self.ranges:
+            if range_sex is not None and range_sex != sex:
+                continue
+            if (age_min is not None or age_max is not None) and age is None:
+                continue
+            if age_min is not None and age < age_min or age_max is not None and age > age_max:
+                continue
+            return text, low, high
+        raise CatalogError(f"Analyte {self.name} has no default range")
+
+    @staticmethod
+    def status(value: float, low: Optional[float], high: Optional[float]) -> str:
+        if low is not None and value < low:
+            return "Low"
+        if high is not None and value > high:
+            return "High"
+        return "Normal"
+
+
+class ReportCatalog:
+    """The analyte catalog compiled for extraction
+
+    All aliases go into one AliasMatcher, and the plausibility bounds and
+    reference ranges are parsed into numbers up front. Panels (CBC, lipid
+    profile, LFT, ...) are detected from which of their analytes a report
+    contains.
+    """
+
+    def __init__(self, data: Dict, fuzzy_threshold: float = FUZZY_LABEL_THRESHOLD):
+        self.data = data
+        self.version = data.get("version")
+        # Keys compiled engines and cached results to this exact catalog and threshold
+        payload = json.dumps([data, fuzzy_threshold], sort_keys=True)
+        self.fingerprint = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+        defaults = data.get("default_interpretations", {})
+        self.panels: Dict[str, Dict] = {
+            key: {"name": panel["name"], "min_matches": panel.get("min_matches", PANEL_MIN_MATCHES), "analytes": []}
+            for key, panel in data.get("panels", {}).items()
+        }
+        self.analytes: Dict[str, Analyte] = {}
+        for name, entry in data.get("analytes", {}).items():
+            analyte = Analyte(name, entry, defaults)
+            if analyte.panel not in self.panels:
+                raise CatalogError(f"Analyte {name} names unknown panel {analyte.panel}")
+            self.analytes[name] = analyte
+            self.panels[analyte.panel]["analytes"].append(name)
+
+        # Canonical alias -> analytes it names (an alias may be shared)
+        alias_analytes: Dict[str, set] = {}
+        for name, analyte in self.analytes.items():
+            for alias in analyte.aliases:
+                canonical = canonical_alias(alias)
+                if canonical:
+                    alias_analytes.setdefault(canonical, set()).add(name)
+        self.alias_analytes: Dict[str, FrozenSet[str]] = {
+            alias: frozenset(names) for alias, names in alias_analytes.items()
+        }
+        self.matcher = AliasMatcher(self.alias_analytes)
+        # Fuzzy labels resolve within the panels a text's exact labels point to, or the whole catalog
+        self.fuzzy: Optional[FuzzyLabelMatcher] = None
+        self.panel_fuzzy: Dict[str, FuzzyLabelMatcher] = {}
+        if fuzzy_threshold <= 100:
+            self.fuzzy = FuzzyLabelMatcher(self.alias_analytes, fuzzy_threshold)
+            for panel, info in self.panels.items():
+                panel_aliases = {
+                    alias: names for alias, names in self.alias_analytes.items()
+                    if any(self.analytes[name].panel == panel for name in names)
+                }
+                self.panel_fuzzy[panel] = FuzzyLabelMatcher(panel_aliases, fuzzy_threshold)
+        self.plausible_bounds: Dict[str, Tuple[float, float]] = {
+            name: analyte.plausible for name, analyte in self.analytes.items()
+        }
+
+    @classmethod
+    def load(cls, path: str = REPORT_CATALOG) -> "ReportCatalog":
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CatalogError(f"Could not read catalog {path}: {str(e)}")
+        catalog = cls(data)
+        logger.info(f"Report catalog {path}: {len(catalog.analytes)} analytes in {len(catalog.panels)} panels, "
+                    f"{len(catalog.alias_analytes)} aliases")
+        return catalog
+
+    def is_plausible(self, name: str, value: float) -> bool:
+        bounds = self.plausible_bounds.get(name)
+        return bounds is None or bounds[0] <= value <= bounds[1]
+
+    def hits(self, text: str) -> List[Tuple[int, int, FrozenSet[str]]]:
+        """(start, end, analytes) of alias occurrences that stand as whole words, leftmost-longest"""
+        return [(start, end, self.alias_analytes[alias]) for start, end, alias in self.matcher.find(text)]
+
+    def fuzzy_match(self, labels: List[str],
+                    panels: Iterable[str] = ()) -> List[Optional[Tuple[FrozenSet[str], float]]]:
+        """Best fuzzy alias per canonical label among the panels' aliases (all aliases without panels)"""
+        matchers = [self.panel_fuzzy[panel] for panel in panels] or [self.fuzzy]
+        best: List[Optional[Tuple[FrozenSet[str], float]]] = [None] * len(labels)
+        for matcher in matchers:
+            for index, match in enumerate(matcher.match(labels)):
+                if match is not None and (best[index] is None or match[1] > best[index][1]):
+                    best[index] = match
+        return best
+
+    def panel_matches(self, found: Iterable[str]) -> Dict[str, int]:
+        """Found analytes per panel, for panels with at least one"""
+        counts: Dict[str, int] = {}
+        for name in found:
+            analyte = self.analytes.get(name)
+            if analyte is not None:
+                counts[analyte.panel] = counts.get(analyte.panel, 0) + 1
+        return counts
+
+    def detect_panels(self, found: Iterable[str]) -> List[str]:
+        """Panels present on the report, most matched analytes first"""
+        counts = self.panel_matches(found)
+        order = list(self.panels)
+        present = [panel for panel, count in counts.items() if count >= self.panels[panel]["min_matches"]]
+        return sorted(present, key=lambda panel: (-counts[panel], order.index(panel)))
+
+    def report_type(self, found: Iterable[str]) -> Dict:
+        found = list(found)
+        counts = self.panel_matches(found)
+        panels = self.detect_panels(found)
+        return {
+            "panel": panels[0] if panels else None,
+            "name": self.panels[panels[0]]["name"] if panels else None,
+            "panels": [
+                {"panel": panel, "name": self.panels[panel]["name"], "matched": counts[panel],
+                 "analytes": len(self.panels[panel]["analytes"])}
+                for panel in panels
+            ]
+        }
+
+    def expected(self, panels: Iterable[str]) -> List[str]:
+        """Analytes every report of these panels carries"""
+        return [
+            name for panel in panels for name in self.panels[panel]["analytes"]
+            if not self.analytes[name].optional
+        ]
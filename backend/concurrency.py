@@ -0,0 +1,122 @@
+import logging
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cores this container may use; detected from the cgroup quota and CPU affinity unless set
+CPU_LIMIT = os.getenv("CPU_LIMIT")
+# Server processes sharing those cores; uvicorn and gunicorn read the same variable for --workers
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Threads one Tesseract call (OpenMP) or one OpenCV stage may use
+OCR_THREADS_PER_JOB = int(os.getenv("OCR_THREADS_PER_JOB", "1"))
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+OPENMP_VARIABLES = ("OMP_THREAD_LIMIT", "OMP_NUM_THREADS")
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """CPUs allowed by the cgroup v2 or v1 CFS quota, or None when unlimited"""
+    cpu_max = _read(CGROUP_V2_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota, period = _read(CGROUP_V1_QUOTA), _read(CGROUP_V1_PERIOD)
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> Tuple[int, str]:
+    """(whole CPUs this process can keep busy, where the number came from)
+
+    os.cpu_count() reports the host's cores even inside a container
+    limited to two of them, which is what oversubscribes the OCR pool.
+    """
+    if CPU_LIMIT:
+        return max(1, math.floor(float(CPU_LIMIT))), "CPU_LIMIT"
+    cpus, source = os.cpu_count() or 1, "cpu_count"
+    if hasattr(os, "sched_getaffinity"):
+        affinity = len(os.sched_getaffinity(0))
+        if affinity < cpus:
+            cpus, source = affinity, "affinity"
+    quota = cgroup_cpu_quota()
+    if quota is not None and quota < cpus:
+        # A 1.5 CPU quota keeps one core busy and throttles the second
+        cpus, source = max(1, math.floor(quota)), "cgroup"
+    return cpus, source
+
+
+class ConcurrencyGovernor:
+    """Splits the available cores between server processes, OCR jobs and native threads
+
+    Every layer would otherwise size itself to the whole machine: each
+    uvicorn worker starts an OCR pool of cpu_count workers, and each
+    Tesseract call and OpenCV stage starts another cpu_count OpenMP or
+    OpenCV threads. Here each worker process gets cpus / workers cores, its
+    OCR pool runs cores / threads_per_job jobs at once, and every job is
+    limited to threads_per_job native threads, so the total stays at the
+    core count however many workers run.
+    """
+
+    def __init__(self, cpus: Optional[int] = None, workers: int = WEB_CONCURRENCY,
+                 threads_per_job: int = OCR_THREADS_PER_JOB):
+        if cpus is None:
+            self.cpus, self.cpu_source = available_cpus()
+        else:
+            self.cpus, self.cpu_source = max(1, cpus), "argument"
+        self.workers = max(1, workers)
+        self.cores_per_worker = max(1, self.cpus // self.workers)
+        self.threads_per_job = max(1, min(threads_per_job, self.cores_per_worker))
+        self.ocr_workers = max(1, self.cores_per_worker // self.threads_per_job)
+        self.opencv_threads = self.threads_per_job
+
+    def limit_openmp(self) -> None:
+        """Cap Tesseract's OpenMP threads; must run before libtesseract loads
+
+        The environment is also inherited by tesseract CLI subprocesses and
+        pool worker processes. Values already set explicitly are kept.
+        """
+        for variable in OPENMP_VARIABLES:
+            os.environ.setdefault(variable, str(self.threads_per_job))
+
+    def limit_opencv(self, cv2: Any) -> None:
+        """Cap OpenCV's own thread pool once cv2 is imported"""
+        cv2.setNumThreads(self.opencv_threads)
+        logger.info(f"OpenCV limited to {self.opencv_threads} threads")
+
+    def threads_planned(self, ocr_workers: Optional[int] = None) -> int:
+        """Native threads all server processes may run at once with this OCR pool size"""
+        return self.workers * (ocr_workers or self.ocr_workers) * self.threads_per_job
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "cpus": self.cpus,
+            "cpu_source": self.cpu_source,
+            "cpu_count": os.cpu_count(),
+            "cgroup_quota": cgroup_cpu_quota(),
+            "workers": self.workers,
+            "cores_per_worker": self.cores_per_worker,
+            "ocr_workers": self.ocr_workers,
+            "threads_per_job": self.threads_per_job,
+            "opencv_threads": self.opencv_threads,
+            "environment": {variable: os.environ.get(variable) for variable in OPENMP_VARIABLES},
+        }
+
+
+# One plan per process, shared by the OCR pool, the OCR backends and main
+governor = ConcurrencyGovernor()
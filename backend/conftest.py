@@ -0,0 +1,25 @@
+"""Settings for the pytest suite in tests/; run `python -m pytest` from the backend directory"""
+import os
+import tempfile
+
+import pytest
+
+# Keep the suite away from the real databases and skip the OCR warm-up on startup
+_state_dir = tempfile.mkdtemp(prefix="report-analyzer-tests-")
+os.environ["JOB_DB"] = os.path.join(_state_dir, "jobs.db")
+os.environ["LAB_HISTORY_DB"] = os.path.join(_state_dir, "lab_history.db")
+os.environ["RESULT_CACHE_DB"] = ""
+os.environ["WARMUP_MODE"] = "off"
+
+# Manual script against a running server, not a test module
+collect_ignore = ["test_api.py"]
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with its startup run, shared by the API tests"""
+    from fastapi.testclient import TestClient
+
+    from main import app
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Optional
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# Seconds a request may take end to end, unless the client asks for less
+# (?deadline= or the X-Request-Timeout header); never more than the maximum
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "120"))
+REQUEST_DEADLINE_MAX_S = float(os.getenv("REQUEST_DEADLINE_MAX_S", "600"))
+DEADLINE_HEADER = "x-request-timeout"
+# How often the watcher checks the deadline and whether the client is still connected
+DISCONNECT_POLL_S = float(os.getenv("DISCONNECT_POLL_S", "0.5"))
+
+
+class RequestAborted(Exception):
+    """The request's deadline passed (reason "deadline") or its client left (reason "disconnected")"""
+
+    def __init__(self, reason: str, stage: Optional[str] = None):
+        self.reason = reason
+        self.stage = stage
+        super().__init__(f"{reason} during {stage or 'analysis'}")
+
+
+class Deadline:
+    """A request's time limit plus its client connection, checked between stages
+
+    run() additionally watches both while a stage is in flight and
+    cancels it the moment either gives out, so queued OCR jobs never
+    start. OCR calls get remaining() as their own timeout, so Tesseract
+    stops at the deadline instead of finishing a pass for nobody.
+    """
+
+    def __init__(self, seconds: float = REQUEST_DEADLINE_S, request: Optional[Request] = None):
+        self.seconds = max(0.0, min(seconds, REQUEST_DEADLINE_MAX_S))
+        self.expires = time.monotonic() + self.seconds
+        self.request = request
+        self.stage: Optional[str] = None
+
+    @classmethod
+    def for_request(cls, request: Request, seconds: Optional[float] = None) -> "Deadline":
+        """From the deadline query parameter, else the X-Request-Timeout header, else the server default
+
+        Raises ValueError for a header that is not a positive number of seconds.
+        """
+        if seconds is None and request.headers.get(DEADLINE_HEADER):
+            seconds = float(request.headers[DEADLINE_HEADER])
+        if seconds is None:
+            seconds = REQUEST_DEADLINE_S
+        if not seconds > 0:
+            raise ValueError("deadline must be a positive number of seconds")
+        return cls(seconds, request)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    async def abort_reason(self) -> Optional[str]:
+        if self.expired:
+            return "deadline"
+        if self.request is not None and await self.request.is_disconnected():
+            return "disconnected"
+        return None
+
+    async def check(self, stage: Optional[str] = None) -> None:
+        """Raise RequestAborted if the deadline passed or the client left"""
+        if stage is not None:
+            self.stage = stage
+        reason = await self.abort_reason()
+        if reason is not None:
+            raise RequestAborted(reason, self.stage)
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """Await a stage, cancelling it (and the OCR jobs it queued) when the deadline passes
+        or the client disconnects; raises RequestAborted then"""
+        task = asyncio.ensure_future(awaitable)
+        reason = None
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=max(0.01, min(DISCONNECT_POLL_S, self.remaining())))
+                if not task.done():
+                    reason = await self.abort_reason()
+                    if reason is not None:
+                        break
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if reason is not None:
+            logger.info(f"Stopped after {self.seconds - self.remaining():.1f}s: {reason} during {self.stage}")
+            raise RequestAborted(reason, self.stage)
+        return task.result()
@@ -0,0 +1,283 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Queue configuration; the database lives next to this file unless JOB_DB says otherwise
+JOB_DB = os.getenv("JOB_DB", str(Path(__file__).resolve().parent / "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "500"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", str(24 * 3600)))
+# A running job belongs to its process until this long after the last heartbeat;
+# only then may another process (or a restart) requeue it
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "60"))
+# A running job's progress is written at most this often, plus at every stage change
+JOB_PROGRESS_INTERVAL_S = float(os.getenv("JOB_PROGRESS_INTERVAL_S", "0.25"))
+
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class JobStore:
+    """Durable report-analysis jobs in a local SQLite file
+
+    Jobs keep their upload bytes until they finish, so queued and
+    interrupted jobs survive a restart. claim() hands each queued job to
+    exactly one worker, also across processes sharing the file. A claimed
+    job carries its store's owner id and a lease that heartbeat() extends;
+    recover() only requeues jobs whose lease ran out, so a restarting
+    worker leaves the jobs of live ones alone.
+    """
+
+    def __init__(self, path: str = JOB_DB, max_queued: int = JOB_MAX_QUEUED,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, ttl_seconds: float = JOB_TTL_S,
+                 lease_seconds: float = JOB_LEASE_S):
+        self.path = path
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        # Unique per process start, so a restarted process never mistakes old leases for its own
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use so importing main stays cheap"""
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, options TEXT NOT NULL,"
+                " payload BLOB, content_hash TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+                " created REAL NOT NULL, started REAL, finished REAL,"
+                " progress TEXT, result TEXT, error TEXT, owner TEXT, lease_until REAL)"
+            )
+            # Databases from before leases; their running jobs count as expired
+            columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+            self._db = db
+            logger.info(f"Job store at {self.path}")
+        return self._db
+
+    def recover(self) -> int:
+        """Requeue running jobs whose lease expired (their process died); returns how many"""
+        expired = "status = 'running' AND (lease_until IS NULL OR lease_until < ?)"
+        with self._lock:
+            db = self._connect()
+            now = time.time()
+            db.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, payload = NULL, owner = NULL,"
+                " error = '{\"status_code\": 500, \"detail\": \"Job interrupted too many times\"}'"
+                f" WHERE {expired} AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            cursor = db.execute(
+                f"UPDATE jobs SET status = 'queued', started = NULL, owner = NULL, lease_until = NULL WHERE {expired}",
+                (now,)
+            )
+            if cursor.rowcount:
+                logger.info(f"Requeued {cursor.rowcount} interrupted jobs")
+            return cursor.rowcount
+
+    def submit(self, filename: str, contents: bytes, options: Dict[str, Any],
+               content_hash: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            db = self._connect()
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise JobQueueFullError(f"Job queue is full ({queued} jobs waiting)")
+            db.execute(
+                "INSERT INTO jobs (id, status, filename, options, payload, content_hash, created)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, filename, json.dumps(options), bytes(contents), content_hash, time.time())
+            )
+        return job_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running and return it with its payload"""
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, filename, options, payload, content_hash FROM jobs"
+                    " WHERE status = 'queued' ORDER BY created LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                now = time.time()
+                db.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, attempts = attempts + 1,"
+                    " owner = ?, lease_until = ? WHERE id = ?",
+                    (now, self.owner, now + self.lease_seconds, row[0])
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        job_id, filename, options, payload, content_hash = row
+        return {"id": job_id, "filename": filename, "options": json.loads(options),
+                "payload": payload, "content_hash": content_hash}
+
+    def heartbeat(self) -> int:
+        """Extend the lease of every job this store is running; returns how many"""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + self.lease_seconds, self.owner)
+            )
+            return cursor.rowcount
+
+    def set_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        with self._lock:
+            self._connect().execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = 'done', finished = ?, result = ?, payload = NULL WHERE id = ?",
+                (time.time(), json.dumps(result), job_id)
+            )
+
+    def fail(self, job_id: str, status_code: int, detail: str) -> None:
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, error = ?, payload = NULL WHERE id = ?",
+                (time.time(), json.dumps({"status_code": status_code, "detail": detail}), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, status, filename, options, created, started, finished, progress, result, error,"
+                " (SELECT COUNT(*) FROM jobs AS earlier WHERE earlier.status = 'queued'"
+                "  AND earlier.created < jobs.created)"
+                " FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        (job_id, status, filename, options, created, started, finished,
+         progress, result, error, ahead) = row
+        job = {
+            "job_id": job_id,
+            "status": status,
+            "filename": filename,
+            "options": json.loads(options),
+            "created": created,
+            "started": started,
+            "finished": finished,
+            "progress": json.loads(progress) if progress else None,
+        }
+        if status == "queued":
+            job["queue_position"] = ahead + 1
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = json.loads(error)
+        return job
+
+    def purge(self) -> int:
+        """Drop finished jobs older than the TTL"""
+        if self.ttl_seconds <= 0:
+            return 0
+        with self._lock:
+            cursor = self._connect().execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class ProgressWriter:
+    """Throttled progress writes for one running job, kept off the event loop
+
+    update() is the analysis' progress callback and only stores the
+    latest progress. One drain task writes it through the thread pool
+    when the stage changes, otherwise at most every interval seconds,
+    so a slow or contended SQLite write never stalls other requests.
+    close() writes whatever is still pending and stops the task.
+    """
+
+    def __init__(self, store: JobStore, job_id: str, interval: float = JOB_PROGRESS_INTERVAL_S):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self.writes = 0
+        self._pending: Optional[Dict[str, Any]] = None
+        self._urgent = False
+        self._stage: Optional[str] = None
+        self._written = float("-inf")
+        self._closing = False
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, progress: Dict[str, Any]) -> None:
+        self._pending = progress
+        if progress.get("stage") != self._stage:
+            self._stage = progress.get("stage")
+            self._urgent = True
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+        self._wake.set()
+
+    async def _drain(self) -> None:
+        while not (self._closing and self._pending is None):
+            if self._pending is None:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            delay = self.interval - (time.monotonic() - self._written)
+            if delay > 0 and not (self._urgent or self._closing):
+                # Woken early by a stage change or close()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                self._wake.clear()
+                continue
+            progress, self._pending, self._urgent = self._pending, None, False
+            try:
+                await run_in_threadpool(self.store.set_progress, self.job_id, progress)
+                self.writes += 1
+            except Exception as e:
+                logger.warning(f"Could not save progress of job {self.job_id}: {str(e)}")
+            self._written = time.monotonic()
+
+    async def close(self) -> None:
+        self._closing = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
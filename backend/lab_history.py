@@ -0,0 +1,170 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Parameters of every report analyzed with a patient id; the database lives next to
+# this file unless LAB_HISTORY_DB says otherwise
+LAB_HISTORY_DB = os.getenv("LAB_HISTORY_DB", str(Path(__file__).resolve().parent / "lab_history.db"))
+LAB_HISTORY_MAX_POINTS = int(os.getenv("LAB_HISTORY_MAX_POINTS", "1000"))
+LAB_HISTORY_MAX_PATIENTS = int(os.getenv("LAB_HISTORY_MAX_PATIENTS", "1000"))
+
+
+def parse_report_date(text: Optional[str]) -> float:
+    """Epoch seconds from an ISO date or date-time (UTC unless it says otherwise); now when missing"""
+    if not text:
+        return time.time()
+    taken = datetime.fromisoformat(text)
+    if taken.tzinfo is None:
+        taken = taken.replace(tzinfo=timezone.utc)
+    return taken.timestamp()
+
+
+def format_date(taken: float) -> str:
+    return datetime.fromtimestamp(taken, timezone.utc).isoformat()
+
+
+class LabHistory:
+    """Lab values per patient, parameter and report date in a local SQLite file
+
+    results is a WITHOUT ROWID table clustered on (patient, parameter,
+    date), so one patient's trend is a single contiguous range read. The
+    (parameter, date, value) index serves cohort queries such as "Hb
+    below 10 in the last 30 days" without touching other parameters.
+    Re-recording a report for the same patient replaces its values.
+    """
+
+    def __init__(self, path: str = LAB_HISTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use so importing main stays cheap"""
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                " patient_id TEXT NOT NULL, report_id TEXT NOT NULL, taken REAL NOT NULL,"
+                " filename TEXT, report_type TEXT, created REAL NOT NULL,"
+                " PRIMARY KEY (patient_id, report_id)) WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " patient_id TEXT NOT NULL, parameter TEXT NOT NULL, taken REAL NOT NULL, report_id TEXT NOT NULL,"
+                " value REAL NOT NULL, status TEXT, confidence REAL,"
+                " PRIMARY KEY (patient_id, parameter, taken, report_id)) WITHOUT ROWID"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS results_parameter_taken ON results (parameter, taken, value)")
+            self._db = db
+            logger.info(f"Lab history at {self.path}")
+        return self._db
+
+    def record(self, patient_id: str, report_id: str, taken: float, result: Dict[str, Any],
+               filename: Optional[str] = None) -> int:
+        """Store a report's extracted parameters for the patient; returns how many were stored"""
+        report_type = (result.get("report_type") or {}).get("panel")
+        rows = [
+            (patient_id, name, taken, report_id, float(parameter["value"]),
+             parameter.get("status"), parameter.get("confidence"))
+            for name, parameter in result.get("parameters", {}).items()
+        ]
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                previous = db.execute(
+                    "SELECT taken FROM reports WHERE patient_id = ? AND report_id = ?", (patient_id, report_id)
+                ).fetchone()
+                if previous is not None:
+                    db.execute(
+                        "DELETE FROM results WHERE patient_id = ? AND taken = ? AND report_id = ?",
+                        (patient_id, previous[0], report_id)
+                    )
+                db.execute(
+                    "INSERT OR REPLACE INTO reports (patient_id, report_id, taken, filename, report_type, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (patient_id, report_id, taken, filename, report_type, time.time())
+                )
+                db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def record_many(self, rows: Sequence[tuple]) -> None:
+        """Bulk-load (patient, parameter, taken, report, value, status, confidence) rows, e.g. for imports"""
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def trends(self, patient_id: str, parameters: Optional[List[str]] = None, since: Optional[float] = None,
+               until: Optional[float] = None, limit: int = LAB_HISTORY_MAX_POINTS) -> Dict[str, List[Dict]]:
+        """Values per parameter in date order, the latest `limit` points of each"""
+        query = "SELECT parameter, taken, value, status, confidence, report_id FROM results WHERE patient_id = ?"
+        args: List[Any] = [patient_id]
+        if parameters:
+            query += f" AND parameter IN ({', '.join('?' * len(parameters))})"
+            args.extend(parameters)
+        if since is not None:
+            query += " AND taken >= ?"
+            args.append(since)
+        if until is not None:
+            query += " AND taken <= ?"
+            args.append(until)
+        query += " ORDER BY parameter, taken"
+        with self._lock:
+            rows = self._connect().execute(query, args).fetchall()
+
+        trends: Dict[str, List[Dict]] = {}
+        for parameter, taken, value, status, confidence, report_id in rows:
+            trends.setdefault(parameter, []).append({
+                "date": format_date(taken), "value": value, "status": status,
+                "confidence": confidence, "report_id": report_id
+            })
+        return {parameter: points[-limit:] for parameter, points in trends.items()}
+
+    def cohort(self, parameter: str, below: Optional[float] = None, above: Optional[float] = None,
+               since: Optional[float] = None, limit: int = LAB_HISTORY_MAX_PATIENTS) -> List[Dict]:
+        """Patients with any value of the parameter strictly below/above the bounds since the given time"""
+        query = ("SELECT patient_id, COUNT(*), MIN(value), MAX(value), MAX(taken) FROM results"
+                 " WHERE parameter = ?")
+        args: List[Any] = [parameter]
+        if since is not None:
+            query += " AND taken >= ?"
+            args.append(since)
+        if below is not None:
+            query += " AND value < ?"
+            args.append(below)
+        if above is not None:
+            query += " AND value > ?"
+            args.append(above)
+        query += " GROUP BY patient_id ORDER BY patient_id LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._connect().execute(query, args).fetchall()
+        return [
+            {"patient_id": patient_id, "matches": matches, "min": low, "max": high, "last_date": format_date(last)}
+            for patient_id, matches, low, high, last in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,69 @@
+import importlib
+import importlib.util
+import threading
+import time
+import types
+from typing import Callable, Dict, Optional, Tuple
+
+# Milliseconds each lazy module took to import, for the startup report in /health
+IMPORT_TIMES_MS: Dict[str, float] = {}
+
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for a heavy module and imports it on first attribute access
+
+    Keeps process start (and Modal cold starts) cheap: cv2, numpy and
+    friends load when the first request or the warm-up touches them.
+    fallbacks are alternative module names tried in order, e.g. "fitz"
+    for older PyMuPDF releases. on_load runs once with the real module
+    right after it is imported, e.g. to configure it.
+    """
+
+    def __init__(self, name: str, fallbacks: Tuple[str, ...] = (),
+                 on_load: Optional[Callable[[types.ModuleType], None]] = None):
+        super().__init__(name)
+        self._lazy_names = (name,) + tuple(fallbacks)
+        self._lazy_module = None
+        self._lazy_on_load = on_load
+
+    def _lazy_load(self) -> types.ModuleType:
+        if self._lazy_module is None:
+            with _lock:
+                if self._lazy_module is None:
+                    started = time.perf_counter()
+                    error = None
+                    for name in self._lazy_names:
+                        try:
+                            module = importlib.import_module(name)
+                            break
+                        except ImportError as e:
+                            error = e
+                    else:
+                        raise error
+                    IMPORT_TIMES_MS[self._lazy_names[0]] = round((time.perf_counter() - started) * 1000, 1)
+                    if self._lazy_on_load is not None:
+                        self._lazy_on_load(module)
+                    # Later lookups hit the copied attributes directly instead of __getattr__
+                    self.__dict__.update(module.__dict__)
+                    self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._lazy_load(), attr)
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+
+def module_available(module: LazyModule) -> bool:
+    """Whether any of the module's names can be imported, without importing it"""
+    if module._lazy_module is not None:
+        return True
+    return any(importlib.util.find_spec(name) is not None for name in module._lazy_names)
+
+
+def load(module: LazyModule) -> None:
+    """Import a lazy module now (warm-up)"""
+    module._lazy_load()
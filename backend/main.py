@@ -1,24 +1,149 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from __future__ import annotations
+
+import time
+MAIN_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-import pytesseract
-from PIL import Image, ImageEnhance, ImageFilter
-import cv2
-import numpy as np
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, Response
+from fastapi.concurrency import run_in_threadpool
 import re
 from io import BytesIO
 import logging
-from fuzzywuzzy import fuzz, process
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, FrozenSet, List, Set, Tuple, Optional
 import math
+import os
+import asyncio
+import threading
+import contextlib
+import mimetypes
+import zipfile
+import bisect
+import hashlib
+import json
+from concurrency import governor
+from deadlines import Deadline, RequestAborted
+from catalog import (Analyte, CatalogError, ReportCatalog, FUZZY_MIN_LABEL_LENGTH, canonical_alias,
+                     fold, parse_range, process as fuzzy_process)
+from ocr_pool import OCRWorkerPool, OCRPoolFullError
+from ocr_backends import get_backend as get_ocr_backend, parse_tesseract_config
+from lazy_imports import LazyModule, IMPORT_TIMES_MS, load as load_module, module_available
+from result_cache import ResultCache
+from near_duplicates import NearDuplicateIndex, NEAR_DUP_MODE
+from predict import RiskModel, PREDICT_MAX_RECORDS, parse_records
+from job_queue import JobStore, JobQueueFullError, ProgressWriter, JOB_WORKERS
+from lab_history import LabHistory, LAB_HISTORY_MAX_PATIENTS, LAB_HISTORY_MAX_POINTS, parse_report_date
+from metrics import Registry, annotate, record, span, timed_call, track_request
+from responses import FastJSONResponse, dumps_json, negotiate
+from uploads import (read_upload, jpeg_size, sniff_kind, REPORT_KINDS, UPLOAD_MAX_BYTES,
+                     Upload, UploadError, UploadTooLargeError)
+
+# Heavy modules load on first use (or during warm-up), not at import time
+cv2 = LazyModule("cv2", on_load=governor.limit_opencv)
+np = LazyModule("numpy")
+pymupdf = LazyModule("pymupdf", ("fitz",))  # "fitz" for PyMuPDF < 1.24; PDFs get 415 without it
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure Tesseract path
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# OCR strategy: "cascade" stops as soon as every parameter is found,
+# "exhaustive" always runs every (preprocessing, config) pass, "layout"
+# reads word boxes once and "table" only the label and result cells of the
+# results table; both fall back to the cascade for misses
+OCR_MODE = os.getenv("OCR_MODE", "cascade")
+OCR_TIME_BUDGET_S = float(os.getenv("OCR_TIME_BUDGET_S", "20"))
+OCR_CASCADE_WAVE_SIZE = int(os.getenv("OCR_CASCADE_WAVE_SIZE", "1"))
+OCR_CASCADE_PATIENCE = int(os.getenv("OCR_CASCADE_PATIENCE", "6"))
+
+# Batch analysis: files in flight at once, and how many of those may be in
+# the CPU-bound decode/preprocessing stage while the others wait on OCR
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", "4"))
+BATCH_PREPARE_SLOTS = int(os.getenv("BATCH_PREPARE_SLOTS", "1"))
+BATCH_MAX_MEMBER_BYTES = int(os.getenv("BATCH_MAX_MEMBER_BYTES", str(50 * 1024 * 1024)))
+# Decompressed bytes all zip members of one batch may add up to
+BATCH_MAX_EXPANDED_BYTES = int(os.getenv("BATCH_MAX_EXPANDED_BYTES", str(200 * 1024 * 1024)))
+
+# PDF reports: rasterization DPI, page cap, pages OCR'd in parallel, and how
+# much embedded text a page needs before its text layer is trusted over OCR
+PDF_DPI = int(os.getenv("PDF_DPI", "200"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "20"))
+PDF_PAGE_CONCURRENCY = int(os.getenv("PDF_PAGE_CONCURRENCY", "2"))
+PDF_MIN_TEXT_CHARS = int(os.getenv("PDF_MIN_TEXT_CHARS", "20"))
+
+# Large JPEGs are decoded at 1/8, 1/4 or 1/2 scale (libjpeg DCT scaling) when
+# that still leaves OCR_MAX_SIDE pixels, as normalization shrinks them anyway
+DECODE_REDUCTION_FACTORS = (8, 4, 2)
+
+# Whole-request cap checked from Content-Length before the body is read
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+REQUEST_SIZE_LIMITS = {
+    "/analyze-report": UPLOAD_MAX_BYTES + 64 * 1024,  # Slack for multipart headers
+    "/analyze-reports/batch": BATCH_MAX_BYTES
+}
+
+# Warm-up before serving: "blocking" finishes it inside the lifespan hook,
+# "background" serves right away with /health reporting not ready, "off" skips it
+WARMUP_MODE = os.getenv("WARMUP_MODE", "blocking")
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown; the steps live next to the routes at the end of this module"""
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Shared pool for blocking Tesseract calls, so OCR never runs on the event loop
+ocr_pool = OCRWorkerPool()
+
+# Analysis results keyed by upload hash and extraction rules version
+result_cache = ResultCache()
+
+# Perceptual hashes of analyzed pages, so re-photographed reports find their cached result
+near_duplicate_index = NearDuplicateIndex()
+# Share of the values one verification pass reads that must equal the cached ones
+NEAR_DUP_MIN_AGREEMENT = float(os.getenv("NEAR_DUP_MIN_AGREEMENT", "0.9"))
+NEAR_DUP_MIN_VERIFIED = int(os.getenv("NEAR_DUP_MIN_VERIFIED", "3"))
+NEAR_DUP_VERIFY_PASSES = int(os.getenv("NEAR_DUP_VERIFY_PASSES", "2"))
 
-app = FastAPI()
+# Durable submit/poll jobs, drained by in-process workers
+job_store = JobStore()
+
+JOB_POLL_S = float(os.getenv("JOB_POLL_S", "1.0"))
+JOB_EVENTS_POLL_S = float(os.getenv("JOB_EVENTS_POLL_S", "0.5"))
+
+# Values of reports analyzed with a patient_id, for trends and cohort queries
+lab_history = LabHistory()
+
+# How long clients may reuse /catalog before revalidating it with its ETag
+CATALOG_MAX_AGE_S = int(os.getenv("CATALOG_MAX_AGE_S", "3600"))
+
+# Prometheus metrics exported at /metrics
+metrics_registry = Registry()
+stage_seconds = metrics_registry.histogram(
+    "report_stage_seconds", "Time spent in each analysis stage", ("stage",))
+variant_seconds = metrics_registry.histogram(
+    "preprocess_variant_seconds", "Time to build each preprocessing variant", ("variant",))
+ocr_pass_seconds = metrics_registry.histogram(
+    "ocr_pass_seconds", "Time per Tesseract call by variant and config", ("variant", "config"))
+ocr_passes_total = metrics_registry.counter(
+    "ocr_passes_total", "Tesseract passes by whether they improved any parameter", ("variant", "config", "outcome"))
+winning_passes_total = metrics_registry.counter(
+    "winning_passes_total", "Passes that produced a reported parameter value", ("variant", "config", "parameter"))
+aborted_requests_total = metrics_registry.counter(
+    "aborted_requests_total", "Analyses stopped by their deadline or a disconnected client", ("reason", "stage"))
+reports_total = metrics_registry.counter(
+    "analyzed_reports_total", "Analyzed reports by OCR mode and cache tier", ("mode", "cache"))
+startup_seconds = metrics_registry.gauge(
+    "startup_seconds", "Module import, warm-up phases and time until ready", ("phase",))
+
+# Bump when a pipeline change alters results without touching the rules below
+PIPELINE_VERSION = "2.6"
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,594 +152,2588 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Enhanced medical patterns with multiple variations and fuzzy matching
-MEDICAL_PATTERNS = {
-    "Hemoglobin": {
-        "patterns": [
-            r"Hemoglobin\s*(?:\(Hb\))?\s*[:\-\s]*(\d+\.?\d*)",
-            r"Hb\s*[:\-\s]*(\d+\.?\d*)",
-            r"Haemoglobin\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["hemoglobin", "hb", "haemoglobin", "hemoglobin (hb)"],
-        "unit": "g/dl",
-        "normal_range": "12-15",
-        "category": "Blood Counts"
-    },
-    "RBC": {
-        "patterns": [
-            r"Total\s+RBC\s+Count\s*[:\-\s]*(\d+\.?\d*)",
-            r"RBC\s+Count\s*[:\-\s]*(\d+\.?\d*)",
-            r"Red\s+Blood\s+Cell\s*[:\-\s]*(\d+\.?\d*)",
-            r"Total\s+RBC\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["total rbc count", "rbc count", "rbc", "red blood cell", "total rbc"],
-        "unit": "Millions/cumm",
-        "normal_range": "3.8-4.8",
-        "category": "Blood Counts"
-    },
-    "WBC": {
-        "patterns": [
-            r"Total\s+Leucocyte\s+Count\s*(?:\(TLC\))?\s*[:\-\s]*(\d+)",
-            r"TLC\s*[:\-\s]*(\d+)",
-            r"WBC\s*[:\-\s]*(\d+)",
-            r"White\s+Blood\s+Cell\s*[:\-\s]*(\d+)",
-            r"Total\s+Leukocyte\s+Count\s*[:\-\s]*(\d+)"
-        ],
-        "fuzzy_names": ["total leucocyte count", "tlc", "wbc", "white blood cell", "total leukocyte count"],
-        "unit": "Cells/cumm",
-        "normal_range": "4000-10000",
-        "category": "Blood Counts"
-    },
-    "Platelets": {
-        "patterns": [
-            r"Platelet\s+Count\s*[:\-\s]*(\d+\.?\d*)",
-            r"Platelets\s*[:\-\s]*(\d+\.?\d*)",
-            r"PLT\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["platelet count", "platelets", "plt"],
-        "unit": "Lakhs/cumm",
-        "normal_range": "1.5-4.5",
-        "category": "Blood Counts"
-    },
-    "PCV": {
-        "patterns": [
-            r"PCV\s*[:\-\s]*(\d+\.?\d*)",
-            r"Packed\s+Cell\s+Volume\s*[:\-\s]*(\d+\.?\d*)",
-            r"Hematocrit\s*[:\-\s]*(\d+\.?\d*)",
-            r"HCT\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["pcv", "packed cell volume", "hematocrit", "hct"],
-        "unit": "%",
-        "normal_range": "40-50",
-        "category": "Blood Counts"
-    },
-    "MCV": {
-        "patterns": [
-            r"MCV\s*[:\-\s]*(\d+\.?\d*)",
-            r"Mean\s+Cell\s+Volume\s*[:\-\s]*(\d+\.?\d*)",
-            r"Mcv\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["mcv", "mean cell volume"],
-        "unit": "fl",
-        "normal_range": "83-101",
-        "category": "Red Cell Indices"
-    },
-    "MCH": {
-        "patterns": [
-            r"MCH\s*[:\-\s]*(\d+\.?\d*)",
-            r"Mean\s+Cell\s+Hemoglobin\s*[:\-\s]*(\d+\.?\d*)",
-            r"Mch\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["mch", "mean cell hemoglobin"],
-        "unit": "pg",
-        "normal_range": "27-32",
-        "category": "Red Cell Indices"
-    },
-    "MCHC": {
-        "patterns": [
-            r"MCHC\s*[:\-\s]*(\d+\.?\d*)",
-            r"Mean\s+Cell\s+Hemoglobin\s+Concentration\s*[:\-\s]*(\d+\.?\d*)",
-            r"Mchc\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["mchc", "mean cell hemoglobin concentration"],
-        "unit": "g/dl",
-        "normal_range": "31.5-34.5",
-        "category": "Red Cell Indices"
-    },
-    "RDW-CV": {
-        "patterns": [
-            r"RDW-CV\s*[:\-\s]*(\d+\.?\d*)",
-            r"RDW\s*CV\s*[:\-\s]*(\d+\.?\d*)",
-            r"Red\s+Cell\s+Distribution\s+Width\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["rdw-cv", "rdw cv", "red cell distribution width", "rdw"],
-        "unit": "%",
-        "normal_range": "11.6-14.0",
-        "category": "Red Cell Indices"
-    },
-    "Polymorphs": {
-        "patterns": [
-            r"Polymorphs\s*[:\-\s]*(\d+\.?\d*)",
-            r"Neutrophils\s*[:\-\s]*(\d+\.?\d*)",
-            r"PMN\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["polymorphs", "neutrophils", "pmn"],
-        "unit": "%",
-        "normal_range": "40-80",
-        "category": "Differential Count"
-    },
-    "Lymphocytes": {
-        "patterns": [
-            r"Lymphocytes\s*[:\-\s]*(\d+\.?\d*)",
-            r"Lymphs\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["lymphocytes", "lymphs"],
-        "unit": "%",
-        "normal_range": "20-40",
-        "category": "Differential Count"
-    },
-    "Monocytes": {
-        "patterns": [
-            r"Monocytes\s*[:\-\s]*(\d+\.?\d*)",
-            r"Monos\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["monocytes", "monos"],
-        "unit": "%",
-        "normal_range": "2-10",
-        "category": "Differential Count"
-    },
-    "Eosinophils": {
-        "patterns": [
-            r"Eosinophils\s*[:\-\s]*(\d+\.?\d*)",
-            r"Eos\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["eosinophils", "eos"],
-        "unit": "%",
-        "normal_range": "1-6",
-        "category": "Differential Count"
-    },
-    "Basophils": {
-        "patterns": [
-            r"Basophils\s*[:\-\s]*(\d+\.?\d*)",
-            r"Basos\s*[:\-\s]*(\d+\.?\d*)"
-        ],
-        "fuzzy_names": ["basophils", "basos"],
-        "unit": "%",
-        "normal_range": "0-2",
-        "category": "Differential Count"
-    }
-}
+# Analytes, aliases, reference ranges and interpretations, compiled once for every request
+report_catalog = ReportCatalog.load()
+
+def rules_fingerprint(*rules) -> str:
+    """Stable short hash of extraction rules, used to key compiled and cached results"""
+    payload = json.dumps(rules, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
 
 class EnhancedImagePreprocessor:
     """Enhanced image preprocessing for better OCR accuracy"""
     
+    # Names of the variants returned by enhance_image, in order
+    VARIANT_NAMES = ["adaptive", "clahe", "otsu", "morph", "denoised"]
+    
     @staticmethod
     def enhance_image(image: np.ndarray) -> List[np.ndarray]:
         """Apply multiple preprocessing techniques and return list of processed images"""
-        processed_images = []
+        variants = PreprocessedVariants(image, skip_expensive=False)
+        return [variants.get(name) for name in EnhancedImagePreprocessor.VARIANT_NAMES]
+    
+    @staticmethod
+    def variants(image: np.ndarray, skip_expensive: bool = True,
+                 orientation: Optional[Dict] = None) -> "PreprocessedVariants":
+        """Lazy variant set for one request; nothing is computed until asked for"""
+        return PreprocessedVariants(image, skip_expensive=skip_expensive, orientation=orientation)
+
+class ImageNormalizer:
+    """Resample to a target text height and crop to the results region before OCR
+
+    Layout is analysed on a small copy: connected components give the
+    typical glyph height, and dilating the text-like components merges
+    rows and table columns into blocks. The densest block, plus blocks
+    stacked directly above/below it (table sections) or beside it on the
+    same rows (table columns), is the crop. Blocks to its left on those
+    rows always join, however wide the gap: that is where the labels are.
+    """
+    
+    # Median glyph height Tesseract is fed; it reads best at ~20-30 px
+    TARGET_TEXT_HEIGHT = float(os.getenv("OCR_TARGET_TEXT_HEIGHT", "24"))
+    MIN_SCALE = 0.2
+    MAX_SCALE = 2.0
+    MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "3500"))
+    ANALYSIS_SIDE = 1200
+    # On by default; OCR_CROP_ROI=0 reads the whole page again if a layout
+    # makes the crop miss the label column
+    CROP_ROI = os.getenv("OCR_CROP_ROI", "1") == "1"
+    # Cascade passes a cropped page gets to show a label before the whole page is read instead
+    CROP_LABEL_PASSES = int(os.getenv("OCR_CROP_LABEL_PASSES", "2"))
+    
+    # Skip the crop when it would keep nearly the whole page anyway
+    MAX_ROI_FRACTION = 0.85
+    
+    @staticmethod
+    def text_components(binary_inv: np.ndarray) -> Tuple[np.ndarray, Optional[float]]:
+        """Mask of glyph-like components and their median height"""
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(binary_inv, connectivity=8)
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        widths = stats[1:, cv2.CC_STAT_WIDTH]
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        max_height = max(8, binary_inv.shape[0] // 15)
+        glyphs = (heights >= 3) & (heights <= max_height) & (widths <= heights * 4) & (areas >= 6)
+        if glyphs.sum() < 10:
+            return binary_inv, None
+        keep = np.zeros(count, dtype=bool)
+        keep[1:] = glyphs
+        mask = np.where(keep[labels], 255, 0).astype(np.uint8)
+        return mask, float(np.median(heights[glyphs]))
+    
+    @staticmethod
+    def find_roi(text_mask: np.ndarray, text_height: float) -> Optional[Tuple[int, int, int, int]]:
+        """(x, y, w, h) of the main text block in text_mask coordinates"""
+        h, w = text_mask.shape[:2]
+        kernel_w = max(3, int(text_height * 6))
+        kernel_h = max(3, int(text_height * 1.5))
+        blocks = cv2.dilate(text_mask, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_w, kernel_h)))
+        contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        # Original grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        rects = []
+        for contour in contours:
+            x, y, rw, rh = cv2.boundingRect(contour)
+            ink = int(cv2.countNonZero(text_mask[y:y + rh, x:x + rw]))
+            if ink:
+                rects.append((ink, x, y, rw, rh))
+        if not rects:
+            return None
         
-        # Method 1: Adaptive thresholding
-        adaptive_thresh = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-        )
-        processed_images.append(adaptive_thresh)
+        rects.sort(reverse=True)
+        _, x0, y0, rw, rh = rects[0]
+        x1, y1 = x0 + rw, y0 + rh
         
-        # Method 2: CLAHE + Adaptive threshold
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        clahe_img = clahe.apply(gray)
-        clahe_thresh = cv2.adaptiveThreshold(
-            clahe_img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-        )
-        processed_images.append(clahe_thresh)
+        # Grow with blocks that share the columns and sit close above/below
+        # (table sections), or share the rows and sit beside it (table columns)
+        max_row_gap = text_height * 4
+        max_column_gap = text_height * 15
+        grown = True
+        while grown:
+            grown = False
+            for _, x, y, rw, rh in rects[1:]:
+                if x >= x0 and y >= y0 and x + rw <= x1 and y + rh <= y1:
+                    continue
+                x_overlap = min(x1, x + rw) - max(x0, x)
+                y_overlap = min(y1, y + rh) - max(y0, y)
+                row_gap = max(y - y1, y0 - (y + rh), 0)
+                column_gap = max(x - x1, x0 - (x + rw), 0)
+                stacked = x_overlap > 0.5 * min(rw, x1 - x0) and row_gap <= max_row_gap
+                same_rows = y_overlap > 0.5 * min(rh, y1 - y0)
+                beside = same_rows and (column_gap <= max_column_gap or x + rw <= x0)
+                if stacked or beside:
+                    x0, y0 = min(x0, x), min(y0, y)
+                    x1, y1 = max(x1, x + rw), max(y1, y + rh)
+                    grown = True
         
-        # Method 3: Gaussian blur + threshold
-        blur = cv2.GaussianBlur(gray, (3, 3), 0)
-        _, otsu_thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        processed_images.append(otsu_thresh)
+        margin = int(text_height)
+        x0, y0 = max(0, x0 - margin), max(0, y0 - margin)
+        x1, y1 = min(w, x1 + margin), min(h, y1 + margin)
+        return x0, y0, x1 - x0, y1 - y0
+    
+    @staticmethod
+    def normalize(image: np.ndarray, crop: Optional[bool] = None) -> Tuple[np.ndarray, Dict]:
+        """Return the resampled (and, with crop or CROP_ROI, cropped) image plus what was done to it"""
+        if crop is None:
+            crop = ImageNormalizer.CROP_ROI
+        h, w = image.shape[:2]
+        info = {"original_size": [w, h], "scale": 1.0, "text_height": None, "roi": None}
         
-        # Method 4: Morphological operations
-        kernel = np.ones((2,2), np.uint8)
-        morph = cv2.morphologyEx(adaptive_thresh, cv2.MORPH_CLOSE, kernel)
-        processed_images.append(morph)
+        analysis_scale = min(1.0, ImageNormalizer.ANALYSIS_SIDE / max(h, w))
+        small = image
+        if analysis_scale < 1.0:
+            small = cv2.resize(image, (max(1, int(w * analysis_scale)), max(1, int(h * analysis_scale))),
+                               interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        binary_inv = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+        text_mask, small_text_height = ImageNormalizer.text_components(binary_inv)
         
-        # Method 5: Noise reduction
-        denoised = cv2.fastNlMeansDenoising(gray)
-        denoised_thresh = cv2.adaptiveThreshold(
-            denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-        )
-        processed_images.append(denoised_thresh)
+        if small_text_height is None:
+            # No recognisable text layout; just respect the size cap
+            scale = min(1.0, ImageNormalizer.MAX_SIDE / max(h, w))
+        else:
+            text_height = small_text_height / analysis_scale
+            info["text_height"] = round(text_height, 1)
+            scale = ImageNormalizer.TARGET_TEXT_HEIGHT / text_height
+            scale = min(max(scale, ImageNormalizer.MIN_SCALE), ImageNormalizer.MAX_SCALE)
+            
+            if crop:
+                roi = ImageNormalizer.find_roi(text_mask, small_text_height)
+                if roi is not None:
+                    x, y, rw, rh = (int(round(v / analysis_scale)) for v in roi)
+                    rw, rh = min(rw, w - x), min(rh, h - y)
+                    if rw * rh < ImageNormalizer.MAX_ROI_FRACTION * w * h and rw > 0 and rh > 0:
+                        image = image[y:y + rh, x:x + rw]
+                        info["roi"] = {"x": x, "y": y, "width": rw, "height": rh}
+        
+        ch, cw = image.shape[:2]
+        scale = min(scale, ImageNormalizer.MAX_SIDE / max(ch, cw))
+        if abs(scale - 1.0) > 0.05:
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+            image = cv2.resize(image, (max(1, int(cw * scale)), max(1, int(ch * scale))), interpolation=interpolation)
+        else:
+            scale = 1.0
         
-        return processed_images
+        info["scale"] = round(scale, 3)
+        info["size"] = [image.shape[1], image.shape[0]]
+        return image, info
+
+class PageOrienter:
+    """Turns the page upright and removes skew once, before any variant is built
+
+    Skew comes from a projection profile: the ink pixels of a small
+    binarized copy are projected onto the row axis at candidate angles,
+    and the angle whose row histogram is sharpest (text lines and table
+    rules separated by clean gaps) wins, first in whole degrees and then
+    in tenths. Quarter turns come from Tesseract OSD on the inkiest
+    square of the normalized page, where the text is already at OCR size;
+    the page center is often blank margin or a column of bare numbers.
+    """
+    
+    ANALYSIS_SIDE = 1000
+    MAX_SKEW = float(os.getenv("OCR_MAX_SKEW", "15"))
+    COARSE_STEP = 1.0
+    FINE_STEP = 0.1
+    # Smaller angles cost Tesseract nothing, and every resample softens glyphs
+    MIN_SKEW = 0.5
+    MIN_INK_PIXELS = 200
+    
+    DETECT_ROTATION = os.getenv("OCR_DETECT_ROTATION", "1") == "1"
+    OSD_MAX_SIDE = 800
+    # OSD confidences run from 0 to ~20. On the inkiest square, synthetic reports at every
+    # quarter turn score 3 or more (benchmark.py orientation); guesses on near-blank crops under 1
+    OSD_MIN_CONFIDENCE = float(os.getenv("OCR_OSD_MIN_CONFIDENCE", "2.0"))
+    
+    # Counter-clockwise turn reported by OSD -> cv2.rotate code that undoes it
+    ROTATIONS = {90: "ROTATE_90_COUNTERCLOCKWISE", 180: "ROTATE_180", 270: "ROTATE_90_CLOCKWISE"}
     
     @staticmethod
-    def correct_skew(image: np.ndarray) -> np.ndarray:
-        """Detect and correct image skew"""
+    def text_window(gray: np.ndarray, side: int) -> np.ndarray:
+        """The side x side square of the page holding the most ink"""
+        h, w = gray.shape[:2]
+        if h <= side and w <= side:
+            return gray
+        scale = min(1.0, PageOrienter.ANALYSIS_SIDE / max(h, w))
+        small = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        _, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        window_h = max(1, min(small.shape[0], int(side * scale)))
+        window_w = max(1, min(small.shape[1], int(side * scale)))
+        integral = cv2.integral(ink)
+        sums = (integral[window_h:, window_w:] - integral[:-window_h, window_w:]
+                - integral[window_h:, :-window_w] + integral[:-window_h, :-window_w])
+        y, x = np.unravel_index(int(np.argmax(sums)), sums.shape)
+        y, x = min(int(y / scale), max(0, h - side)), min(int(x / scale), max(0, w - side))
+        return gray[y:y + side, x:x + side]
+    
+    @staticmethod
+    def detect_rotation(image: np.ndarray) -> Optional[Tuple[int, float]]:
+        """OSD on the page's inkiest square; runs on the OCR pool"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
         try:
-            # Find contours
-            contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Find the largest contour (assumed to be the document)
-            if contours:
-                largest_contour = max(contours, key=cv2.contourArea)
-                rect = cv2.minAreaRect(largest_contour)
-                angle = rect[2]
-                
-                # Correct the angle
-                if angle < -45:
-                    angle = -(90 + angle)
-                else:
-                    angle = -angle
-                
-                # Rotate the image
-                if abs(angle) > 0.5:  # Only rotate if significant skew
-                    (h, w) = image.shape[:2]
-                    center = (w // 2, h // 2)
-                    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-                    rotated = cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-                    return rotated
-        except:
-            pass
+            return get_ocr_backend().orientation(PageOrienter.text_window(gray, PageOrienter.OSD_MAX_SIDE))
+        except Exception as e:
+            logger.warning(f"Orientation detection failed: {str(e)}")
+            return None
+    
+    @staticmethod
+    def estimate_skew(gray: np.ndarray) -> float:
+        """Angle in degrees (OpenCV convention, counter-clockwise) the text lines are rotated by"""
+        h, w = gray.shape[:2]
+        scale = min(1.0, PageOrienter.ANALYSIS_SIDE / max(h, w))
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        _, binary_inv = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        ys, xs = np.nonzero(binary_inv)
+        if len(ys) < PageOrienter.MIN_INK_PIXELS:
+            return 0.0
+        ys = ys.astype(np.float32) - gray.shape[0] / 2
+        xs = xs.astype(np.float32) - gray.shape[1] / 2
+        
+        def sharpness(angle: float) -> float:
+            theta = math.radians(angle)
+            rows = ys * math.cos(theta) + xs * math.sin(theta)
+            histogram = np.bincount((rows - rows.min()).astype(np.int32))
+            return float(np.dot(histogram, histogram))
         
+        limit, coarse, fine = PageOrienter.MAX_SKEW, PageOrienter.COARSE_STEP, PageOrienter.FINE_STEP
+        best = max(np.arange(-limit, limit + coarse / 2, coarse), key=sharpness)
+        best = max(np.arange(best - coarse, best + coarse + fine / 2, fine), key=sharpness)
+        return round(float(best), 1) + 0.0  # No "-0.0" in responses
+    
+    @staticmethod
+    def rotate(image: np.ndarray, angle: float) -> np.ndarray:
+        """Rotate counter-clockwise by angle, growing the canvas so no corner is cut"""
+        h, w = image.shape[:2]
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        new_w, new_h = int(math.ceil(h * sin + w * cos)), int(math.ceil(h * cos + w * sin))
+        matrix[0, 2] += (new_w - w) / 2
+        matrix[1, 2] += (new_h - h) / 2
+        border = (255,) * (image.shape[2] if image.ndim == 3 else 1)
+        return cv2.warpAffine(image, matrix, (new_w, new_h), flags=cv2.INTER_CUBIC,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=border)
+    
+    @staticmethod
+    def quarter_turn(rotation: Optional[Tuple[int, float]]) -> int:
+        """Degrees to turn the page counter-clockwise, 0 unless OSD is confident"""
+        if rotation is None:
+            return 0
+        degrees, confidence = rotation
+        if degrees in PageOrienter.ROTATIONS and confidence >= PageOrienter.OSD_MIN_CONFIDENCE:
+            return degrees
+        return 0
+    
+    @staticmethod
+    def turn(image: np.ndarray, degrees: int) -> np.ndarray:
+        return cv2.rotate(image, getattr(cv2, PageOrienter.ROTATIONS[degrees]))
+    
+    @staticmethod
+    def deskew(image: np.ndarray, orientation: Dict) -> np.ndarray:
+        """Remove the skew and record it in orientation"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        angle = PageOrienter.estimate_skew(gray)
+        orientation["skew_angle"] = angle
+        orientation["deskewed"] = abs(angle) >= PageOrienter.MIN_SKEW
+        if orientation["deskewed"]:
+            image = PageOrienter.rotate(image, -angle)
         return image
 
+class PerceptualHash:
+    """64-bit dHash and pHash of the whole decoded page in grayscale
+
+    Both look at tiny downsampled copies, so the lighting, JPEG encoding,
+    slight skew and small crop differences between photos of one page flip
+    only a few bits. The page is hashed before the results-region crop,
+    which can land differently on two photos. Reports from one lab's
+    template differ mostly in their digits, which these sizes cannot see
+    either: a match is a candidate to verify.
+    """
+    
+    @staticmethod
+    def to_int(bits: np.ndarray) -> int:
+        return int("".join("1" if bit else "0" for bit in bits.flatten()), 2)
+    
+    @staticmethod
+    def dhash(gray: np.ndarray) -> int:
+        """Whether each of 8x8 cells is brighter than its right neighbour"""
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+        return PerceptualHash.to_int(small[:, 1:] > small[:, :-1])
+    
+    @staticmethod
+    def phash(gray: np.ndarray) -> int:
+        """Signs of the lowest 8x8 DCT frequencies of a 32x32 copy against their median"""
+        small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+        low = cv2.dct(small)[:8, :8]
+        return PerceptualHash.to_int(low > np.median(low.flatten()[1:]))
+    
+    @staticmethod
+    def hashes(image: np.ndarray) -> Tuple[int, int]:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        return PerceptualHash.phash(gray), PerceptualHash.dhash(gray)
+
+class PreprocessedVariants:
+    """Preprocessing variants of one image, computed on demand and memoized
+
+    The grayscale image and the adaptive threshold are shared by several
+    variants, so they are computed once. Expensive variants are skipped
+    when a quick quality check says they won't help.
+    """
+    
+    # Variants that cost far more than the others (fastNlMeansDenoising
+    # takes seconds on a full-resolution photo)
+    EXPENSIVE_VARIANTS = {"denoised"}
+    
+    # Estimated noise sigma below which denoising is not worth running
+    DENOISE_MIN_NOISE = float(os.getenv("DENOISE_MIN_NOISE", "3.0"))
+    
+    # Quality metrics are computed on a downsampled copy
+    QUALITY_MAX_SIDE = 1000
+    
+    def __init__(self, image: np.ndarray, skip_expensive: bool = True, orientation: Optional[Dict] = None):
+        self.image = image
+        self.skip_expensive = skip_expensive
+        # What PageOrienter did to the image, shared by every variant
+        self.orientation = orientation
+        self._gray = None
+        self._adaptive_thresh = None
+        self._quality = None
+        self._variants: Dict[str, np.ndarray] = {}
+        self._builders = {
+            "adaptive": self._build_adaptive,
+            "clahe": self._build_clahe,
+            "otsu": self._build_otsu,
+            "morph": self._build_morph,
+            "denoised": self._build_denoised,
+        }
+    
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+    
+    @property
+    def adaptive_thresh(self) -> np.ndarray:
+        if self._adaptive_thresh is None:
+            self._adaptive_thresh = cv2.adaptiveThreshold(
+                self.gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+            )
+        return self._adaptive_thresh
+    
+    def quality(self) -> Dict[str, float]:
+        """Quick blur (variance of Laplacian) and noise (Immerkaer sigma) estimates"""
+        if self._quality is None:
+            gray = self.gray
+            h, w = gray.shape[:2]
+            scale = self.QUALITY_MAX_SIDE / max(h, w)
+            if scale < 1:
+                gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+            
+            sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+            
+            kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float64)
+            response = cv2.filter2D(gray.astype(np.float64), -1, kernel)[1:-1, 1:-1]
+            noise = math.sqrt(math.pi / 2) * np.abs(response).sum() / (6 * response.size) if response.size else 0.0
+            
+            self._quality = {"sharpness": round(float(sharpness), 2), "noise": round(float(noise), 2)}
+        return self._quality
+    
+    def is_skipped(self, name: str) -> bool:
+        """Whether an expensive variant is not worth computing for this image"""
+        if not self.skip_expensive or name not in self.EXPENSIVE_VARIANTS:
+            return False
+        if name == "denoised":
+            return self.quality()["noise"] < self.DENOISE_MIN_NOISE
+        return False
+    
+    def names(self) -> List[str]:
+        """Variant names that will be produced for this image, in preference order"""
+        return [name for name in EnhancedImagePreprocessor.VARIANT_NAMES if not self.is_skipped(name)]
+    
+    @property
+    def computed(self) -> List[str]:
+        return list(self._variants)
+    
+    def get(self, name: str) -> np.ndarray:
+        """Compute (or return the memoized) variant"""
+        if name not in self._variants:
+            with span(variant_seconds, "variants", name, variant=name):
+                self._variants[name] = self._builders[name]()
+        return self._variants[name]
+    
+    def __iter__(self):
+        """Yield (name, image) lazily, computing each variant only when reached"""
+        for name in self.names():
+            yield name, self.get(name)
+    
+    # Method 1: Adaptive thresholding
+    def _build_adaptive(self) -> np.ndarray:
+        return self.adaptive_thresh
+    
+    # Method 2: CLAHE + Adaptive threshold
+    def _build_clahe(self) -> np.ndarray:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        clahe_img = clahe.apply(self.gray)
+        return cv2.adaptiveThreshold(
+            clahe_img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+        )
+    
+    # Method 3: Gaussian blur + threshold
+    def _build_otsu(self) -> np.ndarray:
+        blur = cv2.GaussianBlur(self.gray, (3, 3), 0)
+        _, otsu_thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return otsu_thresh
+    
+    # Method 4: Morphological operations (reuses the adaptive threshold)
+    def _build_morph(self) -> np.ndarray:
+        kernel = np.ones((2,2), np.uint8)
+        return cv2.morphologyEx(self.adaptive_thresh, cv2.MORPH_CLOSE, kernel)
+    
+    # Method 5: Noise reduction
+    def _build_denoised(self) -> np.ndarray:
+        denoised = cv2.fastNlMeansDenoising(self.gray)
+        return cv2.adaptiveThreshold(
+            denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+        )
+
 class EnhancedTextExtractor:
     """Enhanced text extraction with multiple OCR configurations"""
     
+    OCR_CONFIGS = [
+        '--oem 3 --psm 6',  # Default
+        '--oem 3 --psm 4',  # Single column
+        '--oem 3 --psm 1',  # Automatic page segmentation
+        '--oem 3 --psm 3',  # Fully automatic
+        '--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.()-:/%',
+    ]
+    
+    @staticmethod
+    def run_single_config(img: np.ndarray, config: str, timeout: float = 0) -> str:
+        """Run one Tesseract pass; returns empty text if the pass fails or times out"""
+        try:
+            return get_ocr_backend().image_to_string(img, config, timeout)
+        except Exception as e:
+            logger.warning(f"OCR config failed: {config}, Error: {str(e)}")
+            return ""
+    
+    @staticmethod
+    def config_name(config: str) -> str:
+        """Short metrics label for a Tesseract config, e.g. psm6 or psm6_whitelist"""
+        _, psm, variables = parse_tesseract_config(config)
+        return f"psm{psm}" + ("_whitelist" if "tessedit_char_whitelist" in variables else "")
+    
+    @staticmethod
+    def record_pass(variant: str, config: str, seconds: float, text: str,
+                    extraction: "IncrementalExtraction") -> bool:
+        """Time and feed one pass's text to the extraction; returns True if it improved anything"""
+        config_name = EnhancedTextExtractor.config_name(config)
+        record(ocr_pass_seconds, "ocr_passes", f"{variant}/{config_name}", seconds,
+               variant=variant, config=config_name)
+        improved = bool(text.strip()) and extraction.add_text(text, source=(variant, config_name))
+        outcome = "improved" if improved else "no_gain" if text.strip() else "empty"
+        ocr_passes_total.inc(variant=variant, config=config_name, outcome=outcome)
+        extraction.passes_done += 1
+        extraction.passes_tried.add((variant, config))
+        extraction.report()
+        return improved
+    
     @staticmethod
     def extract_text_multiple_configs(images: List[np.ndarray]) -> List[str]:
         """Extract text using multiple Tesseract configurations"""
-        configs = [
-            '--oem 3 --psm 6',  # Default
-            '--oem 3 --psm 4',  # Single column
-            '--oem 3 --psm 1',  # Automatic page segmentation
-            '--oem 3 --psm 3',  # Fully automatic
-            '--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.()-:/%',
-        ]
-        
         all_texts = []
         
         for img in images:
-            for config in configs:
-                try:
-                    pil_image = Image.fromarray(img)
-                    text = pytesseract.image_to_string(pil_image, config=config)
-                    if text.strip():  # Only add non-empty text
-                        all_texts.append(text)
-                except Exception as e:
-                    logger.warning(f"OCR config failed: {config}, Error: {str(e)}")
-                    continue
+            for config in EnhancedTextExtractor.OCR_CONFIGS:
+                text = EnhancedTextExtractor.run_single_config(img, config)
+                if text.strip():  # Only add non-empty text
+                    all_texts.append(text)
         
         return all_texts
-
-class FuzzyParameterExtractor:
-    """Enhanced parameter extraction with fuzzy matching and context awareness"""
     
-    def __init__(self):
-        self.medical_patterns = MEDICAL_PATTERNS
-    
-    def preprocess_text(self, text: str) -> str:
-        """Clean and preprocess text for better matching"""
-        # Fix common OCR errors
-        replacements = {
-            '0': ['O', 'o', '°'],
-            '1': ['I', 'l', '|'],
-            '5': ['S', 's'],
-            '6': ['G', 'g'],
-            '8': ['B'],
-            '.': [','],
-            ':': [';'],
-            '-': ['—', '–', '_'],
-            '%': ['X', 'x'],
-            ' ': ['  ', '\t']
-        }
+    @staticmethod
+    async def extract_text_parallel(images: List[Tuple[str, np.ndarray]], extraction: "IncrementalExtraction",
+                                    pool: OCRWorkerPool) -> int:
+        """Fan every (variant, config) pass out across the OCR pool; returns the number of passes"""
+        passes = [(name, config) for name, _ in images for config in EnhancedTextExtractor.OCR_CONFIGS]
+        jobs = [(EnhancedTextExtractor.run_single_config, img, config, extraction.ocr_timeout())
+                for _, img in images for config in EnhancedTextExtractor.OCR_CONFIGS]
+        results = await pool.map(timed_call, jobs)
+        # Fed in the same image-major order as the sequential extractor
+        for (name, config), (text, seconds) in zip(passes, results):
+            EnhancedTextExtractor.record_pass(name, config, seconds, text, extraction)
+        return len(jobs)
+    
+    # (variant, config index) pairs tried first by the cascade: plain
+    # binarizations with the default block layout find most values, while
+    # the slow denoised variant and full page segmentation rarely add any
+    CASCADE_PRIORITY = [
+        ("adaptive", 0),
+        ("otsu", 0),
+        ("clahe", 0),
+        ("adaptive", 1),
+        ("otsu", 1),
+        ("adaptive", 4),
+        ("clahe", 1),
+        ("morph", 0),
+    ]
+    
+    @staticmethod
+    def cascade_order() -> List[Tuple[str, int]]:
+        """Every (variant, config index) pair, cheapest and most productive first"""
+        order = list(EnhancedTextExtractor.CASCADE_PRIORITY)
+        for variant in EnhancedImagePreprocessor.VARIANT_NAMES:
+            for config_index in range(len(EnhancedTextExtractor.OCR_CONFIGS)):
+                if (variant, config_index) not in order:
+                    order.append((variant, config_index))
+        return order
+    
+    @staticmethod
+    async def extract_text_cascade(variants: PreprocessedVariants, extraction: "IncrementalExtraction",
+                                   pool: OCRWorkerPool, time_budget: float = OCR_TIME_BUDGET_S,
+                                   wave_size: int = OCR_CASCADE_WAVE_SIZE,
+                                   patience: int = OCR_CASCADE_PATIENCE, label_passes: int = 0) -> Dict:
+        """Run OCR passes in priority order until every parameter is found
+
+        Each text is fed to the extraction as soon as it arrives. The cascade
+        stops when the extraction is complete, when the time budget is spent,
+        after `patience` passes in a row that found nothing new, or, with
+        label_passes, once that many passes have not read a single label.
+        """
+        available = variants.names()
+        order = [(name, idx) for name, idx in EnhancedTextExtractor.cascade_order()
+                 if name in available and (name, EnhancedTextExtractor.OCR_CONFIGS[idx]) not in extraction.passes_tried]
+        
+        started = time.monotonic()
+        passes_run = 0
+        unproductive = 0
+        stop_reason = "exhausted"
+        passes_available = len(order)
+        if extraction.complete:
+            # Earlier passes (a near-duplicate check) already found everything
+            order, stop_reason = [], "complete"
+        
+        for wave_start in range(0, len(order), max(1, wave_size)):
+            wave = order[wave_start:wave_start + max(1, wave_size)]
+            jobs = []
+            for name, idx in wave:
+                # Variants are built on first use, off the event loop
+                image = await run_in_threadpool(variants.get, name)
+                jobs.append((EnhancedTextExtractor.run_single_config, image, EnhancedTextExtractor.OCR_CONFIGS[idx],
+                             extraction.ocr_timeout()))
+            results = await pool.map(timed_call, jobs)
+            passes_run += len(jobs)
+            
+            for (name, idx), (text, seconds) in zip(wave, results):
+                config = EnhancedTextExtractor.OCR_CONFIGS[idx]
+                if EnhancedTextExtractor.record_pass(name, config, seconds, text, extraction):
+                    unproductive = 0
+                else:
+                    unproductive += 1
+            
+            if extraction.complete:
+                stop_reason = "complete"
+                break
+            if time.monotonic() - started >= time_budget:
+                stop_reason = "time_budget"
+                break
+            if patience and extraction.best and unproductive >= patience:
+                stop_reason = "no_progress"
+                break
+            if label_passes and not extraction.seen and passes_run >= label_passes:
+                stop_reason = "no_labels"
+                break
         
-        processed_text = text
+        return {
+            "passes_run": passes_run,
+            "passes_available": passes_available,
+            "stop_reason": stop_reason
+        }
+
+class CompiledExtractionEngine:
+    """The report catalog compiled for a single pass over each OCR text
+
+    Every alias is found in one scan by the catalog's alias matcher, so
+    the cost per text stays flat as analytes are added. The value printed
+    right after an alias is a direct hit; otherwise the first plausible
+    number after it on the same line, or on the two lines below, is a
+    context hit. Lines with a value but no exact label then go through
+    the catalog's fuzzy matcher in one batch. Token values and line labels
+    are remembered, since a report's passes read mostly the same page.
+    """
+
+    # Separators and one parenthetical ("(TLC)", "(Hb)") between a label and its value
+    VALUE_RE = re.compile(r'[ \t:=\-–—.]*(?:\([^()\n]{0,20}\)[ \t:=\-–—.]*)?(\S+)')
+    NUMBER_RE = re.compile(r'^(\d+\.?\d*)')
+    RANGE_RE = re.compile(r'\d\s*-\s*\d')
+    THOUSANDS_RE = re.compile(r'^\d{1,3}(?:,\d{3})+(?!\d)')
+
+    # Punctuation that sticks to values in OCR output ("13.5,", "(4.5)")
+    PUNCTUATION = ':;,()[]{}|*'
+
+    # Trailing separators left on a label cut off before its value ("Platelts :")
+    LABEL_TRIM = ' :;=.,'
+
+    # Distinct tokens and lines whose reading is remembered; a report's passes read mostly the same ones
+    VALUE_CACHE_SIZE = 4096
+
+    AGE_RE = re.compile(
+        r'\bage\b(?:\s*/\s*(?:sex|gender))?\s*[:\-]?\s*(\d{1,3}(?:\.\d)?)\s*'
+        r'(years?|yrs?|y|months?|mths?|m|days?|d)?\b',
+        re.IGNORECASE)
+    SEX_RE = re.compile(
+        r'\b(?:sex|gender)\b\s*[:\-]?\s*(?:\d{1,3}\s*(?:years?|yrs?|y)?\s*/\s*)?(male|female|m|f)\b'
+        r'|\bage\s*/\s*(?:sex|gender)\s*[:\-]?\s*\d{1,3}\s*(?:years?|yrs?|y)?\s*/\s*(male|female|m|f)\b',
+        re.IGNORECASE)
+
+    _cache: Dict[str, "CompiledExtractionEngine"] = {}
+
+    @classmethod
+    def for_catalog(cls, catalog: ReportCatalog, replacements: Dict[str, List[str]]) -> "CompiledExtractionEngine":
+        """Compile once per distinct catalog and rules and reuse across requests"""
+        key = rules_fingerprint(catalog.fingerprint, replacements)
+        if key not in cls._cache:
+            cls._cache[key] = cls(catalog, replacements)
+        return cls._cache[key]
+
+    def __init__(self, catalog: ReportCatalog, replacements: Dict[str, List[str]]):
+        self.catalog = catalog
+
+        # OCR look-alike fixes, applied to value tokens only: labels are
+        # matched by the catalog with its own folding
+        translations = {}
         for correct, wrong_list in replacements.items():
             for wrong in wrong_list:
-                processed_text = processed_text.replace(wrong, correct)
-        
-        return processed_text
-    
-    def extract_value_near_parameter(self, text: str, param_name: str) -> Optional[float]:
-        """Extract value near a parameter name using context"""
-        lines = text.split('\n')
-        
-        for i, line in enumerate(lines):
-            # Check if parameter name is in current line
-            if any(fuzzy_name.lower() in line.lower() for fuzzy_name in self.medical_patterns[param_name]["fuzzy_names"]):
-                # Look for value in current line and next few lines
-                search_lines = lines[i:i+3]  # Current and next 2 lines
-                
-                for search_line in search_lines:
-                    # Find numbers in the line
-                    numbers = re.findall(r'\d+\.?\d*', search_line)
-                    for num_str in numbers:
-                        try:
-                            value = float(num_str)
-                            # Basic range validation to avoid extracting irrelevant numbers
-                            if self.is_reasonable_value(param_name, value):
-                                return value
-                        except ValueError:
-                            continue
-        
+                if len(wrong) == 1 and len(correct) == 1 and correct != wrong:
+                    translations[wrong] = correct
+        self.translate_table = str.maketrans(translations)
+        self.values: Dict[str, Optional[float]] = {}
+        self.line_labels: Dict[str, Optional[Tuple[str, List[str]]]] = {}
+
+    def parse_value(self, token: str) -> Optional[float]:
+        """Plain number from one token, fixing OCR look-alikes; ranges like 12-15 don't count"""
+        values = self.values
+        if token in values:
+            return values[token]
+        if len(values) > self.VALUE_CACHE_SIZE:
+            values.clear()
+        value = values[token] = self.read_value(token)
+        return value
+
+    def read_value(self, token: str) -> Optional[float]:
+        if not any(char.isdigit() for char in token):
+            return None
+        thousands = self.THOUSANDS_RE.match(token)
+        if thousands:
+            token = thousands.group(0).replace(",", "") + token[thousands.end():]
+        text = token.translate(self.translate_table).strip(self.PUNCTUATION)
+        if self.RANGE_RE.search(text):
+            return None
+        match = self.NUMBER_RE.match(text)
+        return float(match.group(1)) if match else None
+
+    def context_value(self, text: str, hit_starts: List[int], end: int, param_name: str) -> Optional[float]:
+        """First plausible number after a label on its line, then on the two lines below,
+        each line cut at the next label"""
+        line_start = end
+        for _ in range(3):
+            if line_start > len(text):
+                break
+            line_end = text.find("\n", line_start)
+            if line_end < 0:
+                line_end = len(text)
+            next_hit = bisect.bisect_left(hit_starts, line_start)
+            segment_end = min(line_end, hit_starts[next_hit]) if next_hit < len(hit_starts) else line_end
+            for token in text[line_start:segment_end].split():
+                value = self.parse_value(token)
+                if value is not None and self.catalog.is_plausible(param_name, value):
+                    return value
+            line_start = line_end + 1
         return None
-    
+
+    def scan(self, text: str, best: Dict[str, Tuple[float, float]]) -> Set[str]:
+        """Update best (param -> (value, confidence)) from one OCR text; returns the analytes seen"""
+        hits = self.catalog.hits(text)
+        hit_starts = [start for start, _, _ in hits]
+        seen: Set[str] = set()
+
+        direct: Dict[str, float] = {}
+        for index, (start, end, param_names) in enumerate(hits):
+            seen.update(param_names)
+            stop = hit_starts[index + 1] if index + 1 < len(hits) else len(text)
+            match = self.VALUE_RE.match(text, end, stop)
+            value = self.parse_value(match.group(1)) if match else None
+            if value is None:
+                continue
+            for param_name in param_names:
+                if param_name not in direct and self.catalog.is_plausible(param_name, value):
+                    direct[param_name] = value
+
+        for param_name, value in direct.items():
+            if best.get(param_name, (None, 0))[1] < 0.9:  # High confidence for a value right after its label
+                best[param_name] = (value, 0.9)
+
+        # Context matches (0.7) only ever fill parameters that have no value yet
+        for start, end, param_names in hits:
+            for param_name in param_names:
+                if param_name in best:
+                    continue
+                value = self.context_value(text, hit_starts, end, param_name)
+                if value is not None:
+                    best[param_name] = (value, 0.7)
+
+        if self.catalog.fuzzy is not None:
+            panels = self.catalog.detect_panels(seen)
+            for param_name, (value, confidence) in self.fuzzy_values(text, hit_starts, panels).items():
+                seen.add(param_name)
+                if confidence > best.get(param_name, (None, 0))[1]:
+                    best[param_name] = (value, confidence)
+
+        return seen
+
+    def fuzzy_values(self, text: str, hit_starts: List[int], panels: List[str]) -> Dict[str, Tuple[float, float]]:
+        """Values on lines whose label didn't match exactly, resolved by fuzzy label score
+
+        The label is everything before the first token starting with a
+        digit, and it is matched against the aliases of the panels found
+        in the text (the whole catalog if none were). Confidence is 0.9
+        scaled by the match score, so an exact hit always wins.
+        """
+        labels = []
+        value_tokens = []
+        line_start = 0
+        for line in text.split("\n"):
+            line_end = line_start + len(line)
+            next_hit = bisect.bisect_left(hit_starts, line_start)
+            exact = next_hit < len(hit_starts) and hit_starts[next_hit] < line_end
+            line_start = line_end + 1
+            if exact:
+                continue
+            parsed = self.line_label(line)
+            if parsed is not None:
+                labels.append(parsed[0])
+                value_tokens.append(parsed[1])
+
+        values: Dict[str, Tuple[float, float]] = {}
+        for match, tokens in zip(self.catalog.fuzzy_match(labels, panels), value_tokens):
+            if match is None:
+                continue
+            param_names, score = match
+            confidence = round(0.9 * score / 100, 2)
+            for param_name in param_names:
+                value = next(
+                    (value for value in map(self.parse_value, tokens)
+                     if value is not None and self.catalog.is_plausible(param_name, value)),
+                    None
+                )
+                if value is not None and confidence > values.get(param_name, (None, 0))[1]:
+                    values[param_name] = (value, confidence)
+        return values
+
+    def line_label(self, line: str) -> Optional[Tuple[str, List[str]]]:
+        """(canonical label, value tokens) of a line with a label before its first value, else None"""
+        line_labels = self.line_labels
+        if line in line_labels:
+            return line_labels[line]
+        if len(line_labels) > self.VALUE_CACHE_SIZE:
+            line_labels.clear()
+        parsed = None
+        tokens = line.split()
+        first_value = next(
+            (index for index, token in enumerate(tokens) if token.strip(self.PUNCTUATION)[:1].isdigit()), 0
+        )
+        if first_value:
+            label = canonical_alias(" ".join(tokens[:first_value])).strip(self.LABEL_TRIM)
+            if len(label) >= FUZZY_MIN_LABEL_LENGTH:
+                parsed = (label, tokens[first_value:])
+        line_labels[line] = parsed
+        return parsed
+
+    def patient(self, text: str, patient: Dict[str, Any]) -> None:
+        """Fill in the patient's sex ("M"/"F") and age in years from report header text"""
+        if "sex" not in patient:
+            match = self.SEX_RE.search(text)
+            if match:
+                patient["sex"] = (match.group(1) or match.group(2))[0].upper()
+        if "age" not in patient:
+            match = self.AGE_RE.search(text)
+            if match:
+                age = float(match.group(1))
+                unit = (match.group(2) or "y")[0].lower()
+                # A bare "M" after the age is more often the sex than months
+                if unit == "m" and len(match.group(2)) > 1:
+                    age = round(age / 12, 2)
+                elif unit == "d":
+                    age = round(age / 365, 2)
+                if 0 <= age <= 120:
+                    patient["age"] = int(age) if age == int(age) else age
+
+class FuzzyParameterExtractor:
+    """Enhanced parameter extraction with fuzzy matching and context awareness"""
+
+    # Fix common OCR errors in values
+    OCR_REPLACEMENTS = {
+        '0': ['O', 'o', '°'],
+        '1': ['I', 'l', '|'],
+        '5': ['S', 's'],
+        '6': ['G', 'g'],
+        '8': ['B'],
+        '.': [','],
+        ':': [';'],
+        '-': ['—', '–', '_'],
+        '%': ['X', 'x'],
+        ' ': ['  ', '\t']
+    }
+
+    def __init__(self, catalog: Optional[ReportCatalog] = None):
+        self.catalog = catalog or report_catalog
+        self.engine = CompiledExtractionEngine.for_catalog(self.catalog, self.OCR_REPLACEMENTS)
+
     def is_reasonable_value(self, param_name: str, value: float) -> bool:
         """Check if extracted value is within reasonable medical range"""
-        reasonable_ranges = {
-            "Hemoglobin": (5.0, 25.0),
-            "RBC": (1.0, 10.0),
-            "WBC": (1000, 50000),
-            "Platelets": (0.5, 10.0),
-            "PCV": (15.0, 70.0),
-            "MCV": (50.0, 150.0),
-            "MCH": (15.0, 50.0),
-            "MCHC": (25.0, 45.0),
-            "RDW-CV": (8.0, 25.0),
-            "Polymorphs": (10.0, 95.0),
-            "Lymphocytes": (5.0, 70.0),
-            "Monocytes": (0.0, 20.0),
-            "Eosinophils": (0.0, 15.0),
-            "Basophils": (0.0, 5.0)
-        }
-        
-        if param_name in reasonable_ranges:
-            min_val, max_val = reasonable_ranges[param_name]
-            return min_val <= value <= max_val
-        
-        return True  # If no range defined, accept value
-    
-    def extract_parameters_fuzzy(self, texts: List[str]) -> Dict:
-        """Extract parameters using fuzzy matching across multiple text extractions"""
+        return self.catalog.is_plausible(param_name, value)
+
+    def scan_text(self, text: str, best: Dict[str, Tuple[float, float]]) -> Set[str]:
+        """Update best (param -> (value, confidence)) with the matches found in one OCR text"""
+        return self.engine.scan(text, best)
+
+    def build_results(self, best: Dict[str, Tuple[float, float]],
+                      patient: Optional[Dict[str, Any]] = None) -> Tuple[Dict, Dict, Dict]:
+        """Turn the best (value, confidence) per parameter into the API structures
+
+        Reference ranges follow the patient's sex and age when the report
+        states them and the catalog has specific ranges.
+        """
+        patient = patient or {}
         parameters = {}
         categories = {}
         confidence_scores = {}
-        
-        for param_name, config in self.medical_patterns.items():
-            best_value = None
-            best_confidence = 0
-            
-            # Try each text extraction
-            for text in texts:
-                processed_text = self.preprocess_text(text)
-                
-                # Method 1: Try regex patterns
-                for pattern in config["patterns"]:
-                    try:
-                        matches = re.finditer(pattern, processed_text, re.IGNORECASE)
-                        for match in matches:
-                            if match.group(1):
-                                try:
-                                    value = float(match.group(1))
-                                    if self.is_reasonable_value(param_name, value):
-                                        confidence = 0.9  # High confidence for regex match
-                                        if confidence > best_confidence:
-                                            best_value = value
-                                            best_confidence = confidence
-                                except ValueError:
-                                    continue
-                    except Exception as e:
-                        logger.warning(f"Regex pattern failed for {param_name}: {str(e)}")
-                        continue
-                
-                # Method 2: Context-based extraction
-                if best_confidence < 0.8:  # Only if regex didn't find good match
-                    context_value = self.extract_value_near_parameter(processed_text, param_name)
-                    if context_value is not None:
-                        confidence = 0.7  # Medium confidence for context match
-                        if confidence > best_confidence:
-                            best_value = context_value
-                            best_confidence = confidence
-            
+
+        for param_name, analyte in self.catalog.analytes.items():
+            best_value, best_confidence = best.get(param_name, (None, 0))
+
             # If we found a value with reasonable confidence
             if best_value is not None and best_confidence > 0.5:
-                status = self.determine_status(best_value, config["normal_range"])
+                normal_range, low, high = analyte.reference_range(patient.get("sex"), patient.get("age"))
+                status = Analyte.status(best_value, low, high)
                 interpretation = self.get_health_interpretation(param_name, best_value, status)
-                
+
                 param_data = {
                     "value": best_value,
-                    "unit": config["unit"],
-                    "normal_range": config["normal_range"],
+                    "unit": analyte.unit,
+                    "normal_range": normal_range,
                     "status": status,
                     "interpretation": interpretation,
-                    "category": config["category"],
+                    "category": analyte.category,
                     "confidence": round(best_confidence, 2)
                 }
-                
+
                 parameters[param_name] = param_data
                 confidence_scores[param_name] = best_confidence
-                
+
                 # Group by category
-                category = config["category"]
+                category = analyte.category
                 if category not in categories:
                     categories[category] = {}
                 categories[category][param_name] = param_data
-        
+
         return parameters, categories, confidence_scores
-    
+
+    def extract_parameters_fuzzy(self, texts: List[str]) -> Tuple[Dict, Dict, Dict]:
+        """Extract parameters using fuzzy matching across multiple text extractions"""
+        best = {}
+        patient = {}
+        for text in texts:
+            self.scan_text(text, best)
+            self.engine.patient(text, patient)
+        return self.build_results(best, patient)
+
     def determine_status(self, value: float, normal_range: str) -> str:
         """Determine if a value is normal, high, or low"""
         try:
-            if '-' in normal_range:
-                min_val, max_val = map(float, normal_range.split('-'))
-                if value < min_val:
-                    return "Low"
-                elif value > max_val:
-                    return "High"
-                else:
-                    return "Normal"
-            else:
-                return "Normal"
-        except:
+            return Analyte.status(value, *parse_range(normal_range))
+        except CatalogError:
             return "Unknown"
-    
+
     def get_health_interpretation(self, parameter: str, value: float, status: str) -> str:
         """Provide enhanced health interpretation"""
-        interpretations = {
-            "Hemoglobin": {
-                "Low": "May indicate anemia, blood loss, or nutritional deficiency",
-                "High": "May indicate dehydration, lung disease, or living at high altitude",
-                "Normal": "Healthy oxygen-carrying capacity"
-            },
-            "RBC": {
-                "Low": "May indicate anemia, blood loss, or bone marrow problems",
-                "High": "May indicate dehydration, lung disease, or kidney problems",
-                "Normal": "Healthy red blood cell count"
-            },
-            "WBC": {
-                "Low": "May indicate weakened immune system or bone marrow problems",
-                "High": "May indicate infection, inflammation, or blood disorders",
-                "Normal": "Healthy immune system function"
-            },
-            "Platelets": {
-                "Low": "May indicate bleeding disorders or bone marrow problems",
-                "High": "May indicate blood clotting issues or inflammatory conditions",
-                "Normal": "Healthy blood clotting ability"
-            },
-            "PCV": {
-                "Low": "May indicate anemia or blood loss",
-                "High": "May indicate dehydration or lung disease",
-                "Normal": "Healthy blood volume percentage"
-            },
-            "MCV": {
-                "Low": "May indicate iron deficiency or thalassemia",
-                "High": "May indicate vitamin B12 or folate deficiency",
-                "Normal": "Healthy red blood cell size"
-            },
-            "MCH": {
-                "Low": "May indicate iron deficiency anemia",
-                "High": "May indicate vitamin B12 or folate deficiency",
-                "Normal": "Healthy hemoglobin content per cell"
-            },
-            "MCHC": {
-                "Low": "May indicate iron deficiency or thalassemia",
-                "High": "May indicate spherocytosis or dehydration",
-                "Normal": "Healthy hemoglobin concentration"
-            },
-            "RDW-CV": {
-                "Low": "Uniform red blood cell size",
-                "High": "May indicate mixed anemia types or nutritional deficiencies",
-                "Normal": "Healthy red blood cell size variation"
-            }
+        analyte = self.catalog.analytes.get(parameter)
+        interpretations = analyte.interpretations if analyte else self.catalog.data.get("default_interpretations", {})
+        return interpretations.get(status, "Consult your doctor for interpretation")
+
+def extraction_rules_version() -> str:
+    """Changes whenever the report catalog or the extraction rules change, invalidating cached results"""
+    return rules_fingerprint(
+        PIPELINE_VERSION,
+        report_catalog.fingerprint,
+        FuzzyParameterExtractor.OCR_REPLACEMENTS
+    )
+
+class IncrementalExtraction:
+    """Feeds OCR texts to FuzzyParameterExtractor one at a time as they arrive"""
+    
+    # Regex hits are the best confidence the extractor can produce
+    COMPLETE_CONFIDENCE = 0.9
+    
+    def __init__(self, extractor: Optional[FuzzyParameterExtractor] = None,
+                 complete_confidence: float = COMPLETE_CONFIDENCE):
+        self.extractor = extractor or FuzzyParameterExtractor()
+        self.complete_confidence = complete_confidence
+        self.best: Dict[str, Tuple[float, float]] = {}
+        self.texts: List[str] = []
+        # Analytes whose labels appeared in any text, and the patient's sex and age
+        self.seen: Set[str] = set()
+        self.patient: Dict[str, Any] = {}
+        # (variant, config) of the pass that produced each best value
+        self.sources: Dict[str, Tuple[str, str]] = {}
+        # Optional progress callback, e.g. for the job API
+        self.listener: Optional[Callable[[Dict], None]] = None
+        self.stage: Optional[str] = None
+        self.passes_done = 0
+        # (variant, config) passes already fed in, which the cascade won't repeat
+        self.passes_tried: Set[Tuple[str, str]] = set()
+        # The request's deadline and client connection, if it has one
+        self.deadline: Optional[Deadline] = None
+        # (pHash, dHash) of the page, and the cached result of a near-duplicate it turned out to be
+        self.fingerprint: Optional[Tuple[int, int]] = None
+        self.reused: Optional[Dict] = None
+    
+    def report(self, stage: Optional[str] = None) -> None:
+        """Tell the listener the current stage and the parameters found so far"""
+        if stage is not None:
+            self.stage = stage
+        if self.listener is None:
+            return
+        found = {
+            name: {"value": value, "confidence": round(confidence, 2)}
+            for name, (value, confidence) in self.best.items()
+            if value is not None and confidence > 0.5
         }
+        self.listener({"stage": self.stage, "ocr_passes": self.passes_done,
+                       "parameters_found": len(found), "parameters": found})
+    
+    async def enter_stage(self, stage: str) -> None:
+        """Report the new stage, then stop here if the deadline passed or the client left"""
+        self.report(stage)
+        if self.deadline is not None:
+            await self.deadline.check(stage)
+    
+    def ocr_timeout(self) -> float:
+        """Seconds an OCR call may run before it is stopped; 0 for no limit"""
+        if self.deadline is None:
+            return 0
+        return max(0.001, self.deadline.remaining())
+    
+    def note_sources(self, before: Dict[str, Tuple[float, float]], source: Optional[Tuple[str, str]]) -> bool:
+        changed = [name for name, best in self.best.items() if before.get(name) != best]
+        if source is not None:
+            for name in changed:
+                self.sources[name] = source
+        return bool(changed)
+    
+    def add_text(self, text: str, source: Optional[Tuple[str, str]] = None) -> bool:
+        """Scan one text; returns True if it found or improved any parameter"""
+        before = dict(self.best)
+        self.texts.append(text)
+        with span(stage_seconds, "stages", "extraction", stage="extraction"):
+            self.seen.update(self.extractor.scan_text(text, self.best))
+            self.extractor.engine.patient(text, self.patient)
+        return self.note_sources(before, source)
+    
+    def add_values(self, values: Dict[str, Tuple[float, float]], text: Optional[str] = None,
+                   source: Optional[Tuple[str, str]] = None) -> bool:
+        """Merge (value, confidence) pairs found by another extractor; higher confidence wins"""
+        before = dict(self.best)
+        if text is not None:
+            self.texts.append(text)
+            self.extractor.engine.patient(text, self.patient)
+        self.seen.update(values)
+        for param_name, (value, confidence) in values.items():
+            if confidence > self.best.get(param_name, (None, 0))[1]:
+                self.best[param_name] = (value, confidence)
+        return self.note_sources(before, source)
+    
+    @property
+    def complete(self) -> bool:
+        """True once the detected panels' analytes, and any others of theirs seen on
+        the report, all have a value at the completion confidence"""
+        catalog = self.extractor.catalog
+        panels = catalog.detect_panels(self.seen)
+        expected = set(catalog.expected(panels))
+        expected.update(name for name in self.seen if catalog.analytes[name].panel in panels)
+        return bool(expected) and all(
+            self.best.get(name, (None, 0))[1] >= self.complete_confidence
+            for name in expected
+        )
+    
+    def results(self) -> Tuple[Dict, Dict, Dict]:
+        return self.extractor.build_results(self.best, self.patient)
+    
+    def report_type(self) -> Dict:
+        """Panels detected from the analytes that made it into the results"""
+        found = [name for name, (value, confidence) in self.best.items() if value is not None and confidence > 0.5]
+        return self.extractor.catalog.report_type(found)
+
+class LayoutExtractor:
+    """Pairs parameter labels with values using word boxes from one image_to_data pass
+
+    Words are grouped into rows through Tesseract's line ids, and lines
+    whose boxes overlap vertically are merged so table columns that
+    Tesseract split into separate blocks end up on the same row. Each
+    label takes the first plain number to its right on that row, and the
+    confidence comes from Tesseract's own word confidences.
+    """
+    
+    CONFIG = '--oem 3 --psm 6'
+    
+    # Punctuation that sticks to words in OCR output ("(Hb)", "Count:")
+    PUNCTUATION = ':;,()[]{}|*'
+    
+    @staticmethod
+    def run_image_to_data(img: np.ndarray, config: str = CONFIG, timeout: float = 0) -> Dict[str, list]:
+        """One Tesseract pass returning words, line ids, boxes and confidences"""
+        try:
+            return get_ocr_backend().image_to_data(img, config, timeout)
+        except Exception as e:
+            logger.warning(f"image_to_data failed: {config}, Error: {str(e)}")
+            return {}
+    
+    def __init__(self, extractor: Optional[FuzzyParameterExtractor] = None):
+        self.extractor = extractor or FuzzyParameterExtractor()
         
-        default_interpretation = {
-            "Low": f"Below normal range - consult your doctor",
-            "High": f"Above normal range - consult your doctor", 
-            "Normal": f"Within normal range"
-        }
+        # First label token -> (label tokens, parameter), longest labels first
+        self.label_index: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+        for param_name, analyte in self.extractor.catalog.analytes.items():
+            for alias in analyte.aliases:
+                tokens = tuple(self.tokenize(alias))
+                if tokens:
+                    self.label_index.setdefault(tokens[0], []).append((tokens, param_name))
+        for candidates in self.label_index.values():
+            candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
+    
+    def tokenize(self, text: str) -> List[str]:
+        """Folded like the catalog matcher, so "Hem0globin" still finds its label"""
+        for char in self.PUNCTUATION:
+            text = text.replace(char, ' ')
+        return fold(text).split()
+    
+    def words(self, data: Dict[str, list]) -> List[Dict]:
+        words = []
+        for i, text in enumerate(data.get("text", [])):
+            conf = float(data["conf"][i])
+            if not text or not text.strip() or conf < 0:
+                continue
+            words.append({
+                "text": text.strip(),
+                "left": data["left"][i],
+                "top": data["top"][i],
+                "right": data["left"][i] + data["width"][i],
+                "bottom": data["top"][i] + data["height"][i],
+                "conf": conf,
+                "line": (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            })
+        return words
+    
+    @staticmethod
+    def rows(words: List[Dict]) -> List[List[Dict]]:
+        """Tesseract lines merged by vertical overlap, words sorted left to right"""
+        lines: Dict[Tuple, List[Dict]] = {}
+        for word in words:
+            lines.setdefault(word["line"], []).append(word)
+        
+        spans = sorted(
+            (
+                (min(w["top"] for w in line_words), max(w["bottom"] for w in line_words), line_words)
+                for line_words in lines.values()
+            ),
+            key=lambda span: (span[0] + span[1]) / 2
+        )
         
-        return interpretations.get(parameter, default_interpretation).get(status, "Consult your doctor for interpretation")
+        rows = []
+        row_top = row_bottom = None
+        for top, bottom, line_words in spans:
+            overlap = min(bottom, row_bottom) - max(top, row_top) if rows else 0
+            if rows and overlap >= 0.5 * min(bottom - top, row_bottom - row_top):
+                rows[-1].extend(line_words)
+                row_top, row_bottom = min(row_top, top), max(row_bottom, bottom)
+            else:
+                rows.append(list(line_words))
+                row_top, row_bottom = top, bottom
+        
+        return [sorted(row, key=lambda w: w["left"]) for row in rows]
+    
+    def parse_value(self, text: str) -> Optional[float]:
+        """Plain number from one word, fixing OCR look-alikes; ranges like 12-15 don't count"""
+        return self.extractor.engine.parse_value(text)
+    
+    def match_labels(self, row: List[Dict]) -> List[Tuple[str, int, int]]:
+        """(parameter, first word index, word index after the label) for labels in a row"""
+        tokens = [" ".join(self.tokenize(word["text"])) for word in row]
+        labels = []
+        i = 0
+        while i < len(tokens):
+            matched = False
+            for label_tokens, param_name in self.label_index.get(tokens[i], []):
+                end = i + len(label_tokens)
+                if tuple(tokens[i:end]) == label_tokens:
+                    labels.append((param_name, i, end))
+                    i = end
+                    matched = True
+                    break
+            if not matched:
+                i += 1
+        return labels
+    
+    def extract(self, data: Dict[str, list]) -> Tuple[Dict[str, Tuple[float, float]], str, Dict]:
+        """Return param -> (value, confidence), the reconstructed text and layout stats"""
+        words = self.words(data)
+        rows = self.rows(words)
+        values: Dict[str, Tuple[float, float]] = {}
+        
+        for row in rows:
+            labels = self.match_labels(row)
+            for label_number, (param_name, start, end) in enumerate(labels):
+                label_conf = min(word["conf"] for word in row[start:end])
+                label_right = max(word["right"] for word in row[start:end])
+                # Stop at the next label so a missing value doesn't borrow its neighbour's
+                stop = labels[label_number + 1][1] if label_number + 1 < len(labels) else len(row)
+                for word in row[end:stop]:
+                    if word["left"] < label_right:
+                        continue
+                    value = self.parse_value(word["text"])
+                    if value is None:
+                        continue
+                    if self.extractor.is_reasonable_value(param_name, value):
+                        confidence = min(label_conf, word["conf"]) / 100
+                        if confidence > values.get(param_name, (None, 0))[1]:
+                            values[param_name] = (value, confidence)
+                    break
+        
+        text = "\n".join(" ".join(word["text"] for word in row) for row in rows)
+        return values, text, {"words": len(words), "rows": len(rows), "parameters_found": len(values)}
+
+class TableExtractor:
+    """Reads a report's results table cell by cell instead of OCRing the whole page
+
+    The structure comes from OpenCV alone: glyph-sized components (ruling
+    lines are too wide to count) are dilated along the text line into
+    cell blobs, blobs overlapping vertically form rows, and x ranges
+    filled in across rows form columns. The leftmost column holds the
+    labels and the next one the results. Label cells and result cells are
+    pasted side by side into two single-line strips, so a page costs two
+    small Tesseract calls whatever its row count. The result strip is
+    read with a digit whitelist, and unit and reference range columns are
+    never OCR'd, so their numbers can't be taken for values.
+    """
+    
+    # Structure and cells come from the blurred Otsu threshold, which noise barely
+    # speckles; results it misreads are read again from the grayscale page
+    VARIANT = "otsu"
+    LABEL_CONFIG = '--oem 3 --psm 7'
+    VALUE_CONFIG = '--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789.,'
+    # Lines above the table (patient, age, sex) are read as one block
+    HEADER_CONFIG = '--oem 3 --psm 6'
+    CONFIGS = (LABEL_CONFIG, VALUE_CONFIG, HEADER_CONFIG)
+    
+    # Rows with both a label and a result needed before a page counts as a table
+    MIN_ROWS = int(os.getenv("TABLE_MIN_ROWS", "3"))
+    # Share of the multi-cell rows an x range must be filled in to be a column
+    COLUMN_SUPPORT = 0.25
+    # Glyph height result cells are resampled to: on lines this short Tesseract
+    # drops decimal points at the ~24 px the full-page passes are fed
+    VALUE_TEXT_HEIGHT = float(os.getenv("TABLE_VALUE_TEXT_HEIGHT", "36"))
+    # Longer strips are split (Tesseract rejects images over 32767 px wide)
+    STRIP_MAX_WIDTH = 16000
+    
+    def __init__(self, extractor: Optional[FuzzyParameterExtractor] = None):
+        self.extractor = extractor or FuzzyParameterExtractor()
+    
+    @staticmethod
+    def cell_boxes(binary: np.ndarray) -> Tuple[List[Tuple[int, int, int, int]], Optional[float]]:
+        """(x, y, w, h) of text blobs, words closer than a glyph height merged, and the median glyph height"""
+        glyphs, text_height = ImageNormalizer.text_components(cv2.bitwise_not(binary))
+        if text_height is None:
+            return [], None
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, int(text_height * 1.2)), max(1, int(text_height / 3))))
+        blobs = cv2.dilate(glyphs, kernel)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(blobs, connectivity=8)
+        boxes = [(int(x), int(y), int(w), int(h)) for x, y, w, h, _ in stats[1:]
+                 if text_height * 0.6 <= h <= text_height * 3]
+        return boxes, text_height
+    
+    @staticmethod
+    def rows(boxes: List[Tuple[int, int, int, int]]) -> List[List[Tuple[int, int, int, int]]]:
+        """Boxes grouped by vertical overlap, top to bottom, each row left to right"""
+        rows = []
+        row_top = row_bottom = None
+        for box in sorted(boxes, key=lambda box: box[1] + box[3] / 2):
+            top, bottom = box[1], box[1] + box[3]
+            overlap = min(bottom, row_bottom) - max(top, row_top) if rows else 0
+            if rows and overlap >= 0.5 * min(bottom - top, row_bottom - row_top):
+                rows[-1].append(box)
+                row_top, row_bottom = min(row_top, top), max(row_bottom, bottom)
+            else:
+                rows.append([box])
+                row_top, row_bottom = top, bottom
+        return [sorted(row) for row in rows]
+    
+    @staticmethod
+    def columns(rows: List[List[Tuple[int, int, int, int]]], width: int) -> List[Tuple[int, int]]:
+        """(start, end) x ranges filled in at least COLUMN_SUPPORT of the rows, left to right"""
+        coverage = np.zeros(width, np.int32)
+        for row in rows:
+            filled = np.zeros(width, bool)
+            for x, _, w, _ in row:
+                filled[x:x + w] = True
+            coverage += filled
+        supported = (coverage >= max(2, TableExtractor.COLUMN_SUPPORT * len(rows))).astype(np.int8)
+        edges = np.diff(np.concatenate(([0], supported, [0])))
+        return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+    
+    @staticmethod
+    def union(boxes: List[Tuple[int, int, int, int]]) -> Tuple[int, int, int, int]:
+        x0, y0 = min(box[0] for box in boxes), min(box[1] for box in boxes)
+        x1, y1 = max(box[0] + box[2] for box in boxes), max(box[1] + box[3] for box in boxes)
+        return x0, y0, x1 - x0, y1 - y0
+    
+    @staticmethod
+    def find_cells(binary: np.ndarray) -> Optional[Dict]:
+        """Label and result cell of every table row, or None when the page has no such table"""
+        boxes, text_height = TableExtractor.cell_boxes(binary)
+        if text_height is None:
+            return None
+        candidates = [row for row in TableExtractor.rows(boxes) if len(row) >= 2]
+        columns = TableExtractor.columns(candidates, binary.shape[1])
+        if len(columns) < 2:
+            return None
+        (label_start, _), (value_start, value_end) = columns[0], columns[1]
+        
+        labels, values = [], []
+        for row in candidates:
+            label = [box for box in row if box[0] + box[2] / 2 < value_start and box[0] + box[2] > label_start]
+            value = [box for box in row if min(box[0] + box[2], value_end) - max(box[0], value_start) > 0]
+            if label and value:
+                labels.append(TableExtractor.union(label))
+                values.append(TableExtractor.union(value))
+        if len(labels) < TableExtractor.MIN_ROWS:
+            return None
+        # The text above the first row with a label and a result (the column headings, usually)
+        table_top = min(box[1] for box in labels)
+        above = [box for box in boxes if box[1] + box[3] < table_top]
+        return {"labels": labels, "values": values, "header": TableExtractor.union(above) if above else None,
+                "text_height": text_height, "columns": len(columns)}
+    
+    @staticmethod
+    def strips(image: np.ndarray, boxes: List[Tuple[int, int, int, int]], text_height: float,
+               target_height: Optional[float] = None) -> List[Tuple[np.ndarray, List[Tuple[int, int]]]]:
+        """The boxes' crops, resampled to target_height if given, pasted left to right on white
+        lines of at most STRIP_MAX_WIDTH; returns each line with the x range of every crop on it"""
+        crops = [image[y:y + h, x:x + w] for x, y, w, h in boxes]
+        scale = target_height / text_height if target_height else 1.0
+        if abs(scale - 1.0) > 0.05:
+            crops = [cv2.resize(crop, (max(1, round(crop.shape[1] * scale)), max(1, round(crop.shape[0] * scale))),
+                                interpolation=cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA) for crop in crops]
+            text_height = target_height
+        # Gaps much under two glyph heights and Tesseract merges neighbouring cells into one word
+        pad, gap = max(2, int(text_height / 3)), max(8, int(text_height * 2))
+        chunks: List[List[np.ndarray]] = [[]]
+        width = gap
+        for crop in crops:
+            if chunks[-1] and width + crop.shape[1] + gap > TableExtractor.STRIP_MAX_WIDTH:
+                chunks.append([])
+                width = gap
+            chunks[-1].append(crop)
+            width += crop.shape[1] + gap
+        
+        strips = []
+        for chunk in chunks:
+            height = max(crop.shape[0] for crop in chunk) + 2 * pad
+            line = np.full((height, sum(crop.shape[1] for crop in chunk) + gap * (len(chunk) + 1)), 255, np.uint8)
+            slots = []
+            x = gap
+            for crop in chunk:
+                top = (height - crop.shape[0]) // 2
+                line[top:top + crop.shape[0], x:x + crop.shape[1]] = crop
+                slots.append((x, x + crop.shape[1]))
+                x += crop.shape[1] + gap
+            strips.append((line, slots))
+        return strips
+    
+    @staticmethod
+    def read_slots(data: Dict[str, list], slots: List[Tuple[int, int]]) -> List[Tuple[str, float]]:
+        """(text, lowest word confidence) per slot of a strip, from its image_to_data words"""
+        texts: List[List[str]] = [[] for _ in slots]
+        confs: List[List[float]] = [[] for _ in slots]
+        starts = [start for start, _ in slots]
+        for i, text in enumerate(data.get("text", [])):
+            conf = float(data["conf"][i])
+            if not text or not text.strip() or conf < 0:
+                continue
+            center = data["left"][i] + data["width"][i] / 2
+            # Words centered in a gap (stray marks) go to the slot on their left
+            slot = max(0, bisect.bisect_right(starts, center) - 1)
+            texts[slot].append(text.strip())
+            confs[slot].append(conf)
+        return [(" ".join(words), min(conf) if conf else 0.0) for words, conf in zip(texts, confs)]
+    
+    def match_labels(self, labels: List[Tuple[str, float]]) -> List[Optional[Tuple[FrozenSet[str], float]]]:
+        """(analytes, score out of 100) per row label, or None
+
+        Each label is matched once: exactly through the catalog's alias
+        matcher, else by fuzzy score against the panels the exact matches
+        point to, like lines without an exact label in the text scan.
+        """
+        catalog = self.extractor.catalog
+        matches: List[Optional[Tuple[FrozenSet[str], float]]] = []
+        for label, _ in labels:
+            hits = catalog.hits(label)
+            matches.append((hits[0][2], 100.0) if hits else None)
+        
+        fuzzy_rows = [i for i, match in enumerate(matches) if match is None]
+        if fuzzy_rows and catalog.fuzzy is not None:
+            panels = catalog.detect_panels(name for match in matches if match for name in match[0])
+            canonical = [canonical_alias(labels[i][0]).strip(self.extractor.engine.LABEL_TRIM) for i in fuzzy_rows]
+            for i, label, match in zip(fuzzy_rows, canonical, catalog.fuzzy_match(canonical, panels)):
+                if len(label) >= FUZZY_MIN_LABEL_LENGTH:
+                    matches[i] = match
+        return matches
+    
+    def extract(self, matches: List[Optional[Tuple[FrozenSet[str], float]]], labels: List[Tuple[str, float]],
+                values: List[Tuple[str, float]]) -> Tuple[Dict[str, Tuple[float, float]], List[int]]:
+        """param -> (value, confidence) from each row's matched label and result text, and
+        the rows whose label matched but whose result was missing or implausible"""
+        found: Dict[str, Tuple[float, float]] = {}
+        unread = []
+        for row, (match, (_, label_conf), (text, value_conf)) in enumerate(zip(matches, labels, values)):
+            if match is None:
+                continue
+            value = self.extractor.engine.parse_value(text.replace(" ", "")) if text else None
+            param_names, score = match
+            confidence = min(label_conf, value_conf) / 100 * score / 100
+            plausible = [name for name in param_names
+                         if value is not None and self.extractor.is_reasonable_value(name, value)]
+            if not plausible:
+                unread.append(row)
+            for param_name in plausible:
+                if confidence > found.get(param_name, (None, 0))[1]:
+                    found[param_name] = (value, confidence)
+        return found, unread
+
+def decode_reduction(contents: bytes) -> int:
+    """Largest JPEG DCT scaling factor that still leaves OCR_MAX_SIDE pixels"""
+    size = jpeg_size(contents)
+    if size is None:
+        return 1
+    for factor in DECODE_REDUCTION_FACTORS:
+        if max(size) / factor >= ImageNormalizer.MAX_SIDE:
+            return factor
+    return 1
+
+def decode_image(contents: bytes) -> Tuple[np.ndarray, int]:
+    """Decode uploaded bytes into a BGR image, returning it with the decode reduction factor"""
+    try:
+        reduction = decode_reduction(contents)
+        flags = {
+            1: cv2.IMREAD_COLOR,
+            2: cv2.IMREAD_REDUCED_COLOR_2,
+            4: cv2.IMREAD_REDUCED_COLOR_4,
+            8: cv2.IMREAD_REDUCED_COLOR_8
+        }[reduction]
+        # frombuffer is a view, so the upload buffer is decoded in place
+        nparr = np.frombuffer(contents, np.uint8)
+        img = cv2.imdecode(nparr, flags)
+        
+        if img is None:
+            raise HTTPException(status_code=400, detail="Could not decode image")
+        
+        logger.info(f"Image shape: {img.shape}" + (f" (decoded at 1/{reduction})" if reduction > 1 else ""))
+        return img, reduction
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Image decoding error: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+
+def normalize_page(img: np.ndarray, crop: Optional[bool] = None) -> Tuple[np.ndarray, Dict]:
+    try:
+        # Resample to the OCR text size and crop to the results region
+        with span(stage_seconds, "stages", "normalize", stage="normalize"):
+            img, normalization = ImageNormalizer.normalize(img, crop)
+        logger.info(f"Normalized image: {normalization}")
+        return img, normalization
+    except Exception as e:
+        logger.error(f"Image preprocessing error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Image preprocessing failed: {str(e)}")
+
+def build_variants(img: np.ndarray, orientation: Dict) -> PreprocessedVariants:
+    try:
+        # Deskewed once; every variant inherits it
+        with span(stage_seconds, "stages", "deskew", stage="deskew"):
+            img = PageOrienter.deskew(img, orientation)
+        logger.info(f"Page orientation: {orientation}")
+        
+        preprocessor = EnhancedImagePreprocessor()
+        variants = preprocessor.variants(img, orientation=orientation)
+        
+        # Cheap quality check decides which expensive variants to skip
+        with span(stage_seconds, "stages", "quality", stage="quality"):
+            image_quality = variants.quality()
+        names = variants.names()
+        if names:
+            variants.get(names[0])
+        
+        logger.info(f"Image quality: {image_quality}, variants: {names}")
+        return variants
+        
+    except Exception as e:
+        logger.error(f"Image preprocessing error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Image preprocessing failed: {str(e)}")
+
+async def prepare_variants(img: np.ndarray, crop: Optional[bool] = None) -> Tuple[PreprocessedVariants, Dict]:
+    """CPU stage ahead of OCR: normalization, page orientation, quality check and the first variant the cascade needs"""
+    page, normalization = await run_in_threadpool(normalize_page, img, crop)
+    orientation = {"rotation": 0, "rotation_confidence": None}
+    if PageOrienter.DETECT_ROTATION:
+        # OSD is a Tesseract call, so it queues on the OCR pool like the passes do
+        try:
+            with span(stage_seconds, "stages", "osd", stage="osd"):
+                [rotation] = await ocr_pool.map(PageOrienter.detect_rotation, [(page,)])
+        except OCRPoolFullError as e:
+            logger.warning(f"Rejecting image: {str(e)}")
+            raise HTTPException(status_code=503, detail="Server is busy, please retry shortly")
+        if rotation is not None:
+            orientation["rotation_confidence"] = round(rotation[1], 2)
+        degrees = PageOrienter.quarter_turn(rotation)
+        if degrees:
+            # The crop was found on the sideways page, so normalize the upright one again
+            orientation["rotation"] = degrees
+            page, normalization = await run_in_threadpool(
+                lambda: normalize_page(PageOrienter.turn(img, degrees), crop)
+            )
+    variants = await run_in_threadpool(build_variants, page, orientation)
+    return variants, normalization
+
+def build_summary(parameters: Dict, confidence_scores: Dict, report_type: Optional[Dict] = None) -> Dict:
+    """Generate enhanced summary"""
+    total_params = len(parameters)
+    abnormal_params = len([p for p in parameters.values() if p["status"] != "Normal"])
+    avg_confidence = sum(confidence_scores.values()) / len(confidence_scores) if confidence_scores else 0
+    
+    return {
+        "total_parameters": total_params,
+        "abnormal_parameters": abnormal_params,
+        "overall_status": "Normal" if abnormal_params == 0 else f"{abnormal_params} parameter(s) abnormal",
+        "report_type": " + ".join(panel["name"] for panel in report_type["panels"]) if report_type and report_type["panels"] else "Medical Report",
+        "average_confidence": round(avg_confidence, 2),
+        "extraction_quality": "High" if avg_confidence > 0.8 else "Medium" if avg_confidence > 0.6 else "Low"
+    }
+
+RESPONSE_FORMATS = ("full", "compact")
+
+def check_format(format: str) -> None:
+    if format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(RESPONSE_FORMATS)}")
+
+def compact_result(result: Dict) -> Dict:
+    """Values, status and confidence only; units, ranges and interpretations come from /catalog
+
+    "catalog" is the catalog fingerprint (the /catalog ETag) the result was
+    built against, so clients know when their cached copy is stale. Error
+    items pass through unchanged.
+    """
+    if "parameters" not in result:
+        return result
+    compact = {
+        "format": "compact",
+        "catalog": report_catalog.fingerprint,
+        "parameters": {
+            name: {"value": parameter["value"], "status": parameter["status"],
+                   "confidence": parameter["confidence"]}
+            for name, parameter in result["parameters"].items()
+        },
+        "report_type": [panel["panel"] for panel in (result.get("report_type") or {}).get("panels", [])],
+        "abnormal_parameters": result["summary"]["abnormal_parameters"],
+    }
+    for key in ("index", "filename", "status", "patient", "history", "risk_prediction", "timings"):
+        if key in result:
+            compact[key] = result[key]
+    return compact
+
+def format_result(result: Dict, format: str) -> Dict:
+    return compact_result(result) if format == "compact" else result
+
+async def read_layout(variants: PreprocessedVariants, extraction: IncrementalExtraction) -> Dict:
+    """Layout mode's word-level pass over the first variant"""
+    name = variants.names()[0]
+    image = await run_in_threadpool(variants.get, name)
+    [(data, seconds)] = await ocr_pool.map(
+        timed_call, [(LayoutExtractor.run_image_to_data, image, LayoutExtractor.CONFIG, extraction.ocr_timeout())]
+    )
+    record(ocr_pass_seconds, "ocr_passes", f"{name}/layout", seconds, variant=name, config="layout")
+    with span(stage_seconds, "stages", "extraction", stage="extraction"):
+        values, text, layout_info = LayoutExtractor(extraction.extractor).extract(data)
+    extraction.add_values(values, text=text if text else None, source=(name, "layout"))
+    extraction.passes_done += 1
+    extraction.report()
+    return {"passes_run": 1, "passes_available": 1, "stop_reason": "complete", "layout": layout_info}
+
+async def read_strips(parts: List[Tuple[str, np.ndarray, str]], timeout: float, variant: str) -> List:
+    """OCR (kind, strip, config) parts in one batch; image_to_data for cell strips, text for the header"""
+    jobs = [(EnhancedTextExtractor.run_single_config if kind == "header" else LayoutExtractor.run_image_to_data,
+             image, config, timeout) for kind, image, config in parts]
+    results = await ocr_pool.map(timed_call, jobs)
+    for (kind, _, _), (_, seconds) in zip(parts, results):
+        record(ocr_pass_seconds, "ocr_passes", f"{variant}/table_{kind}", seconds, variant=variant, config=f"table_{kind}")
+    return [output for output, _ in results]
+
+async def read_table(variants: PreprocessedVariants, extraction: IncrementalExtraction) -> Dict:
+    """Table mode's pass: finds the table's cells and OCRs only the label and result
+    strips plus the lines above the table, in one batch. Results that come back
+    missing or implausible get one more read, from the grayscale page"""
+    name = TableExtractor.VARIANT
+    image = await run_in_threadpool(variants.get, name)
+    with span(stage_seconds, "stages", "table_structure", stage="table_structure"):
+        cells = await run_in_threadpool(TableExtractor.find_cells, image)
+    if cells is None:
+        logger.info("No results table found, falling back to the cascade")
+        return {"passes_run": 0, "passes_available": 0, "stop_reason": "no_table", "table": {"rows": 0}}
+    
+    text_height = cells["text_height"]
+    label_strips = await run_in_threadpool(TableExtractor.strips, image, cells["labels"], text_height)
+    value_strips = await run_in_threadpool(
+        TableExtractor.strips, image, cells["values"], text_height, TableExtractor.VALUE_TEXT_HEIGHT
+    )
+    parts = [("labels", line, TableExtractor.LABEL_CONFIG) for line, _ in label_strips]
+    parts += [("values", line, TableExtractor.VALUE_CONFIG) for line, _ in value_strips]
+    if cells["header"] is not None:
+        x, y, w, h = cells["header"]
+        margin = int(text_height / 2)
+        header = image[max(0, y - margin):y + h + margin, max(0, x - margin):x + w + margin]
+        parts.append(("header", header, TableExtractor.HEADER_CONFIG))
+    outputs = await read_strips(parts, extraction.ocr_timeout(), name)
+    
+    read: Dict[str, list] = {"labels": [], "values": [], "header": []}
+    slots = iter(slot for _, slot in (*label_strips, *value_strips))
+    for (kind, _, _), output in zip(parts, outputs):
+        read[kind].extend([output] if kind == "header" else TableExtractor.read_slots(output, next(slots)))
+    
+    table = TableExtractor(extraction.extractor)
+    with span(stage_seconds, "stages", "extraction", stage="extraction"):
+        matches = table.match_labels(read["labels"])
+        found, unread = table.extract(matches, read["labels"], read["values"])
+    passes, ocr_area = len(parts), sum(part[1].size for part in parts)
+    
+    if unread:
+        retry_strips = await run_in_threadpool(
+            TableExtractor.strips, variants.gray, [cells["values"][row] for row in unread], text_height,
+            TableExtractor.VALUE_TEXT_HEIGHT
+        )
+        retry_parts = [("retry", line, TableExtractor.VALUE_CONFIG) for line, _ in retry_strips]
+        retry_outputs = await read_strips(retry_parts, extraction.ocr_timeout(), "gray")
+        rereads = [reading for (_, slot), output in zip(retry_strips, retry_outputs)
+                   for reading in TableExtractor.read_slots(output, slot)]
+        retried, _ = table.extract([matches[row] for row in unread], [read["labels"][row] for row in unread], rereads)
+        for param_name, (value, confidence) in retried.items():
+            if confidence > found.get(param_name, (None, 0))[1]:
+                found[param_name] = (value, confidence)
+        for row, reading in zip(unread, rereads):
+            read["values"][row] = reading
+        passes += len(retry_parts)
+        ocr_area += sum(part[1].size for part in retry_parts)
+    
+    rows = [f"{label} {value}" for (label, _), (value, _) in zip(read["labels"], read["values"])]
+    text = "\n".join(part for part in (*read["header"], *rows) if part.strip())
+    extraction.add_values(found, text=text if text else None, source=(name, "table"))
+    extraction.passes_done += passes
+    extraction.report()
+    
+    table_info = {"rows": len(cells["labels"]), "columns": cells["columns"], "parameters_found": len(found),
+                  "retried_cells": len(unread),
+                  "ocr_pixel_fraction": round(ocr_area / image.size, 3)}
+    return {"passes_run": passes, "passes_available": passes, "stop_reason": "complete", "table": table_info}
+
+async def run_ocr(variants: PreprocessedVariants, extraction: IncrementalExtraction, mode: str,
+                  time_budget: float, label: str, label_passes: int = 0) -> Dict:
+    """OCR stage for one image; every text ends up in the extraction. With label_passes
+    the cascade gives up once that many of its passes have not read a single label"""
+    try:
+        text_extractor = EnhancedTextExtractor()
+        if mode in ("layout", "table"):
+            # One word-level or table pass; the cascade only runs for parameters it missed
+            started = time.monotonic()
+            ocr_info = await (read_layout if mode == "layout" else read_table)(variants, extraction)
+            if not extraction.complete:
+                remaining = max(0.0, time_budget - (time.monotonic() - started))
+                cascade_info = await text_extractor.extract_text_cascade(
+                    variants, extraction, ocr_pool, time_budget=remaining, label_passes=label_passes
+                )
+                ocr_info.update({
+                    "passes_run": ocr_info["passes_run"] + cascade_info["passes_run"],
+                    "passes_available": ocr_info["passes_available"] + cascade_info["passes_available"],
+                    "stop_reason": cascade_info["stop_reason"]
+                })
+        elif mode == "cascade":
+            ocr_info = await text_extractor.extract_text_cascade(
+                variants, extraction, ocr_pool, time_budget=time_budget, label_passes=label_passes
+            )
+        else:
+            processed_images = await run_in_threadpool(lambda: list(variants))
+            passes = await text_extractor.extract_text_parallel(processed_images, extraction, ocr_pool)
+            ocr_info = {"passes_run": passes, "passes_available": passes, "stop_reason": "exhausted"}
+        
+        logger.info(f"{label}: {len(extraction.texts)} text variations after {ocr_info['passes_run']} OCR passes ({ocr_info['stop_reason']})")
+        return ocr_info
+        
+    except OCRPoolFullError as e:
+        logger.warning(f"Rejecting {label}: {str(e)}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly")
+    except Exception as e:
+        logger.error(f"OCR error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+
+def near_duplicate_scope(mode: str) -> Tuple[str, str]:
+    return extraction_rules_version(), mode
+
+def verification_agreement(values: Dict[str, Tuple[float, float]], patient: Dict[str, Any],
+                           cached: Dict) -> Optional[float]:
+    """Share of one pass's values that equal the cached result's, or None when too few
+    overlap to tell; 0 when the patient's sex or age differ"""
+    cached_patient = cached.get("patient") or {}
+    for key, value in patient.items():
+        if key in cached_patient and cached_patient[key] != value:
+            return 0.0
+    cached_parameters = cached.get("parameters", {})
+    found = {name: value for name, (value, confidence) in values.items()
+             if value is not None and confidence > 0.5 and name in cached_parameters}
+    if len(found) < NEAR_DUP_MIN_VERIFIED:
+        return None
+    agreeing = sum(1 for name, value in found.items()
+                   if math.isclose(value, cached_parameters[name]["value"], rel_tol=1e-6))
+    return agreeing / len(found)
+
+async def find_near_duplicate(variants: PreprocessedVariants, extraction: IncrementalExtraction,
+                              mode: str) -> Optional[Dict]:
+    """The cached result of an earlier photo of this page, if the index has one
+
+    In "verify" mode a candidate's values must agree with one of the
+    cascade's own first passes (up to NEAR_DUP_VERIFY_PASSES), each judged
+    on its own text: a poor pass's misreads would otherwise outvote a good
+    pass's reads. Their texts stay in the extraction and the cascade won't
+    repeat them, and verifying stops once the extraction is complete, so a
+    rejected match costs no pass a fresh analysis wouldn't run.
+    """
+    candidates = []
+    for distance, result_key in near_duplicate_index.lookup(*extraction.fingerprint, near_duplicate_scope(mode)):
+        cached, _ = result_cache.get(result_key)
+        if cached is not None:  # Else expired from the result cache
+            # The content hash prefix, as used for report ids in the lab history
+            candidates.append((cached, {"report_id": result_key.split(":")[0][:16], "distance": distance}))
+    if not candidates:
+        return None
+    
+    if NEAR_DUP_MODE == "verify":
+        available = variants.names()
+        passes = [(name, idx) for name, idx in EnhancedTextExtractor.cascade_order() if name in available]
+        accepted, agreements = None, [None] * len(candidates)
+        for name, idx in passes[:NEAR_DUP_VERIFY_PASSES]:
+            config = EnhancedTextExtractor.OCR_CONFIGS[idx]
+            image = await run_in_threadpool(variants.get, name)
+            [(text, seconds)] = await ocr_pool.map(
+                timed_call, [(EnhancedTextExtractor.run_single_config, image, config, extraction.ocr_timeout())]
+            )
+            EnhancedTextExtractor.record_pass(name, config, seconds, text, extraction)
+            values: Dict[str, Tuple[float, float]] = {}
+            patient: Dict[str, Any] = {}
+            extraction.extractor.scan_text(text, values)
+            extraction.extractor.engine.patient(text, patient)
+            agreements = [verification_agreement(values, patient, cached) for cached, _ in candidates]
+            accepted = next((candidate for candidate, agreement in zip(candidates, agreements)
+                             if agreement is not None and agreement >= NEAR_DUP_MIN_AGREEMENT), None)
+            if accepted is not None or extraction.complete:
+                break
+        for (cached, match), agreement in zip(candidates, agreements):
+            match.update({"verified": True, "agreement": agreement})
+        if accepted is None:
+            near_duplicate_index.count("rejected")
+            logger.info(f"Near-duplicates rejected: {[match for _, match in candidates]}")
+            return None
+        near_duplicate_index.count("verified")
+    else:
+        accepted = candidates[0]
+        accepted[1]["verified"] = False
+    
+    cached, match = accepted
+    logger.info(f"Near-duplicate of {match['report_id']} (distance {match['distance']}), reusing its result")
+    cached["processing_info"]["near_duplicate"] = match
+    return cached
+
+def variant_info(variants: PreprocessedVariants) -> Dict:
+    return {
+        "images_processed": len(variants.computed),
+        "variants_computed": variants.computed,
+        "variants_skipped": [name for name in EnhancedImagePreprocessor.VARIANT_NAMES if variants.is_skipped(name)],
+        "image_quality": variants.quality(),
+        "orientation": variants.orientation
+    }
+
+async def analyze_image(contents: bytes, filename: str, extraction: IncrementalExtraction, mode: str,
+                        time_budget: float, prepare_slots: Optional[asyncio.Semaphore],
+                        near_duplicates: bool = False) -> Dict:
+    """Decode, preprocess and OCR one image; returns its processing_info
+
+    With near_duplicates, a page matching an earlier report's perceptual
+    hash skips the OCR stage and leaves that report's result in extraction.reused.
+    A cropped page whose passes found no label at all is read again uncropped.
+    """
+    # Decode image and enhanced preprocessing
+    async with prepare_slots or contextlib.nullcontext():
+        await extraction.enter_stage("decode")
+        with span(stage_seconds, "stages", "decode", stage="decode"):
+            img, reduction = await run_in_threadpool(decode_image, contents)
+        await extraction.enter_stage("preprocess")
+        if near_duplicates:
+            extraction.fingerprint = await run_in_threadpool(PerceptualHash.hashes, img)
+        variants, normalization = await prepare_variants(img)
+        del img
+        normalization["decode_reduction"] = reduction
+    
+    # Enhanced text extraction
+    await extraction.enter_stage("ocr")
+    if near_duplicates:
+        extraction.reused = await find_near_duplicate(variants, extraction, mode)
+    if extraction.reused is not None:
+        ocr_info = {"passes_run": extraction.passes_done, "passes_available": extraction.passes_done,
+                    "stop_reason": "near_duplicate"}
+    else:
+        started = time.monotonic()
+        cropped = normalization["roi"] is not None
+        ocr_info = await run_ocr(variants, extraction, mode, time_budget, filename,
+                                 label_passes=ImageNormalizer.CROP_LABEL_PASSES if cropped else 0)
+        if cropped and not extraction.seen:
+            # The crop missed the label column; its passes say nothing about the full page
+            logger.info(f"No labels in the cropped region {normalization['roi']}, reading the whole page")
+            async with prepare_slots or contextlib.nullcontext():
+                img, reduction = await run_in_threadpool(decode_image, contents)
+                variants, normalization = await prepare_variants(img, crop=False)
+                del img
+                normalization.update({"decode_reduction": reduction, "crop_fallback": True})
+            extraction.passes_tried.clear()
+            passes_done = extraction.passes_done
+            remaining = max(0.0, time_budget - (time.monotonic() - started))
+            ocr_info = await run_ocr(variants, extraction, mode, remaining, filename)
+            ocr_info["passes_available"] += passes_done
+    
+    processing_info = {
+        **variant_info(variants),
+        "normalization": normalization,
+        "ocr_passes": extraction.passes_done,
+        "ocr_passes_available": ocr_info["passes_available"],
+        "ocr_stop_reason": ocr_info["stop_reason"]
+    }
+    for key in ("layout", "table"):
+        if key in ocr_info:
+            processing_info[key] = ocr_info[key]
+    return processing_info
+
+def is_pdf(contents: bytes) -> bool:
+    return contents[:5] == b"%PDF-"
+
+async def analyze_pdf(contents: bytes, filename: str, extraction: IncrementalExtraction, mode: str,
+                      time_budget: float, dpi: int, prepare_slots: Optional[asyncio.Semaphore]) -> Dict:
+    """Multi-page PDF: text-layer pages go straight to the extractor, the rest are
+    rasterized and OCR'd page-parallel until every parameter has been found"""
+    if not module_available(pymupdf):
+        raise HTTPException(status_code=415, detail="PDF support requires PyMuPDF (pip install pymupdf)")
+    
+    try:
+        document = pymupdf.open(stream=contents, filetype="pdf")
+    except Exception as e:
+        logger.error(f"PDF open error: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Could not read PDF: {str(e)}")
+    
+    # MuPDF documents are not thread-safe, so page access is serialized
+    document_lock = asyncio.Lock()
+    total_pages = len(document)
+    page_count = min(total_pages, PDF_MAX_PAGES)
+    pages_info: List[Dict] = [{"page": number + 1, "source": "skipped"} for number in range(page_count)]
+    
+    try:
+        # Pass 1: pages with a text layer cost no OCR at all
+        await extraction.enter_stage("pdf_text_layer")
+        ocr_pages = []
+        for number in range(page_count):
+            if extraction.complete:
+                break
+            with span(stage_seconds, "stages", "pdf_text_layer", stage="pdf_text_layer"):
+                text = await run_in_threadpool(lambda: document[number].get_text())
+            if len(text.strip()) >= PDF_MIN_TEXT_CHARS:
+                extraction.add_text(text, source=("pdf", "text_layer"))
+                extraction.report()
+                pages_info[number]["source"] = "text_layer"
+            else:
+                ocr_pages.append(number)
+        
+        def rasterize(number: int) -> np.ndarray:
+            pixmap = document[number].get_pixmap(dpi=dpi, colorspace=pymupdf.csRGB, alpha=False)
+            rgb = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, 3)
+            return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        
+        page_slots = asyncio.Semaphore(PDF_PAGE_CONCURRENCY)
+        started = time.monotonic()
+        
+        async def ocr_page(number: int) -> None:
+            async with page_slots:
+                remaining = time_budget - (time.monotonic() - started)
+                if extraction.complete or remaining <= 0:
+                    return
+                async with document_lock:
+                    with span(stage_seconds, "stages", "pdf_rasterize", stage="pdf_rasterize"):
+                        img = await run_in_threadpool(rasterize, number)
+                async with prepare_slots or contextlib.nullcontext():
+                    variants, normalization = await prepare_variants(img)
+                ocr_info = await run_ocr(variants, extraction, mode, remaining, f"{filename} page {number + 1}")
+                pages_info[number].update({
+                    "source": "ocr",
+                    "ocr_passes": ocr_info["passes_run"],
+                    "ocr_stop_reason": ocr_info["stop_reason"],
+                    "images_processed": len(variants.computed),
+                    "normalization": normalization,
+                    "orientation": variants.orientation
+                })
+        
+        # Pass 2: rasterize and OCR the remaining pages in parallel, and
+        # stop the stragglers once the extraction is complete
+        await extraction.enter_stage("ocr")
+        tasks = [asyncio.create_task(ocr_page(number)) for number in ocr_pages if not extraction.complete]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                await next_done
+                if extraction.complete:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        document.close()
+    
+    ocr_pages_info = [page for page in pages_info if page["source"] == "ocr"]
+    stop_reasons = {page["ocr_stop_reason"] for page in ocr_pages_info}
+    return {
+        "pages": total_pages,
+        "pages_text_layer": sum(1 for page in pages_info if page["source"] == "text_layer"),
+        "pages_ocr": len(ocr_pages_info),
+        "dpi": dpi,
+        "page_info": pages_info,
+        "images_processed": sum(page["images_processed"] for page in ocr_pages_info),
+        "ocr_passes": sum(page["ocr_passes"] for page in ocr_pages_info),
+        "ocr_stop_reason": "complete" if extraction.complete else "time_budget" if "time_budget" in stop_reasons else "exhausted"
+    }
+
+async def analyze_contents(contents: bytes, filename: str, mode: str = OCR_MODE,
+                           time_budget: float = OCR_TIME_BUDGET_S, cache: bool = True,
+                           prepare_slots: Optional[asyncio.Semaphore] = None,
+                           dpi: int = PDF_DPI, content_hash: Optional[str] = None,
+                           progress: Optional[Callable[[Dict], None]] = None,
+                           deadline: Optional[Deadline] = None, partial: bool = False) -> Dict:
+    """Full pipeline for one upload (image or PDF): cache, decode, preprocessing, OCR, extraction
+
+    prepare_slots bounds how many reports run the CPU-heavy decode and
+    preprocessing stage at once, so batches overlap it with OCR of others.
+    progress, if given, is called with the stage and partial parameters.
+    With a deadline, the analysis stops (RequestAborted) once it passes or
+    the client disconnects; with partial, a deadline instead returns what
+    was found by then, marked "partial" and never cached.
+    """
+    started = time.perf_counter()
+    pdf = is_pdf(contents)
+    
+    # Repeat uploads of the same bytes are answered from the cache
+    content_hash = content_hash or hashlib.sha256(contents).hexdigest()
+    cache_key = result_cache.make_key(content_hash, extraction_rules_version(), mode, dpi if pdf else "")
+    if cache:
+        cached, tier = result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Result cache {tier} hit for {filename}")
+            cached["filename"] = filename
+            cached["processing_info"]["cache"] = tier
+            reports_total.inc(mode=mode, cache=tier)
+            record(stage_seconds, "stages", "total", time.perf_counter() - started, stage="total")
+            return cached
+
+    extraction = new_extraction(mode)
+    extraction.listener = progress
+    extraction.deadline = deadline
+    if pdf:
+        analysis = analyze_pdf(contents, filename, extraction, mode, time_budget, dpi, prepare_slots)
+    else:
+        analysis = analyze_image(contents, filename, extraction, mode, time_budget, prepare_slots,
+                                 near_duplicates=cache and NEAR_DUP_MODE != "off")
+    try:
+        processing_info = await (deadline.run(analysis) if deadline is not None else analysis)
+    except RequestAborted as e:
+        aborted_requests_total.inc(reason=e.reason, stage=e.stage or "unknown")
+        if not partial or e.reason != "deadline" or not extraction.texts:
+            raise
+        logger.info(f"Deadline of {deadline.seconds:.0f}s hit during {e.stage} for {filename}, returning partial results")
+        processing_info = {"ocr_passes": extraction.passes_done, "ocr_stop_reason": "deadline", "deadline_stage": e.stage}
+    
+    if extraction.reused is not None:
+        # Stored under this upload's hash as well, so the next identical upload is an exact hit
+        result = extraction.reused
+        result["processing_info"].update({"cache": "near_duplicate", "ocr_passes": processing_info["ocr_passes"]})
+        result_cache.put(cache_key, result)
+        reports_total.inc(mode=mode, cache="near_duplicate")
+        record(stage_seconds, "stages", "total", time.perf_counter() - started, stage="total")
+        result["filename"] = filename
+        return result
+    
+    if not extraction.texts:
+        raise HTTPException(status_code=500, detail="No text could be extracted from image")
+    
+    # Enhanced parameter extraction
+    extraction.report("extraction")
+    try:
+        parameters, categories, confidence_scores = extraction.results()
+        report_type = extraction.report_type()
+        
+        logger.info(f"Extracted parameters: {list(parameters.keys())}")
+        logger.info(f"Confidence scores: {confidence_scores}")
+        
+    except Exception as e:
+        logger.error(f"Parameter extraction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Parameter extraction failed: {str(e)}")
+
+    result = {
+        "status": "partial" if processing_info["ocr_stop_reason"] == "deadline" else "success",
+        "summary": build_summary(parameters, confidence_scores, report_type),
+        "report_type": report_type,
+        "patient": extraction.patient,
+        "parameters": parameters,
+        "categories": categories,
+        "confidence_scores": confidence_scores,
+        "processing_info": {
+            **processing_info,
+            "text_extractions": len(extraction.texts),
+            "ocr_mode": mode,
+            "cache": "miss",
+            "total_patterns_tried": len(report_catalog.alias_analytes)
+        }
+    }
+
+    if deadline is not None:
+        result["processing_info"]["deadline_s"] = deadline.seconds
+
+    # A cascade cut short by its time budget or deadline may have missed values, so don't pin it
+    if cache and processing_info["ocr_stop_reason"] not in ("time_budget", "deadline"):
+        result_cache.put(cache_key, result)
+        if extraction.fingerprint is not None and parameters:
+            near_duplicate_index.add(*extraction.fingerprint, near_duplicate_scope(mode), cache_key)
+
+    # Which (variant, config) passes the reported values came from, to prune passes that never win
+    winning = {}
+    for param_name in parameters:
+        variant, config = extraction.sources.get(param_name, ("unknown", "unknown"))
+        winning_passes_total.inc(variant=variant, config=config, parameter=param_name)
+        winning[param_name] = f"{variant}/{config}"
+    annotate("winning_passes", winning)
+    reports_total.inc(mode=mode, cache="miss")
+    record(stage_seconds, "stages", "total", time.perf_counter() - started, stage="total")
+
+    result["filename"] = filename
+    return result
+
+def is_supported_upload(content_type: Optional[str]) -> bool:
+    return bool(content_type) and (content_type.startswith('image/') or content_type == "application/pdf")
+
+OCR_MODES = ("cascade", "exhaustive", "layout", "table")
+
+def check_mode(mode: str) -> None:
+    if mode not in OCR_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(OCR_MODES)}")
+
+def new_extraction(mode: str) -> IncrementalExtraction:
+    """Layout and table modes are done once every parameter has any value; their
+    confidences come from Tesseract rather than the fixed regex score"""
+    if mode in ("layout", "table"):
+        return IncrementalExtraction(complete_confidence=0.5)
+    return IncrementalExtraction()
+
+def upload_error_status(error: UploadError) -> int:
+    return 413 if isinstance(error, UploadTooLargeError) else 415
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """Turn away oversized uploads from their Content-Length, before the body is read"""
+    limit = REQUEST_SIZE_LIMITS.get(request.url.path)
+    content_length = request.headers.get("content-length")
+    if limit and content_length and content_length.isdigit() and int(content_length) > limit:
+        return JSONResponse(status_code=413, content={"detail": f"Request larger than {limit} bytes"})
+    return await call_next(request)
+
+def get_risk_model() -> RiskModel:
+    model = getattr(app.state, "risk_model", None)
+    if model is None:
+        raise HTTPException(status_code=503, detail="Risk model is not loaded")
+    return model
+
+def check_report_date(report_date: Optional[str]) -> float:
+    try:
+        return parse_report_date(report_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="report_date must be an ISO date, e.g. 2024-05-31")
+
+def check_deadline(request: Request, seconds: Optional[float]) -> Deadline:
+    try:
+        return Deadline.for_request(request, seconds)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="deadline must be a positive number of seconds")
+
+async def record_history(result: Dict, patient_id: str, taken: float, content_hash: str,
+                         filename: Optional[str]) -> None:
+    """Keep the report's values in the patient's lab history; the report id is the upload hash"""
+    report_id = content_hash[:16]
+    stored = await run_in_threadpool(lab_history.record, patient_id, report_id, taken, result, filename)
+    result["history"] = {"patient_id": patient_id, "report_id": report_id, "parameters_stored": stored}
 
 @app.post("/analyze-report")
-async def analyze_report(file: UploadFile = File(...)):
+async def analyze_report(request: Request, file: UploadFile = File(...), mode: str = OCR_MODE,
+                         time_budget: float = OCR_TIME_BUDGET_S, cache: bool = True, dpi: int = PDF_DPI,
+                         predict: bool = False, timings: bool = False,
+                         patient_id: Optional[str] = None, report_date: Optional[str] = None,
+                         format: str = "full", deadline: Optional[float] = None, partial: bool = False):
+    """deadline (seconds, or the X-Request-Timeout header) bounds the whole analysis; on expiry it
+    answers 504, or with partial=true the values found so far. A client that disconnects stops it too."""
     try:
         logger.info(f"Processing file: {file.filename}")
         
         if not file:
             raise HTTPException(status_code=400, detail="No file uploaded")
 
-        if not file.content_type or not file.content_type.startswith('image/'):
+        check_mode(mode)
+        check_format(format)
+        taken = check_report_date(report_date)
+        request_deadline = check_deadline(request, deadline)
+
+        if not is_supported_upload(file.content_type):
             logger.warning(f"Invalid content type: {file.content_type}")
-            raise HTTPException(status_code=400, detail="Only image files are supported")
+            raise HTTPException(status_code=400, detail="Only image and PDF files are supported")
 
-        contents = await file.read()
-        if not contents:
+        upload = await read_upload(file)
+        if not upload.size:
             raise HTTPException(status_code=400, detail="Empty file")
 
-        logger.info(f"File size: {len(contents)} bytes")
+        logger.info(f"File size: {upload.size} bytes ({upload.kind})")
 
-        # Decode image
-        try:
-            nparr = np.frombuffer(contents, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                raise HTTPException(status_code=400, detail="Could not decode image")
-            
-            logger.info(f"Image shape: {img.shape}")
-            
-        except Exception as e:
-            logger.error(f"Image decoding error: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+        with track_request() as request_timings:
+            result = await analyze_contents(upload.contents, file.filename, mode, time_budget, cache, dpi=dpi,
+                                            content_hash=upload.sha256, deadline=request_deadline,
+                                            partial=partial)
+        if timings:
+            result["timings"] = request_timings.as_dict()
+
+        if predict:
+            # Scored outside the cache so a model update never serves stale risk
+            result["risk_prediction"] = get_risk_model().predict([result.get("parameters", {})])[0]
+
+        if patient_id:
+            await record_history(result, patient_id, taken, upload.sha256, file.filename)
+
+        return negotiate(request, format_result(result, format))
+
+    except HTTPException:
+        raise
+    except RequestAborted as e:
+        if e.reason == "disconnected":
+            logger.info(f"Client disconnected during {e.stage}, stopped analyzing {file.filename}")
+            raise HTTPException(status_code=499, detail="Client closed request")
+        raise HTTPException(status_code=504, detail=f"Deadline of {request_deadline.seconds:g}s exceeded during {e.stage}")
+    except UploadError as e:
+        raise HTTPException(status_code=upload_error_status(e), detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+def expand_batch_uploads(uploads: List[Tuple[str, Optional[str], Optional[Upload], Optional[str]]]
+                         ) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+    """Flatten (filename, content type, upload, error) entries into (filename, contents, error) items
+
+    Zip archives are sized up from their central directories before any
+    member is inflated: a batch of more than BATCH_MAX_FILES files, or whose
+    members would decompress to more than BATCH_MAX_EXPANDED_BYTES, is
+    rejected right there. zipfile stops at a member's declared size, so the
+    directory can't understate it. Members pass the same magic-byte check
+    as direct uploads.
+    """
+    with contextlib.ExitStack() as stack:
+        archives: Dict[int, Optional[zipfile.ZipFile]] = {}
+        files = expanded = 0
+        for index, (_, _, upload, _) in enumerate(uploads):
+            if upload is None or upload.kind != "zip":
+                files += 1
+                continue
+            try:
+                archive = archives[index] = stack.enter_context(zipfile.ZipFile(BytesIO(upload.contents)))
+            except zipfile.BadZipFile:
+                archives[index] = None
+                files += 1
+                continue
+            members = [member for member in archive.infolist() if not member.is_dir()]
+            files += len(members)
+            expanded += sum(member.file_size for member in members if member.file_size <= BATCH_MAX_MEMBER_BYTES)
+        if files > BATCH_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+        if expanded > BATCH_MAX_EXPANDED_BYTES:
+            raise HTTPException(status_code=413,
+                                detail=f"Zip archives expand to more than {BATCH_MAX_EXPANDED_BYTES} bytes")
         
-        # Enhanced preprocessing
+        items = []
+        for index, (filename, content_type, upload, error) in enumerate(uploads):
+            if error:
+                items.append((filename, None, error))
+            elif index not in archives:
+                if not is_supported_upload(content_type):
+                    items.append((filename, None, "Only image and PDF files are supported"))
+                elif not upload.contents:
+                    items.append((filename, None, "Empty file"))
+                else:
+                    items.append((filename, upload.contents, None))
+            elif archives[index] is None:
+                items.append((filename, None, "Could not read zip archive"))
+            else:
+                items.extend(read_zip_members(filename, archives[index]))
+        return items
+
+def read_zip_members(filename: str, archive: zipfile.ZipFile) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+    """(filename, contents, error) per file in an archive, checking each one's leading bytes before inflating the rest"""
+    items = []
+    for member in archive.infolist():
+        if member.is_dir():
+            continue
+        member_name = f"{filename}/{member.filename}"
+        guessed_type, _ = mimetypes.guess_type(member.filename)
+        if not is_supported_upload(guessed_type):
+            items.append((member_name, None, "Only image and PDF files are supported"))
+            continue
+        if member.file_size > BATCH_MAX_MEMBER_BYTES:
+            items.append((member_name, None, "File too large"))
+            continue
         try:
-            preprocessor = EnhancedImagePreprocessor()
-            processed_images = preprocessor.enhance_image(img)
-            
-            # Apply skew correction to best image
-            if processed_images:
-                processed_images[0] = preprocessor.correct_skew(processed_images[0])
-            
-            logger.info(f"Generated {len(processed_images)} processed images")
-            
-        except Exception as e:
-            logger.error(f"Image preprocessing error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Image preprocessing failed: {str(e)}")
-        
-        # Enhanced text extraction
+            with archive.open(member) as handle:
+                head = handle.read(16)
+                if sniff_kind(head) not in REPORT_KINDS:
+                    items.append((member_name, None, "Unsupported file format"))
+                    continue
+                items.append((member_name, head + handle.read(), None))
+        except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+            items.append((member_name, None, f"Could not read file from zip archive: {str(e)}"))
+    return items
+
+@app.post("/analyze-reports/batch")
+async def analyze_reports_batch(files: List[UploadFile] = File(...), mode: str = OCR_MODE,
+                                time_budget: float = OCR_TIME_BUDGET_S, cache: bool = True,
+                                timings: bool = False, format: str = "full"):
+    """Analyze many reports in one request, streaming one NDJSON line per file as it finishes"""
+    check_mode(mode)
+    check_format(format)
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+    
+    uploads = []
+    for file in files:
         try:
-            text_extractor = EnhancedTextExtractor()
-            extracted_texts = text_extractor.extract_text_multiple_configs(processed_images)
-            
-            logger.info(f"Extracted {len(extracted_texts)} text variations")
-            
-            if not extracted_texts:
-                raise HTTPException(status_code=500, detail="No text could be extracted from image")
-            
-        except Exception as e:
-            logger.error(f"OCR error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
-        
-        # Enhanced parameter extraction
+            upload = await read_upload(file, kinds=REPORT_KINDS + ("zip",))
+            uploads.append((file.filename, file.content_type, upload, None))
+        except UploadError as e:
+            uploads.append((file.filename, file.content_type, None, str(e)))
+    items = expand_batch_uploads(uploads)
+    if not items:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    
+    logger.info(f"Batch of {len(items)} files")
+    
+    async def analyze_item(index: int, filename: str, contents: Optional[bytes], error: Optional[str],
+                           in_flight: asyncio.Semaphore, prepare_slots: asyncio.Semaphore) -> Dict:
         try:
-            extractor = FuzzyParameterExtractor()
-            parameters, categories, confidence_scores = extractor.extract_parameters_fuzzy(extracted_texts)
-            
-            logger.info(f"Extracted parameters: {list(parameters.keys())}")
-            logger.info(f"Confidence scores: {confidence_scores}")
-            
+            if error:
+                raise HTTPException(status_code=400, detail=error)
+            async with in_flight:
+                with track_request() as request_timings:
+                    result = await analyze_contents(contents, filename, mode, time_budget, cache,
+                                                    prepare_slots=prepare_slots)
+            if timings:
+                result["timings"] = request_timings.as_dict()
+            return {"index": index, **result}
+        except HTTPException as e:
+            return {"index": index, "filename": filename, "status": "error",
+                    "status_code": e.status_code, "detail": e.detail}
         except Exception as e:
-            logger.error(f"Parameter extraction error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Parameter extraction failed: {str(e)}")
-
-        # Generate enhanced summary
-        total_params = len(parameters)
-        abnormal_params = len([p for p in parameters.values() if p["status"] != "Normal"])
-        avg_confidence = sum(confidence_scores.values()) / len(confidence_scores) if confidence_scores else 0
-        
-        summary = {
-            "total_parameters": total_params,
-            "abnormal_parameters": abnormal_params,
-            "overall_status": "Normal" if abnormal_params == 0 else f"{abnormal_params} parameter(s) abnormal",
-            "report_type": "Complete Blood Count (CBC)" if any("Blood Counts" in p.get("category", "") for p in parameters.values()) else "Medical Report",
-            "average_confidence": round(avg_confidence, 2),
-            "extraction_quality": "High" if avg_confidence > 0.8 else "Medium" if avg_confidence > 0.6 else "Low"
-        }
+            logger.error(f"Batch item {filename} failed: {str(e)}")
+            return {"index": index, "filename": filename, "status": "error",
+                    "status_code": 500, "detail": f"Analysis failed: {str(e)}"}
+    
+    async def stream_results():
+        in_flight = asyncio.Semaphore(BATCH_MAX_IN_FLIGHT)
+        prepare_slots = asyncio.Semaphore(BATCH_PREPARE_SLOTS)
+        tasks = [
+            asyncio.create_task(analyze_item(index, filename, contents, error, in_flight, prepare_slots))
+            for index, (filename, contents, error) in enumerate(items)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield dumps_json(format_result(await next_done, format)) + b"\n"
+        finally:
+            # Client went away mid-stream: don't keep OCRing for nobody
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
-        return {
-            "status": "success",
-            "summary": summary,
-            "parameters": parameters,
-            "categories": categories,
-            "confidence_scores": confidence_scores,
-            "filename": file.filename,
-            "processing_info": {
-                "images_processed": len(processed_images),
-                "text_extractions": len(extracted_texts),
-                "total_patterns_tried": sum(len(config["patterns"]) for config in MEDICAL_PATTERNS.values())
+@app.post("/predict")
+async def predict_risk(payload: Any = Body(...)):
+    """Score one record or a batch (a list, or {"records": [...]}) in a single model call"""
+    model = get_risk_model()
+    records, is_batch = parse_records(payload)
+    if len(records) > PREDICT_MAX_RECORDS:
+        raise HTTPException(status_code=413, detail=f"Too many records (max {PREDICT_MAX_RECORDS})")
+
+    try:
+        predictions = await run_in_threadpool(model.predict, records)
+    except Exception as e:
+        logger.error(f"Prediction failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+    if not is_batch:
+        if predictions[0].get("error"):
+            raise HTTPException(status_code=422, detail=predictions[0]["error"])
+        return predictions[0]
+    return {"count": len(predictions), "predictions": predictions}
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), mode: str = OCR_MODE,
+                     time_budget: float = OCR_TIME_BUDGET_S, cache: bool = True, dpi: int = PDF_DPI,
+                     predict: bool = False, patient_id: Optional[str] = None, report_date: Optional[str] = None):
+    """Queue a report for analysis and return its job id at once; poll /jobs/{id} or stream its events"""
+    check_mode(mode)
+    taken = check_report_date(report_date)
+    if not is_supported_upload(file.content_type):
+        raise HTTPException(status_code=400, detail="Only image and PDF files are supported")
+    try:
+        upload = await read_upload(file)
+    except UploadError as e:
+        raise HTTPException(status_code=upload_error_status(e), detail=str(e))
+    if not upload.size:
+        raise HTTPException(status_code=400, detail="Empty file")
+    
+    options = {"mode": mode, "time_budget": time_budget, "cache": cache, "dpi": dpi, "predict": predict,
+               "patient_id": patient_id, "taken": taken}
+    try:
+        job_id = await run_in_threadpool(job_store.submit, file.filename, upload.contents, options, upload.sha256)
+    except JobQueueFullError as e:
+        logger.warning(f"Rejecting job for {file.filename}: {str(e)}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly")
+    
+    app.state.job_wakeup.set()
+    logger.info(f"Queued job {job_id} for {file.filename}")
+    return {"job_id": job_id, "status": "queued",
+            "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request, format: str = "full"):
+    check_format(format)
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if "result" in job:
+        job["result"] = format_result(job["result"], format)
+    return negotiate(request, job)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events: progress whenever the stage or partial parameters change, then done or failed"""
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def stream_events():
+        nonlocal job
+        last_sent = None
+        last_write = time.monotonic()
+        while True:
+            state = (job["status"], job["progress"])
+            if state != last_sent:
+                event = job["status"] if job["status"] in ("done", "failed") else "progress"
+                yield f"event: {event}\ndata: {json.dumps(job)}\n\n"
+                last_sent, last_write = state, time.monotonic()
+                if event != "progress":
+                    return
+            elif time.monotonic() - last_write > 15:
+                yield ": keep-alive\n\n"  # Stops proxies from closing an idle stream
+                last_write = time.monotonic()
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_S)
+            job = await run_in_threadpool(job_store.get, job_id)
+    
+    return StreamingResponse(stream_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/patients/{patient_id}/trends")
+async def patient_trends(patient_id: str, parameter: Optional[List[str]] = Query(None),
+                         since: Optional[str] = None, until: Optional[str] = None,
+                         limit: int = Query(LAB_HISTORY_MAX_POINTS, ge=1)):
+    """A patient's values over time per parameter (repeat ?parameter= to pick some), oldest first"""
+    try:
+        since_ts = parse_report_date(since) if since else None
+        until_ts = parse_report_date(until) if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since and until must be ISO dates, e.g. 2024-05-31")
+    trends = await run_in_threadpool(lab_history.trends, patient_id, parameter, since_ts, until_ts,
+                                     min(limit, LAB_HISTORY_MAX_POINTS))
+    return {
+        "patient_id": patient_id,
+        "parameters": {
+            name: {
+                "unit": report_catalog.analytes[name].unit if name in report_catalog.analytes else None,
+                "points": points
             }
+            for name, points in trends.items()
         }
+    }
 
-    except HTTPException:
-        raise
+@app.get("/cohorts")
+async def cohort(parameter: str, below: Optional[float] = None, above: Optional[float] = None,
+                 days: Optional[float] = Query(30, ge=0), limit: int = Query(LAB_HISTORY_MAX_PATIENTS, ge=1)):
+    """Patients with a value of the parameter below/above a bound within the last `days`
+    (0 for all time), e.g. /cohorts?parameter=Hemoglobin&below=10&days=30"""
+    if below is None and above is None:
+        raise HTTPException(status_code=400, detail="Give below, above or both")
+    since = time.time() - days * 86400 if days else None
+    patients = await run_in_threadpool(lab_history.cohort, parameter, below, above, since,
+                                       min(limit, LAB_HISTORY_MAX_PATIENTS))
+    return {"parameter": parameter, "below": below, "above": above, "days": days,
+            "count": len(patients), "patients": patients}
+
+@app.get("/catalog")
+async def get_catalog(request: Request):
+    """Units, reference ranges, panels and interpretations for rendering compact results
+
+    The ETag is the catalog fingerprint that compact results carry, so a
+    client revalidates with If-None-Match and gets a 304 until it changes.
+    """
+    etag = f'"{report_catalog.fingerprint}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CATALOG_MAX_AGE_S}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return negotiate(request, {"fingerprint": report_catalog.fingerprint, **report_catalog.data}, headers=headers)
+
+async def run_job(job: Dict) -> None:
+    job_id, options = job["id"], job["options"]
+    logger.info(f"Running job {job_id} ({job['filename']})")
+    progress = ProgressWriter(job_store, job_id)
+    try:
+        try:
+            result = await analyze_contents(
+                job["payload"], job["filename"], options["mode"], options["time_budget"], options["cache"],
+                dpi=options["dpi"], content_hash=job["content_hash"], progress=progress.update
+            )
+        finally:
+            await progress.close()
+        if options.get("predict"):
+            result["risk_prediction"] = get_risk_model().predict([result.get("parameters", {})])[0]
+        if options.get("patient_id"):
+            await record_history(result, options["patient_id"], options["taken"], job["content_hash"],
+                                 job["filename"])
+        await run_in_threadpool(job_store.finish, job_id, result)
+    except HTTPException as e:
+        await run_in_threadpool(job_store.fail, job_id, e.status_code, str(e.detail))
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        await run_in_threadpool(job_store.fail, job_id, 500, f"Analysis failed: {str(e)}")
+
+async def job_worker() -> None:
+    """Drain the job queue; each worker runs one report at a time"""
+    wakeup = app.state.job_wakeup
+    while True:
+        wakeup.clear()
+        job = await run_in_threadpool(job_store.claim)
+        if job is None:
+            # Also polls, for jobs queued by other processes sharing the database
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(wakeup.wait(), timeout=JOB_POLL_S)
+            continue
+        await run_job(job)
+
+async def job_heartbeat() -> None:
+    """Keep this process' running jobs leased, and requeue jobs whose process died"""
+    while True:
+        await asyncio.sleep(job_store.lease_seconds / 3)
+        try:
+            await run_in_threadpool(job_store.heartbeat)
+            if await run_in_threadpool(job_store.recover):
+                app.state.job_wakeup.set()
+        except Exception as e:
+            logger.warning(f"Job heartbeat failed: {str(e)}")
+
+async def start_job_workers():
+    app.state.job_wakeup = asyncio.Event()
+    app.state.job_workers = []
+    if JOB_WORKERS <= 0:
+        return
+    await run_in_threadpool(job_store.recover)
+    await run_in_threadpool(job_store.purge)
+    app.state.job_workers = [asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS)]
+    app.state.job_workers.append(asyncio.create_task(job_heartbeat()))
+    logger.info(f"Started {JOB_WORKERS} job workers")
+
+async def load_risk_model():
+    try:
+        app.state.risk_model = await run_in_threadpool(RiskModel.load)
+    except Exception as e:
+        app.state.risk_model = None
+        logger.error(f"Could not load risk model: {str(e)}")
+
+def warmup_image() -> np.ndarray:
+    """A tiny grayscale report snippet for the warm-up OCR passes"""
+    img = np.full((90, 420), 255, dtype=np.uint8)
+    cv2.putText(img, "Hemoglobin 13.5 g/dL", (10, 35), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 0, 2, cv2.LINE_AA)
+    cv2.putText(img, "Platelets 2.5 lakhs/cumm", (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 0, 2, cv2.LINE_AA)
+    return img
+
+def import_heavy_modules() -> None:
+    for module in (np, cv2):
+        load_module(module)
+    for module in (pymupdf, fuzzy_process):
+        if module_available(module):
+            load_module(module)
+    get_ocr_backend()
+
+async def warm_up() -> None:
+    """Pay the cold-start costs before the first request does
+
+    Imports the lazy modules, runs the synthetic image through every OCR
+    config on every pool worker (each worker keeps its own warm Tesseract
+    handles) plus the layout and table passes, feeds the text to the extraction
+    engine and loads and scores the risk model once. Failed phases are
+    recorded in app.state.startup; when OCR is among them the worker never
+    becomes ready, since it could not serve a single report.
+    """
+    phases = app.state.startup["warmup_ms"]
+    failures = app.state.startup["warmup_failures"]
+
+    async def phase(name: str, fn: Callable, *args):
+        started = time.perf_counter()
+        try:
+            return await fn(*args)
+        except Exception as e:
+            logger.warning(f"Warm-up phase {name} failed: {str(e)}")
+            failures[name] = str(e)
+        finally:
+            seconds = time.perf_counter() - started
+            phases[name] = round(seconds * 1000, 1)
+            startup_seconds.set(seconds, phase=f"warmup_{name}")
+
+    async def ocr() -> str:
+        img = await run_in_threadpool(warmup_image)
+        jobs = [(EnhancedTextExtractor.run_single_config, img, config)
+                for config in EnhancedTextExtractor.OCR_CONFIGS for _ in range(ocr_pool.max_workers)]
+        jobs += [(LayoutExtractor.run_image_to_data, img, config)
+                 for config in (LayoutExtractor.CONFIG, *TableExtractor.CONFIGS) for _ in range(ocr_pool.max_workers)]
+        jobs += [(PageOrienter.detect_rotation, img)] * ocr_pool.max_workers
+        results = await ocr_pool.map(timed_call, jobs)
+        # The passes log and swallow their own errors, so an unusable Tesseract reads nothing
+        if not any(isinstance(text, str) and text.strip() for text, _ in results):
+            raise RuntimeError("no warm-up OCR pass read any text")
+        return results[0][0]
+
+    async def extraction(text: str) -> None:
+        await run_in_threadpool(new_extraction(OCR_MODE).add_text, text or "Hemoglobin 13.5 g/dL")
+
+    async def model() -> None:
+        if getattr(app.state, "risk_model", None) is None:
+            await load_risk_model()
+        if app.state.risk_model is not None:
+            await run_in_threadpool(app.state.risk_model.predict, [{"Hb": 13.5}])
+
+    async def imports() -> None:
+        await run_in_threadpool(import_heavy_modules)
+
+    await phase("imports", imports)
+    text = await phase("ocr", ocr)
+    await phase("extraction", extraction, text)
+    await phase("model", model)
+    if "ocr" in failures:
+        logger.error(f"Not ready: OCR warm-up failed ({failures['ocr']})")
+        return
+    mark_ready()
+
+def mark_ready() -> None:
+    ready_after = time.perf_counter() - MAIN_IMPORT_STARTED
+    app.state.startup["ready_after_ms"] = round(ready_after * 1000, 1)
+    startup_seconds.set(ready_after, phase="ready")
+    app.state.ready = True
+    logger.info(f"Ready {ready_after:.2f}s after import started (warm-up: {app.state.startup['warmup_ms']})")
+
+def check_concurrency() -> None:
+    """Warn when explicit settings run more native threads than this container has cores"""
+    planned = governor.threads_planned(ocr_pool.max_workers)
+    logger.info(f"Concurrency: {governor.cpus} CPUs ({governor.cpu_source}), {governor.workers} worker(s), "
+                f"{ocr_pool.max_workers} OCR jobs x {governor.threads_per_job} thread(s) per worker")
+    if planned > governor.cpus:
+        logger.warning(f"{planned} OCR threads across workers on {governor.cpus} CPUs; "
+                       f"unset OCR_MAX_WORKERS or lower WEB_CONCURRENCY")
+
+async def startup():
+    app.state.ready = False
+    check_concurrency()
+    app.state.startup = {"import_main_ms": MAIN_IMPORT_MS, "warmup_mode": WARMUP_MODE, "warmup_ms": {},
+                         "warmup_failures": {}}
+    app.state.warmup_task = None
+    startup_seconds.set(MAIN_IMPORT_MS / 1000, phase="import_main")
+    await start_job_workers()
+    if WARMUP_MODE == "blocking":
+        await warm_up()
+    elif WARMUP_MODE == "background":
+        app.state.warmup_task = asyncio.create_task(warm_up())
+    else:
+        await load_risk_model()
+        mark_ready()
+
+async def shutdown():
+    # Jobs cut off here stay "running" and are requeued on the next start
+    if app.state.warmup_task is not None:
+        app.state.warmup_task.cancel()
+    for task in getattr(app.state, "job_workers", []):
+        task.cancel()
+    job_store.close()
+    lab_history.close()
+    ocr_pool.shutdown()
+    result_cache.close()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the stage, variant and OCR pass metrics"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/concurrency")
+async def debug_concurrency():
+    """How the cores are split between worker processes, OCR jobs and native threads"""
+    planned = governor.threads_planned(ocr_pool.max_workers)
+    return {
+        "plan": governor.as_dict(),
+        "ocr_pool": {
+            "kind": ocr_pool.kind,
+            "workers": ocr_pool.max_workers,
+            "pending_jobs": ocr_pool.pending_jobs
+        },
+        "opencv_threads": cv2.getNumThreads() if cv2._lazy_module is not None else None,
+        "python_threads": threading.active_count(),
+        "threads_planned": planned,
+        "oversubscribed": planned > governor.cpus,
+        "batch": {"max_in_flight": BATCH_MAX_IN_FLIGHT, "prepare_slots": BATCH_PREPARE_SLOTS},
+        "pdf_page_concurrency": PDF_PAGE_CONCURRENCY,
+        "job_workers": JOB_WORKERS
+    }
 
 @app.get("/")
 async def root():
@@ -623,13 +2742,34 @@ async def root():
 @app.get("/health")
 async def health_check():
     try:
-        version = pytesseract.get_tesseract_version()
+        version = get_ocr_backend().version()
         logger.info(f"Tesseract version: {version}")
-        return {
-            "status": "healthy", 
+        ready = getattr(app.state, "ready", False)
+        startup = getattr(app.state, "startup", {})
+        # A worker whose OCR warm-up failed stays out of rotation instead of failing every report
+        status = "healthy" if ready else "degraded" if "ocr" in startup.get("warmup_failures", {}) else "starting"
+        health = {
+            "status": status,
+            "ready": ready,
             "tesseract_version": str(version),
+            "ocr_backend": get_ocr_backend().name,
+            "ocr_pool": {
+                "kind": ocr_pool.kind,
+                "workers": ocr_pool.max_workers,
+                "pending_jobs": ocr_pool.pending_jobs,
+                "max_queued_jobs": ocr_pool.max_queued_jobs
+            },
+            "result_cache": result_cache.stats(),
+            "near_duplicates": near_duplicate_index.stats(),
+            "risk_model_loaded": getattr(app.state, "risk_model", None) is not None,
+            "jobs": job_store.stats(),
+            "startup": {**startup, "lazy_imports_ms": dict(IMPORT_TIMES_MS)},
             "features": ["Enhanced OCR", "Fuzzy Matching", "Multi-pass Processing", "Confidence Scoring"]
         }
+        # 503 until warm-up is done so readiness probes hold traffic back
+        return health if ready else JSONResponse(status_code=503, content=health)
     except Exception as e:
         logger.error(f"Tesseract health check failed: {str(e)}")
-        return {"status": "unhealthy", "error": str(e)}
\ No newline at end of file
+        return JSONResponse(status_code=503, content={"status": "unhealthy", "error": str(e)})
+
+MAIN_IMPORT_MS = round((time.perf_counter() - MAIN_IMPORT_STARTED) * 1000, 1)
@@ -0,0 +1,222 @@
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds, from a cheap threshold up to a full exhaustive run
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base for labelled metrics rendered in the Prometheus text format"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {value:g}" for key, value in items]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {value:g}" for key, value in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: (non-cumulative bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = []
+        inf_label = 'le="+Inf"'
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labelnames, key, f'le="{bound:g}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, inf_label)} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {total:g}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics exported together at /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class RequestTimings:
+    """Spans recorded while one report is analyzed, for the optional "timings" block"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str], List[float]] = {}
+        self.info: Dict[str, Any] = {}
+
+    def add(self, group: str, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._totals.setdefault((group, name), [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def as_dict(self) -> Dict:
+        """{group: {name: {"ms", "calls"}}} plus the wall time so far"""
+        timings: Dict[str, Any] = {"total_ms": round((time.perf_counter() - self.started) * 1000, 1)}
+        with self._lock:
+            for (group, name), (seconds, calls) in sorted(self._totals.items()):
+                timings.setdefault(group, {})[name] = {"ms": round(seconds * 1000, 1), "calls": calls}
+        timings.update(self.info)
+        return timings
+
+
+_request_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextlib.contextmanager
+def track_request():
+    """Collect the spans of everything awaited inside this block (tasks and threadpool calls inherit it)"""
+    timings = RequestTimings()
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def record(histogram: Histogram, group: str, name: str, seconds: float, **labels) -> None:
+    """Observe a duration globally and on the current request, if any"""
+    histogram.observe(seconds, **labels)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(group, name, seconds)
+
+
+def annotate(key: str, value: Any) -> None:
+    """Attach extra information to the current request's timings block"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.info[key] = value
+
+
+@contextlib.contextmanager
+def span(histogram: Histogram, group: str, name: str, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(histogram, group, name, time.perf_counter() - started, **labels)
+
+
+def timed_call(fn: Callable[..., Any], *args) -> Tuple[Any, float]:
+    """Run fn(*args) and return (result, seconds); pool workers don't inherit the request context"""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
@@ -1,15 +1,30 @@
+from pathlib import Path
+
 import modal
-from main import app
 
-image = modal.Image.debian_slim().pip_install("fastapi", 
-    "pytesseract", 
-    "pillow", 
-    "opencv-python",
-    "google-cloud-vision")
+# Cheap to import: heavy modules load lazily, during the lifespan warm-up in the container
+from main import app as web_app
+
+MODEL_PATH = Path(__file__).resolve().parent.parent / "ai" / "model.pkl"
+# Only Python modules are mounted automatically; the catalog is data
+CATALOG_PATH = Path(__file__).resolve().parent / "report_catalog.json"
+
+# libtesseract + leptonica headers let pip build tesserocr for the in-process OCR backend
+image = (
+    modal.Image.debian_slim()
+    .apt_install("tesseract-ocr", "tesseract-ocr-eng", "libtesseract-dev", "libleptonica-dev",
+                 "pkg-config", "libgl1", "libglib2.0-0")
+    .pip_install_from_requirements(str(Path(__file__).resolve().parent / "requirements.txt"))
+    .pip_install("pytesseract", "pillow", "opencv-python-headless", "numpy")
+    .env({"WARMUP_MODE": "blocking", "RISK_MODEL_PATH": "/model/model.pkl",
+          "REPORT_CATALOG": "/catalog/report_catalog.json"})
+    .add_local_file(MODEL_PATH, "/model/model.pkl")
+    .add_local_file(CATALOG_PATH, "/catalog/report_catalog.json")
+)
 
-app = modal.App("sahyog-api")  # Updated syntax
+app = modal.App("sahyog-api")
 
 @app.function(image=image)
-@app.asgi_app()
+@modal.asgi_app()
 def fastapi_app():
-    return app
\ No newline at end of file
+    return web_app
@@ -0,0 +1,133 @@
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, Hashable, List, Tuple
+
+# "verify" reuses a near-duplicate's result once the first OCR passes agree with it,
+# "off" always runs the full pipeline. "reuse" returns it without any OCR; only
+# safe when reports never share a lab's page template, whose pages hash alike
+NEAR_DUP_MODE = os.getenv("NEAR_DUP_MODE", "verify")
+# Hamming distances (of 64 bits) under which two pages may be photos of the same report
+NEAR_DUP_PHASH_DISTANCE = int(os.getenv("NEAR_DUP_PHASH_DISTANCE", "10"))
+NEAR_DUP_DHASH_DISTANCE = int(os.getenv("NEAR_DUP_DHASH_DISTANCE", "14"))
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "10000"))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHash:
+    """Multi-index hashing of 64-bit hashes for Hamming radius queries
+
+    Each hash is filed under its four 16-bit chunks. Two hashes within
+    distance r differ in at most r // 4 bits on at least one chunk, so a
+    query only probes the chunk values that close to its own (137 dict
+    lookups per chunk for r = 10) and checks the few entries filed there,
+    instead of every entry. Unlike a BK-tree, entries can be removed.
+    """
+
+    CHUNKS = 4
+    CHUNK_BITS = 16
+
+    def __init__(self):
+        self._tables: List[Dict[int, set]] = [{} for _ in range(self.CHUNKS)]
+        self._keys: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _chunks(self, key: int) -> List[int]:
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(key >> (i * self.CHUNK_BITS)) & mask for i in range(self.CHUNKS)]
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _flips(bits: int, distance: int) -> Tuple[int, ...]:
+        """Every bits-wide mask with at most distance bits set"""
+        return tuple(sum(1 << bit for bit in positions)
+                     for flipped in range(distance + 1) for positions in combinations(range(bits), flipped))
+
+    def add(self, key: int, value: Hashable) -> None:
+        self.remove(value)
+        self._keys[value] = key
+        for table, chunk in zip(self._tables, self._chunks(key)):
+            table.setdefault(chunk, set()).add(value)
+
+    def remove(self, value: Hashable) -> None:
+        key = self._keys.pop(value, None)
+        if key is None:
+            return
+        for table, chunk in zip(self._tables, self._chunks(key)):
+            bucket = table[chunk]
+            bucket.discard(value)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, key: int, radius: int) -> List[Tuple[int, Hashable]]:
+        """(distance, value) of everything within radius, nearest first"""
+        flips = self._flips(self.CHUNK_BITS, radius // self.CHUNKS)
+        candidates = set()
+        for table, chunk in zip(self._tables, self._chunks(key)):
+            for flip in flips:
+                bucket = table.get(chunk ^ flip)
+                if bucket:
+                    candidates.update(bucket)
+        found = [(hamming(key, self._keys[value]), value) for value in candidates]
+        found = [(distance, value) for distance, value in found if distance <= radius]
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+class NearDuplicateIndex:
+    """Perceptual hashes of analyzed report pages, pointing at their cached results
+
+    Entries are (pHash, dHash, scope, result key). The multi-index is
+    searched by pHash and candidates must also be close in dHash. scope
+    (extraction rules version and OCR mode) keeps results from other
+    pipelines out. The oldest entries are dropped past max_entries.
+    """
+
+    def __init__(self, max_entries: int = NEAR_DUP_MAX_ENTRIES, phash_distance: int = NEAR_DUP_PHASH_DISTANCE,
+                 dhash_distance: int = NEAR_DUP_DHASH_DISTANCE):
+        self.max_entries = max(1, max_entries)
+        self.phash_distance = phash_distance
+        self.dhash_distance = dhash_distance
+        self._entries: "OrderedDict[str, Tuple[int, int, Hashable]]" = OrderedDict()
+        self._index = MultiIndexHash()
+        self._lock = threading.Lock()
+        self.counters = {"lookups": 0, "matches": 0, "verified": 0, "rejected": 0}
+
+    def add(self, phash: int, dhash: int, scope: Hashable, result_key: str) -> None:
+        with self._lock:
+            if result_key in self._entries:
+                return
+            self._entries[result_key] = (phash, dhash, scope)
+            self._index.add(phash, result_key)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._index.remove(oldest)
+
+    def lookup(self, phash: int, dhash: int, scope: Hashable) -> List[Tuple[int, str]]:
+        """(pHash distance, result key) of matching pages, nearest first"""
+        with self._lock:
+            self.counters["lookups"] += 1
+            matches = []
+            for distance, result_key in self._index.search(phash, self.phash_distance):
+                entry = self._entries.get(result_key)
+                if entry is not None and entry[2] == scope and hamming(dhash, entry[1]) <= self.dhash_distance:
+                    matches.append((distance, result_key))
+            if matches:
+                self.counters["matches"] += 1
+            return matches
+
+    def count(self, outcome: str) -> None:
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries), "max_entries": self.max_entries,
+                    "phash_distance": self.phash_distance, "dhash_distance": self.dhash_distance}
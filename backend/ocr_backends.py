@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import logging
+import os
+import shlex
+import threading
+from typing import Dict, Optional, Tuple
+
+from concurrency import governor
+from lazy_imports import LazyModule
+
+# Loaded on first OCR call; the CLI backend only needs them as a fallback
+np = LazyModule("numpy")
+pytesseract = LazyModule("pytesseract")
+Image = LazyModule("PIL.Image")
+
+# OpenMP reads its thread limit when libtesseract loads, so set it first
+governor.limit_openmp()
+
+# Optional in-process binding. It must be imported here, on the main thread:
+# its signal handler setup fails when first imported from a pool worker.
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# "auto" uses the in-process tesserocr binding when it is installed
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+# tesseract binary for the CLI backend; found on PATH unless set (or on Windows)
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", r"C:\Program Files\Tesseract-OCR\tesseract.exe" if os.name == "nt" else "")
+
+
+def parse_tesseract_config(config: str) -> Tuple[int, int, Dict[str, str]]:
+    """Split a pytesseract config string into (oem, psm, -c variables)"""
+    oem, psm, variables = 3, 3, {}
+    args = shlex.split(config)
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--oem" and i + 1 < len(args):
+            oem = int(args[i + 1])
+            i += 1
+        elif arg == "--psm" and i + 1 < len(args):
+            psm = int(args[i + 1])
+            i += 1
+        elif arg == "-c" and i + 1 < len(args):
+            name, _, value = args[i + 1].partition("=")
+            variables[name] = value
+            i += 1
+        i += 1
+    return oem, psm, variables
+
+
+class OCRTimeoutError(RuntimeError):
+    """A Tesseract call ran past its timeout and was stopped"""
+
+
+class OCRBackend:
+    """Interface the text extractors use to talk to Tesseract
+
+    timeout is in seconds, 0 for none; a call that runs longer is stopped
+    (the CLI process is killed) and raises OCRTimeoutError.
+    """
+
+    name = "base"
+
+    def version(self) -> str:
+        raise NotImplementedError
+
+    def image_to_string(self, img: np.ndarray, config: str, timeout: float = 0) -> str:
+        raise NotImplementedError
+
+    def image_to_data(self, img: np.ndarray, config: str, timeout: float = 0) -> Dict[str, list]:
+        """Same dict layout as pytesseract.image_to_data(output_type=Output.DICT)"""
+        raise NotImplementedError
+
+    def orientation(self, img: np.ndarray) -> Optional[Tuple[int, float]]:
+        """Tesseract OSD: (degrees the page must turn counter-clockwise to be upright,
+        confidence), or None when there is too little text to tell"""
+        raise NotImplementedError
+
+
+class PytesseractBackend(OCRBackend):
+    """Spawns the tesseract CLI for every call (temp image file, fresh model load)"""
+
+    name = "pytesseract"
+
+    def __init__(self):
+        if TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+    def version(self) -> str:
+        return str(pytesseract.get_tesseract_version())
+
+    @staticmethod
+    def _run(fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except RuntimeError as e:
+            # pytesseract kills the process and raises a bare RuntimeError on timeout
+            if "timeout" in str(e).lower():
+                raise OCRTimeoutError(str(e))
+            raise
+
+    def image_to_string(self, img: np.ndarray, config: str, timeout: float = 0) -> str:
+        return self._run(pytesseract.image_to_string, Image.fromarray(img), lang=OCR_LANG, config=config,
+                         timeout=timeout)
+
+    def image_to_data(self, img: np.ndarray, config: str, timeout: float = 0) -> Dict[str, list]:
+        return self._run(pytesseract.image_to_data, Image.fromarray(img), lang=OCR_LANG, config=config,
+                         output_type=pytesseract.Output.DICT, timeout=timeout)
+
+    def orientation(self, img: np.ndarray) -> Optional[Tuple[int, float]]:
+        try:
+            osd = pytesseract.image_to_osd(Image.fromarray(img), output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractError:
+            return None  # "Too few characters"
+        return int(osd["orientation"]), float(osd["orientation_conf"])
+
+
+class TesserocrBackend(OCRBackend):
+    """Warm in-process Tesseract handles through the tesserocr C-API binding
+
+    Each worker thread (or process) keeps one initialised API per
+    (oem, psm), so the traineddata is loaded once instead of on every
+    call. Images are handed over as raw numpy buffers, with no temp files.
+    -c variables are applied per call and restored afterwards.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        if tesserocr is None:
+            raise ImportError("tesserocr is not installed")
+        self.tesserocr = tesserocr
+        self._local = threading.local()
+
+    def version(self) -> str:
+        return self.tesserocr.tesseract_version().split()[1]
+
+    def _api(self, oem: int, psm: int):
+        handles = getattr(self._local, "handles", None)
+        if handles is None:
+            handles = self._local.handles = {}
+        key = (oem, psm)
+        if key not in handles:
+            handles[key] = self.tesserocr.PyTessBaseAPI(lang=OCR_LANG, oem=oem, psm=psm)
+        return handles[key]
+
+    def _osd_api(self):
+        """Legacy-engine handle for orientation detection (osd.traineddata)"""
+        api = getattr(self._local, "osd", None)
+        if api is None:
+            api = self._local.osd = self.tesserocr.PyTessBaseAPI(
+                lang="osd", psm=self.tesserocr.PSM.OSD_ONLY, oem=self.tesserocr.OEM.TESSERACT_ONLY
+            )
+        return api
+
+    @staticmethod
+    def _set_image(api, img: np.ndarray) -> None:
+        if img.ndim == 3:
+            img = img[:, :, ::-1]  # OpenCV BGR -> RGB
+        img = np.ascontiguousarray(img)
+        height, width = img.shape[:2]
+        bytes_per_pixel = 1 if img.ndim == 2 else img.shape[2]
+        api.SetImageBytes(img.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+    def _prepare(self, img: np.ndarray, config: str):
+        oem, psm, variables = parse_tesseract_config(config)
+        api = self._api(oem, psm)
+        self._set_image(api, img)
+
+        defaults = {name: api.GetVariableAsString(name) for name in variables}
+        for name, value in variables.items():
+            api.SetVariable(name, value)
+        return api, defaults
+
+    @staticmethod
+    def _restore(api, defaults: Dict[str, Optional[str]]) -> None:
+        for name, value in defaults.items():
+            api.SetVariable(name, value or "")
+        api.Clear()
+
+    @staticmethod
+    def _recognize(api, timeout: float) -> None:
+        """Recognize with Tesseract's own cancel-on-timeout monitor"""
+        if not api.Recognize(int(timeout * 1000)) and timeout:
+            raise OCRTimeoutError(f"Tesseract recognition timed out after {timeout:.1f}s")
+
+    def image_to_string(self, img: np.ndarray, config: str, timeout: float = 0) -> str:
+        api, defaults = self._prepare(img, config)
+        try:
+            self._recognize(api, timeout)
+            return api.GetUTF8Text()
+        finally:
+            self._restore(api, defaults)
+
+    def image_to_data(self, img: np.ndarray, config: str, timeout: float = 0) -> Dict[str, list]:
+        RIL = self.tesserocr.RIL
+        api, defaults = self._prepare(img, config)
+        data = {key: [] for key in ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+                                    "left", "top", "width", "height", "conf", "text")}
+        try:
+            self._recognize(api, timeout)
+            iterator = api.GetIterator()
+            block = par = line = word = 0
+            for item in self.tesserocr.iterate_level(iterator, RIL.WORD):
+                if item.IsAtBeginningOf(RIL.BLOCK):
+                    block, par, line, word = block + 1, 0, 0, 0
+                if item.IsAtBeginningOf(RIL.PARA):
+                    par, line, word = par + 1, 0, 0
+                if item.IsAtBeginningOf(RIL.TEXTLINE):
+                    line, word = line + 1, 0
+                word += 1
+                box = item.BoundingBox(RIL.WORD)
+                if box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                values = (5, 1, block, par, line, word, x1, y1, x2 - x1, y2 - y1,
+                          item.Confidence(RIL.WORD), item.GetUTF8Text(RIL.WORD) or "")
+                for key, value in zip(data, values):
+                    data[key].append(value)
+            return data
+        finally:
+            self._restore(api, defaults)
+
+    def orientation(self, img: np.ndarray) -> Optional[Tuple[int, float]]:
+        api = self._osd_api()
+        self._set_image(api, img)
+        try:
+            osd = api.DetectOrientationScript()
+        finally:
+            api.Clear()
+        if not osd:
+            return None
+        return int(osd["orient_deg"]), float(osd["orient_conf"])
+
+
+class FallbackBackend(OCRBackend):
+    """Primary backend with pytesseract as a per-call fallback"""
+
+    def __init__(self, primary: OCRBackend, fallback: OCRBackend):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+
+    def version(self) -> str:
+        return self.primary.version()
+
+    def image_to_string(self, img: np.ndarray, config: str, timeout: float = 0) -> str:
+        try:
+            return self.primary.image_to_string(img, config, timeout)
+        except OCRTimeoutError:
+            raise  # The time is spent; retrying on the slower backend only makes it worse
+        except Exception as e:
+            logger.warning(f"{self.primary.name} failed ({str(e)}), falling back to {self.fallback.name}")
+            return self.fallback.image_to_string(img, config, timeout)
+
+    def image_to_data(self, img: np.ndarray, config: str, timeout: float = 0) -> Dict[str, list]:
+        try:
+            return self.primary.image_to_data(img, config, timeout)
+        except OCRTimeoutError:
+            raise
+        except Exception as e:
+            logger.warning(f"{self.primary.name} failed ({str(e)}), falling back to {self.fallback.name}")
+            return self.fallback.image_to_data(img, config, timeout)
+
+    def orientation(self, img: np.ndarray) -> Optional[Tuple[int, float]]:
+        try:
+            return self.primary.orientation(img)
+        except Exception as e:
+            logger.warning(f"{self.primary.name} failed ({str(e)}), falling back to {self.fallback.name}")
+            return self.fallback.orientation(img)
+
+
+_backends: Dict[str, OCRBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def create_backend(name: str) -> OCRBackend:
+    if name == "pytesseract":
+        return PytesseractBackend()
+    if name == "tesserocr":
+        return FallbackBackend(TesserocrBackend(), PytesseractBackend())
+    if name == "auto":
+        try:
+            return create_backend("tesserocr")
+        except ImportError:
+            return PytesseractBackend()
+    raise ValueError(f"Unknown OCR backend: {name}")
+
+
+def get_backend(name: str = OCR_BACKEND) -> OCRBackend:
+    """Backend shared by everything in this process (and per pool worker process)"""
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = create_backend(name)
+            logger.info(f"OCR backend: {_backends[name].name}")
+        return _backends[name]
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from concurrency import governor
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (overridable through the environment on Modal / uvicorn)
+OCR_POOL_KIND = os.getenv("OCR_POOL_KIND", "thread")  # "thread" or "process"
+# Defaults to this worker process's share of the cores (see concurrency.py)
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", str(governor.ocr_workers)))
+OCR_MAX_QUEUED_JOBS = int(os.getenv("OCR_MAX_QUEUED_JOBS", "100"))
+
+
+class OCRPoolFullError(Exception):
+    """Raised when the OCR pool cannot accept more jobs"""
+
+
+class OCRWorkerPool:
+    """Bounded worker pool for blocking OCR jobs
+
+    Every Tesseract call is one job. Jobs for a request are admitted
+    together, so a request either gets all of its jobs queued or is
+    rejected up front with OCRPoolFullError.
+    """
+
+    def __init__(self, kind: str = OCR_POOL_KIND, max_workers: int = OCR_MAX_WORKERS,
+                 max_queued_jobs: int = OCR_MAX_QUEUED_JOBS):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown OCR pool kind: {kind}")
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queued_jobs = max(1, max_queued_jobs)
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending_jobs(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        """Create the executor on first use so importing main stays cheap"""
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="ocr")
+            logger.info(f"Started OCR {self.kind} pool with {self.max_workers} workers")
+        return self._executor
+
+    def _reserve(self, count: int) -> None:
+        with self._lock:
+            # A single oversized request is still allowed on an idle pool
+            if self._pending and self._pending + count > self.max_queued_jobs:
+                raise OCRPoolFullError(
+                    f"OCR pool is full ({self._pending} jobs pending, limit {self.max_queued_jobs})"
+                )
+            self._pending += count
+
+    def _release(self, count: int = 1) -> None:
+        with self._lock:
+            self._pending -= count
+
+    async def map(self, fn: Callable[..., Any], jobs: Sequence[Tuple]) -> List[Any]:
+        """Run fn(*job) for every job on the pool and return results in job order
+
+        Cancelling the caller (a deadline, a client that went away) cancels
+        the jobs that have not started yet; a slot is only given back once
+        its job has really finished or been cancelled.
+        """
+        if not jobs:
+            return []
+
+        self._reserve(len(jobs))
+        executor = self._get_executor()
+
+        futures = []
+        try:
+            for job in jobs:
+                future = executor.submit(fn, *job)
+                future.add_done_callback(lambda _: self._release())
+                futures.append(asyncio.wrap_future(future))
+        except Exception:
+            # Give back the slots of jobs that never made it onto the pool
+            self._release(len(jobs) - len(futures))
+            raise
+
+        return await asyncio.gather(*futures)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
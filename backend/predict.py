@@ -1,10 +1,122 @@
-import joblib
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from lazy_imports import LazyModule
+
+# joblib pulls in scikit-learn's dependencies; both load with the model
+joblib = LazyModule("joblib")
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Resolved against this file, so the service can be started from any directory
+RISK_MODEL_PATH = os.getenv("RISK_MODEL_PATH", str(Path(__file__).resolve().parent.parent / "ai" / "model.pkl"))
+PREDICT_MAX_RECORDS = int(os.getenv("PREDICT_MAX_RECORDS", "10000"))
+
+# Model feature name -> parameter names used by /analyze-report
+FEATURE_ALIASES = {
+    "Hb": ["Hb", "Hemoglobin", "Haemoglobin"],
+}
+
+RISK_LABELS = {0: "Normal", 1: "Anemia risk"}
+
+
+class RiskModel:
+    """Anemia risk classifier scored on whole batches of records
+
+    Records can be model feature dicts ({"Hb": 9.5}), extracted parameter
+    values ({"Hemoglobin": 9.5}) or the "parameters" block returned by
+    /analyze-report ({"Hemoglobin": {"value": 9.5, ...}}). All scorable
+    records go through a single predict_proba call on one matrix.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.features: List[str] = [str(name) for name in getattr(model, "feature_names_in_", ["Hb"])]
+        # Models fitted on a DataFrame are scored on one with the same columns,
+        # so sklearn can check them instead of warning about a bare ndarray
+        self.named_features = hasattr(model, "feature_names_in_")
+        self.classes = [int(label) for label in model.classes_]
+
+    @classmethod
+    def load(cls, path: str = RISK_MODEL_PATH) -> "RiskModel":
+        model = cls(joblib.load(path))
+        logger.info(f"Loaded risk model from {path} (features: {model.features})")
+        return model
+
+    @staticmethod
+    def feature_value(record: Dict[str, Any], feature: str) -> Optional[float]:
+        for name in FEATURE_ALIASES.get(feature, [feature]):
+            value = record.get(name)
+            if isinstance(value, dict):
+                value = value.get("value")
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return None
+            return value if np.isfinite(value) else None
+        return None
+
+    def to_matrix(self, records: List[Dict[str, Any]]):
+        """Feature matrix of the scorable records plus their indexes and per-record errors"""
+        rows, indexes, errors = [], [], {}
+        for i, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors[i] = "Record must be an object"
+                continue
+            row = [self.feature_value(record, feature) for feature in self.features]
+            missing = [feature for feature, value in zip(self.features, row) if value is None]
+            if missing:
+                errors[i] = f"Missing or invalid: {', '.join(missing)}"
+                continue
+            rows.append(row)
+            indexes.append(i)
+        matrix = np.asarray(rows, dtype=np.float64).reshape(len(rows), len(self.features))
+        return matrix, indexes, errors
+
+    def predict(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        matrix, indexes, errors = self.to_matrix(records)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+        for i, error in errors.items():
+            results[i] = {"prediction": None, "error": error}
+
+        if len(indexes):
+            features = pd.DataFrame(matrix, columns=self.features) if self.named_features else matrix
+            probabilities = self.model.predict_proba(features)
+            risk_column = self.classes.index(1) if 1 in self.classes else -1
+            predicted = np.asarray(self.classes)[probabilities.argmax(axis=1)]
+            for row, i in enumerate(indexes):
+                risk = int(predicted[row])
+                results[i] = {
+                    "prediction": RISK_LABELS.get(risk, str(risk)),
+                    "risk": risk,
+                    "probability": round(float(probabilities[row, risk_column]), 4)
+                }
+        return results
+
+
+def parse_records(payload: Union[Dict, List]) -> Tuple[List[Dict[str, Any]], bool]:
+    """Normalise a /predict body into (records, is_batch)"""
+    if isinstance(payload, list):
+        return payload, True
+    if isinstance(payload, dict) and isinstance(payload.get("records"), list):
+        return payload["records"], True
+    if isinstance(payload, dict) and isinstance(payload.get("parameters"), dict):
+        return [payload["parameters"]], False
+    return [payload], False
+
+
+_default_model: Optional[RiskModel] = None
 
-# Load the trained model
-model = joblib.load("../ai/model.pkl")
 
-# Prediction function
 def predict_risk(test_data):
-    hb_level = test_data["Hb"]
-    prediction = model.predict([[hb_level]])[0]  # 0 or 1
-    return "Anemia risk" if prediction == 1 else "Normal"
\ No newline at end of file
+    """Single-record helper kept for existing callers"""
+    global _default_model
+    if _default_model is None:
+        _default_model = RiskModel.load()
+    return _default_model.predict([test_data])[0]["prediction"] or "Unknown"
@@ -0,0 +1,83 @@
+import gzip
+import json
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+# Optional: responses fall back to the json module without orjson, and msgpack is only offered when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Bodies at least this large are gzipped for clients that send Accept-Encoding: gzip
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(obj: Any) -> Any:
+    """numpy scalars and arrays that slip into results"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def dumps_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON through orjson when it is installed; compact separators either way"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+class MsgpackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True, default=_default)
+
+
+def accepts(request: Request, header: str, value: str) -> bool:
+    """Whether a comma-separated Accept-style header lists value without q=0"""
+    for item in request.headers.get(header, "").lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip() == value:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def gzip_response(request: Request, response: Response) -> Response:
+    """Gzip a rendered body when it is large enough and the client accepts it"""
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    if len(response.body) >= GZIP_MIN_BYTES and accepts(request, "accept-encoding", "gzip"):
+        response.body = gzip.compress(response.body, GZIP_LEVEL)
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers["Content-Length"] = str(len(response.body))
+    return response
+
+
+def negotiate(request: Request, content: Any, status_code: int = 200,
+              headers: Optional[Dict[str, str]] = None) -> Response:
+    """msgpack when the client asks for it and it is installed, otherwise JSON; gzipped when accepted
+
+    Returning a Response also skips FastAPI's jsonable_encoder pass over
+    the result, which costs more than the serialization itself.
+    """
+    if msgpack is not None and any(accepts(request, "accept", media_type) for media_type in MSGPACK_MEDIA_TYPES):
+        response = MsgpackResponse(content, status_code, headers)
+    else:
+        response = FastJSONResponse(content, status_code, headers)
+    return gzip_response(request, response)
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration (RESULT_CACHE_DB enables the on-disk tier)
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", str(24 * 3600)))
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")
+
+
+class ResultCache:
+    """Two-tier cache of analysis results keyed by upload content hash
+
+    The memory tier is a bounded LRU. The optional disk tier is a SQLite
+    file that survives restarts; disk hits are promoted back into memory.
+    Values are stored as JSON so callers always get a fresh copy.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, ttl_seconds: float = RESULT_CACHE_TTL_S,
+                 disk_path: str = RESULT_CACHE_DB):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path or None
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+        if self.disk_path:
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, created REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"Result cache disk tier at {self.disk_path}")
+
+    @staticmethod
+    def make_key(content_hash: str, *parts: str) -> str:
+        return ":".join((content_hash,) + tuple(str(part) for part in parts))
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """Return (value, tier) where tier is "memory" or "disk", or (None, None)"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, payload = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return json.loads(payload), "memory"
+                del self._memory[key]
+                self.counters["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT created, payload FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    created, payload = row
+                    if not self._expired(created):
+                        self._remember(key, created, payload)
+                        self.counters["disk_hits"] += 1
+                        return json.loads(payload), "disk"
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.counters["expired"] += 1
+
+            self.counters["misses"] += 1
+            return None, None
+
+    def put(self, key: str, value: Dict) -> None:
+        payload = json.dumps(value)
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, payload)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, created, payload) VALUES (?, ?, ?)",
+                    (key, created, payload)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, created: float, payload: str) -> None:
+        if not self.max_entries:
+            return
+        self._memory[key] = (created, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            stats = dict(self.counters)
+            stats.update({
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_tier": bool(self._db),
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+            })
+            return stats
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,185 @@
+import math
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from main import report_catalog
+
+# Label spellings seen on real CBC printouts, all of them catalog aliases
+REPORT_LABELS = {
+    "Hemoglobin": ["Hemoglobin (Hb)", "Haemoglobin", "Hb"],
+    "RBC": ["Total RBC Count", "RBC Count", "Red Blood Cell"],
+    "WBC": ["Total Leucocyte Count (TLC)", "TLC", "WBC"],
+    "Platelets": ["Platelet Count", "Platelets", "PLT"],
+    "PCV": ["Packed Cell Volume", "PCV", "HCT"],
+    "MCV": ["MCV", "Mean Cell Volume"],
+    "MCH": ["MCH", "Mean Cell Hemoglobin"],
+    "MCHC": ["MCHC", "Mean Cell Hemoglobin Concentration"],
+    "RDW-CV": ["RDW-CV", "RDW CV"],
+    "Polymorphs": ["Polymorphs", "Neutrophils"],
+    "Lymphocytes": ["Lymphocytes", "Lymphs"],
+    "Monocytes": ["Monocytes", "Monos"],
+    "Eosinophils": ["Eosinophils", "Eos"],
+    "Basophils": ["Basophils", "Basos"],
+}
+
+# Value ranges (low, high, decimals) covering normal and clearly abnormal results
+VALUE_RANGES = {
+    "Hemoglobin": (7.0, 18.0, 1),
+    "RBC": (3.0, 6.0, 2),
+    "WBC": (3000, 15000, 0),
+    "Platelets": (0.8, 5.0, 2),
+    "PCV": (28.0, 55.0, 1),
+    "MCV": (70.0, 105.0, 1),
+    "MCH": (22.0, 35.0, 1),
+    "MCHC": (29.0, 37.0, 1),
+    "RDW-CV": (11.0, 18.0, 1),
+    "Polymorphs": (40, 80, 0),
+    "Lymphocytes": (15, 45, 0),
+    "Monocytes": (2, 10, 0),
+    "Eosinophils": (1, 8, 0),
+    "Basophils": (0.1, 1.9, 1),
+}
+
+# Font names usable in place of a .ttf path; "hershey" is OpenCV's built-in stroke font
+FONT_DIRS = ["/usr/share/fonts/truetype/dejavu", "/Library/Fonts", "C:\\Windows\\Fonts"]
+FONT_FILES = {
+    "sans": ["DejaVuSans.ttf", "Arial.ttf", "arial.ttf"],
+    "serif": ["DejaVuSerif.ttf", "Times New Roman.ttf", "times.ttf"],
+    "mono": ["DejaVuSansMono.ttf", "Courier New.ttf", "cour.ttf"],
+}
+
+# A4 at 150 dpi; --scale simulates other scan resolutions
+PAGE_SIZE = (1240, 1754)
+# Left edges of the Test, Result, Unit and Reference columns
+TABLE_COLUMNS = (60, 640, 820, 1010)
+
+
+def resolve_font(font: str) -> Optional[str]:
+    """Path of a named or explicit TrueType font, or None for the Hershey fallback"""
+    if font == "hershey":
+        return None
+    if os.path.isfile(font):
+        return font
+    for directory in FONT_DIRS:
+        for filename in FONT_FILES.get(font, []):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def random_values(rng: random.Random) -> Dict[str, float]:
+    values = {}
+    for param_name, (low, high, decimals) in VALUE_RANGES.items():
+        value = round(rng.uniform(low, high), decimals)
+        values[param_name] = int(value) if decimals == 0 else value
+    return values
+
+
+def format_value(param_name: str, value: float) -> str:
+    decimals = VALUE_RANGES[param_name][2]
+    return f"{value:.{decimals}f}"
+
+
+class ReportRenderer:
+    """Draws text lines on a white page with either PIL TrueType fonts or OpenCV Hershey"""
+
+    def __init__(self, font: str = "sans", text_size: int = 22):
+        self.font_path = resolve_font(font)
+        self.text_size = text_size
+        self.page = Image.new("L", PAGE_SIZE, 255)
+        self.draw = ImageDraw.Draw(self.page)
+        self.fonts: Dict[bool, ImageFont.FreeTypeFont] = {}
+        self.hershey: List[Tuple[str, Tuple[int, int], bool]] = []
+
+    def text(self, position: Tuple[int, int], text: str, bold: bool = False) -> None:
+        if self.font_path is None:
+            self.hershey.append((text, position, bold))
+            return
+        if bold not in self.fonts:
+            path = self.font_path.replace(".ttf", "-Bold.ttf") if bold else self.font_path
+            self.fonts[bold] = ImageFont.truetype(path if os.path.isfile(path) else self.font_path, self.text_size)
+        self.draw.text(position, text, fill=0, font=self.fonts[bold])
+
+    def line(self, y: int) -> None:
+        self.draw.line([(60, y), (PAGE_SIZE[0] - 60, y)], fill=0, width=2)
+
+    def image(self) -> np.ndarray:
+        img = cv2.cvtColor(np.array(self.page), cv2.COLOR_GRAY2BGR)
+        scale = self.text_size / 30
+        for text, (x, y), bold in self.hershey:
+            cv2.putText(img, text, (x, y + self.text_size), cv2.FONT_HERSHEY_SIMPLEX, scale,
+                        (0, 0, 0), 2 if bold else 1, cv2.LINE_AA)
+        return img
+
+
+def degrade(img: np.ndarray, rng: random.Random, noise: float = 0.0, skew: float = 0.0,
+            blur: float = 0.0, scale: float = 1.0) -> np.ndarray:
+    """Scanner/camera artefacts: rotation by up to `skew` degrees, Gaussian blur sigma,
+    additive Gaussian noise sigma (grey levels) and resampling by `scale`"""
+    if skew:
+        angle = rng.uniform(-skew, skew)
+        h, w = img.shape[:2]
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        img = cv2.warpAffine(img, matrix, (w, h), flags=cv2.INTER_LINEAR, borderValue=(255, 255, 255))
+    if blur:
+        img = cv2.GaussianBlur(img, (0, 0), blur)
+    if scale != 1.0:
+        h, w = img.shape[:2]
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=interpolation)
+    if noise:
+        noisy = img.astype(np.float32) + np.random.default_rng(rng.randrange(2 ** 32)).normal(0, noise, img.shape)
+        img = np.clip(noisy, 0, 255).astype(np.uint8)
+    return img
+
+
+def render_cbc_report(rng: random.Random, font: str = "sans", noise: float = 0.0, skew: float = 0.0,
+                      blur: float = 0.0, scale: float = 1.0,
+                      text_size: int = 22) -> Tuple[np.ndarray, Dict[str, float]]:
+    """A CBC report page with random values; returns (BGR image, golden values)"""
+    values = random_values(rng)
+    renderer = ReportRenderer(font, text_size)
+    row_height = int(text_size * 1.9)
+
+    renderer.text((60, 60), "CITY PATHOLOGY LABORATORY", bold=True)
+    renderer.text((60, 60 + row_height), f"Patient: Test Subject {rng.randint(100, 999)}    "
+                                         f"Age: {rng.randint(18, 80)} Y    Sex: {rng.choice('MF')}")
+    renderer.text((60, 60 + 2 * row_height), "COMPLETE BLOOD COUNT (CBC)", bold=True)
+
+    y = 60 + 4 * row_height
+    renderer.line(y - 8)
+    for x, heading in zip(TABLE_COLUMNS, ("Test", "Result", "Unit", "Reference")):
+        renderer.text((x, y), heading, bold=True)
+    y += row_height
+    renderer.line(y - 8)
+
+    for param_name, labels in REPORT_LABELS.items():
+        analyte = report_catalog.analytes[param_name]
+        row = (rng.choice(labels), format_value(param_name, values[param_name]),
+               analyte.unit, analyte.normal_range)
+        for x, cell in zip(TABLE_COLUMNS, row):
+            renderer.text((x, y), cell)
+        y += row_height
+    renderer.line(y)
+    renderer.text((60, y + row_height), "*** End of report ***")
+
+    return degrade(renderer.image(), rng, noise, skew, blur, scale), values
+
+
+def encode_report(img: np.ndarray, image_format: str = "png", jpeg_quality: int = 90) -> bytes:
+    params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if image_format in ("jpg", "jpeg") else []
+    ok, encoded = cv2.imencode(f".{image_format}", img, params)
+    if not ok:
+        raise ValueError(f"Could not encode report as {image_format}")
+    return encoded.tobytes()
+
+
+def values_match(found: Optional[float], golden: float) -> bool:
+    """Exact up to the printed precision"""
+    return found is not None and math.isclose(float(found), float(golden), abs_tol=1e-6)
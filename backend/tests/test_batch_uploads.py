@@ -0,0 +1,54 @@
+import io
+import json
+import zipfile
+
+import main
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+
+def zipped(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def post_zip(client, data):
+    return client.post("/analyze-reports/batch", files=[("files", ("reports.zip", data, "application/zip"))])
+
+
+def test_too_many_members_are_refused_before_reading(client, monkeypatch):
+    opened = []
+    monkeypatch.setattr(main, "read_zip_members", lambda *args: opened.append(args) or [])
+    members = [(f"page{index}.png", PNG_MAGIC) for index in range(main.BATCH_MAX_FILES + 1)]
+    response = post_zip(client, zipped(members))
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"At most {main.BATCH_MAX_FILES} files per batch"
+    assert opened == []
+
+
+def test_expanded_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_EXPANDED_BYTES", 1024 * 1024)
+    # Compresses to a few KB, declares 2 MB
+    page = PNG_MAGIC + bytes(1024 * 1024)
+    response = post_zip(client, zipped([("a.png", page), ("b.png", page)]))
+    assert response.status_code == 413
+
+
+def test_members_are_sniffed_like_uploads(client):
+    response = post_zip(client, zipped([("fake.png", b"hello, not an image"), ("notes.txt", b"x")]))
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    errors = {line["filename"]: line["detail"] for line in lines if line.get("status") == "error"}
+    assert errors == {
+        "reports.zip/fake.png": "Unsupported file format",
+        "reports.zip/notes.txt": "Only image and PDF files are supported",
+    }
+
+
+def test_too_many_uploads_are_refused(client):
+    files = [("files", (f"{index}.png", PNG_MAGIC, "image/png")) for index in range(main.BATCH_MAX_FILES + 1)]
+    response = client.post("/analyze-reports/batch", files=files)
+    assert response.status_code == 400
@@ -0,0 +1,86 @@
+import pytest
+
+from catalog import AliasMatcher, CatalogError, ReportCatalog, canonical_alias, parse_range
+from main import FuzzyParameterExtractor, report_catalog
+
+
+def hit_names(text):
+    return [sorted(names) for _, _, names in report_catalog.hits(text)]
+
+
+def test_canonical_alias_folds_case_separators_and_lookalikes():
+    assert canonical_alias("  RDW -- CV ") == "rdw cv"
+    assert canonical_alias("Hem0globin") == canonical_alias("Hemoglobin")
+
+
+def test_parse_range():
+    assert parse_range("12-15") == (12.0, 15.0)
+    assert parse_range("<200") == (None, 200.0)
+    assert parse_range(">= 40") == (40.0, None)
+    with pytest.raises(CatalogError):
+        parse_range("normal")
+
+
+def test_hits_prefer_the_longest_alias():
+    assert hit_names("Mean Cell Hemoglobin 30.1 pg") == [["MCH"]]
+    assert hit_names("Hemoglobin (Hb) 13.5") == [["Hemoglobin"]]
+
+
+def test_hits_need_whole_words():
+    assert hit_names("Hb13.5 g/dl") == [["Hemoglobin"]]
+    assert hit_names("Hbx 13.5") == []
+    assert hit_names("rhb 13.5") == []
+
+
+def test_hits_survive_ocr_lookalikes_and_spacing():
+    assert hit_names("Hem0gl0bin 13.5") == [["Hemoglobin"]]
+    assert hit_names("Total  Leucocyte-Count 7400") == [["WBC"]]
+
+
+def test_alias_matcher_reads_non_ascii_text():
+    matcher = AliasMatcher([canonical_alias(alias) for alias in ["hb", "rdw cv", "β2 microglobulin"]])
+    # Dashes and the degree sign get ASCII stand-ins and the text goes through the regex
+    assert matcher.ascii_stand_in("RDW–CV 13.1 °C") is not None
+    assert matcher.find("RDW – CV 13.1 °C") == [(0, 8, canonical_alias("rdw cv"))]
+    assert matcher.find("Hbé 13.5") == []  # A non-ASCII letter still continues the word
+    assert matcher.find("éHb 13.5") == []
+    # "β" has no ASCII stand-in, so this text walks the trie
+    text = "Hb 13.5\nβ2 Microglobulin 1.9"
+    assert matcher.ascii_stand_in(text) is None
+    assert matcher.find(text) == [(0, 2, canonical_alias("hb")), (8, 24, canonical_alias("β2 microglobulin"))]
+
+
+def test_detect_panels_respects_min_matches():
+    assert report_catalog.detect_panels(["Hemoglobin"]) == []
+    assert report_catalog.detect_panels(["Hemoglobin", "WBC", "HbA1c"]) == ["CBC", "HbA1c"]
+
+
+def test_unknown_panel_is_rejected():
+    data = {"panels": {}, "analytes": {"X": {"panel": "Nope", "aliases": ["x"], "unit": "", "normal_range": "1-2"}}}
+    with pytest.raises(CatalogError):
+        ReportCatalog(data)
+
+
+def test_extraction_reads_values_and_status():
+    text = ("Patient: A   Age: 40 Y   Sex: M\n"
+            "Hemoglobin (Hb) : 11.2 g/dl 13-17\n"
+            "Platelet Count 2.5 Lakhs/cumm\n"
+            "MCH\n29.0 pg")
+    parameters, _, confidence = FuzzyParameterExtractor().extract_parameters_fuzzy([text])
+    assert parameters["Hemoglobin"]["value"] == 11.2
+    assert parameters["Hemoglobin"]["status"] == "Low"  # Male range 13-17
+    assert parameters["Platelets"]["value"] == 2.5
+    assert parameters["MCH"]["value"] == 29.0
+    assert parameters["MCH"]["confidence"] < parameters["Hemoglobin"]["confidence"]  # Found on the next line
+
+
+def test_extraction_matches_mangled_labels_fuzzily():
+    pytest.importorskip("rapidfuzz")
+    parameters, _, _ = FuzzyParameterExtractor().extract_parameters_fuzzy(["Haemoglobn 12.4 g/dl\nPlatelts : 3.1"])
+    assert parameters["Hemoglobin"]["value"] == 12.4
+    assert parameters["Platelets"]["value"] == 3.1
+
+
+def test_implausible_values_are_dropped():
+    parameters, _, _ = FuzzyParameterExtractor().extract_parameters_fuzzy(["Hemoglobin 135 g/dl"])
+    assert "Hemoglobin" not in parameters
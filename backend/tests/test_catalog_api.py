@@ -0,0 +1,27 @@
+from main import report_catalog
+
+ETAG = f'"{report_catalog.fingerprint}"'
+
+
+def test_catalog_carries_its_fingerprint_as_etag(client):
+    response = client.get("/catalog")
+    assert response.status_code == 200
+    assert response.headers["etag"] == ETAG
+    assert "max-age=" in response.headers["cache-control"]
+    body = response.json()
+    assert body["fingerprint"] == report_catalog.fingerprint
+    assert "Hemoglobin" in body["analytes"]
+
+
+def test_catalog_revalidates_to_304(client):
+    for if_none_match in (ETAG, f"W/{ETAG}", f'"stale", {ETAG}', "*"):
+        response = client.get("/catalog", headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304, if_none_match
+        assert response.headers["etag"] == ETAG
+        assert response.content == b""
+
+
+def test_stale_etag_gets_the_catalog(client):
+    response = client.get("/catalog", headers={"If-None-Match": '"0000000000000000"'})
+    assert response.status_code == 200
+    assert response.json()["fingerprint"] == report_catalog.fingerprint
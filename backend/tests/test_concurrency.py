@@ -0,0 +1,131 @@
+import importlib
+
+import pytest
+
+import concurrency
+from concurrency import ConcurrencyGovernor, available_cpus, cgroup_cpu_quota
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    """Points the cgroup paths at files in tmp_path; write(v2=..., quota=..., period=...) fills them in"""
+    paths = {"v2": tmp_path / "cpu.max", "quota": tmp_path / "cpu.cfs_quota_us",
+             "period": tmp_path / "cpu.cfs_period_us"}
+    monkeypatch.setattr(concurrency, "CGROUP_V2_CPU_MAX", str(paths["v2"]))
+    monkeypatch.setattr(concurrency, "CGROUP_V1_QUOTA", str(paths["quota"]))
+    monkeypatch.setattr(concurrency, "CGROUP_V1_PERIOD", str(paths["period"]))
+    monkeypatch.setattr(concurrency, "CPU_LIMIT", None)
+
+    def write(**contents):
+        for name, text in contents.items():
+            paths[name].write_text(f"{text}\n")
+
+    return write
+
+
+@pytest.fixture
+def host(monkeypatch):
+    """Pretends the host has the given cores, all of them in this process's affinity"""
+    def cores(count):
+        monkeypatch.setattr(concurrency.os, "cpu_count", lambda: count)
+        monkeypatch.setattr(concurrency.os, "sched_getaffinity", lambda pid: set(range(count)), raising=False)
+    return cores
+
+
+def test_cgroup_v2_quota(cgroup):
+    cgroup(v2="150000 100000")
+    assert cgroup_cpu_quota() == 1.5
+
+
+def test_cgroup_v2_max_is_unlimited(cgroup):
+    # v1 files are ignored once cpu.max exists
+    cgroup(v2="max 100000", quota="100000", period="100000")
+    assert cgroup_cpu_quota() is None
+
+
+def test_cgroup_v1_quota(cgroup):
+    cgroup(quota="200000", period="100000")
+    assert cgroup_cpu_quota() == 2.0
+    cgroup(quota="-1")
+    assert cgroup_cpu_quota() is None
+
+
+def test_no_cgroup_files(cgroup):
+    assert cgroup_cpu_quota() is None
+
+
+def test_available_cpus_takes_the_smallest_limit(cgroup, host, monkeypatch):
+    host(16)
+    assert available_cpus() == (16, "cpu_count")
+
+    cgroup(v2="max 100000")
+    assert available_cpus() == (16, "cpu_count")
+
+    cgroup(v2="250000 100000")
+    assert available_cpus() == (2, "cgroup")
+
+    cgroup(v2="50000 100000")
+    assert available_cpus() == (1, "cgroup")
+
+    monkeypatch.setattr(concurrency.os, "sched_getaffinity", lambda pid: {0}, raising=False)
+    cgroup(v2="400000 100000")
+    assert available_cpus() == (1, "affinity")
+
+    monkeypatch.setattr(concurrency, "CPU_LIMIT", "3.7")
+    assert available_cpus() == (3, "CPU_LIMIT")
+
+
+@pytest.mark.parametrize("cpus, workers, threads, expected", [
+    # (cores_per_worker, ocr_workers, threads_per_job)
+    (8, 1, 1, (8, 8, 1)),
+    (8, 4, 1, (2, 2, 1)),
+    (8, 2, 2, (4, 2, 2)),
+    (8, 2, 8, (4, 1, 4)),
+    (2, 4, 1, (1, 1, 1)),
+])
+def test_plan_splits_cores_between_workers(cpus, workers, threads, expected):
+    plan = ConcurrencyGovernor(cpus=cpus, workers=workers, threads_per_job=threads)
+    assert (plan.cores_per_worker, plan.ocr_workers, plan.threads_per_job) == expected
+    assert plan.opencv_threads == plan.threads_per_job
+
+
+def test_plan_stays_within_the_cores_unless_workers_outnumber_them():
+    assert ConcurrencyGovernor(cpus=8, workers=4, threads_per_job=2).threads_planned() == 8
+    assert ConcurrencyGovernor(cpus=2, workers=4).threads_planned() == 4
+    # An OCR_MAX_WORKERS override beyond the plan
+    assert ConcurrencyGovernor(cpus=8, workers=2).threads_planned(ocr_workers=8) == 16
+
+
+@pytest.mark.parametrize("web_concurrency, workers, ocr_workers", [("1", 1, 4), ("2", 2, 2), ("3", 3, 1), ("8", 8, 1)])
+def test_web_concurrency_sets_the_worker_count(monkeypatch, web_concurrency, workers, ocr_workers):
+    # Read once at import, like the server does
+    monkeypatch.setenv("WEB_CONCURRENCY", web_concurrency)
+    monkeypatch.delenv("OCR_THREADS_PER_JOB", raising=False)
+    try:
+        plan = importlib.reload(concurrency).ConcurrencyGovernor(cpus=4)
+        assert (plan.workers, plan.ocr_workers) == (workers, ocr_workers)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(concurrency)
+
+
+def test_limit_openmp_keeps_explicit_values(monkeypatch):
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+    monkeypatch.setenv("OMP_NUM_THREADS", "3")
+    ConcurrencyGovernor(cpus=8, workers=2, threads_per_job=2).limit_openmp()
+    assert concurrency.os.environ["OMP_THREAD_LIMIT"] == "2"
+    assert concurrency.os.environ["OMP_NUM_THREADS"] == "3"
+
+
+def test_debug_concurrency_flags_oversubscription(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.ocr_pool, "max_workers", 1)
+    monkeypatch.setattr(main, "governor", ConcurrencyGovernor(cpus=2, workers=4))
+    data = client.get("/debug/concurrency").json()
+    assert (data["threads_planned"], data["oversubscribed"]) == (4, True)
+    assert data["plan"]["workers"] == 4
+
+    monkeypatch.setattr(main, "governor", ConcurrencyGovernor(cpus=2, workers=2))
+    data = client.get("/debug/concurrency").json()
+    assert (data["threads_planned"], data["oversubscribed"]) == (2, False)
@@ -0,0 +1,37 @@
+import math
+import random
+
+import cv2
+import pytest
+
+from main import ImageNormalizer, decode_image
+from synthetic_reports import TABLE_COLUMNS, encode_report, render_cbc_report
+
+SKEW = 1.5
+
+
+def photographed_report(seed):
+    """A noisy, slightly turned, re-exposed JPEG of a CBC report, as benchmark.py crop makes them"""
+    rng = random.Random(seed)
+    img, _ = render_cbc_report(rng, noise=6, skew=SKEW)
+    img = cv2.convertScaleAbs(img, alpha=rng.uniform(0.9, 1.1), beta=rng.uniform(-20, 10))
+    page, _ = decode_image(encode_report(img, "jpg", rng.randint(75, 95)))
+    return page
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_crop_keeps_the_label_column(seed):
+    page = photographed_report(seed)
+    _, info = ImageNormalizer.normalize(page, crop=True)
+    if info["roi"] is None:
+        return
+    # Rotation moves the label column's left edge by up to half the page height times sin(skew)
+    label_x = TABLE_COLUMNS[0] + page.shape[0] / 2 * math.sin(math.radians(SKEW))
+    assert info["roi"]["x"] <= label_x, info["roi"]
+
+
+def test_no_crop_when_off():
+    page = photographed_report(0)
+    normalized, info = ImageNormalizer.normalize(page, crop=False)
+    assert info["roi"] is None
+    assert normalized.shape[1] == round(page.shape[1] * info["scale"])
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from deadlines import REQUEST_DEADLINE_MAX_S, REQUEST_DEADLINE_S, Deadline, RequestAborted
+
+
+def make_request(headers=None, disconnected=False):
+    async def receive():
+        return {"type": "http.disconnect"} if disconnected else {"type": "http.request", "body": b"", "more_body": True}
+
+    raw_headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": raw_headers}, receive)
+
+
+def test_seconds_are_clamped():
+    assert Deadline(REQUEST_DEADLINE_MAX_S * 10).seconds == REQUEST_DEADLINE_MAX_S
+    assert Deadline(-1).seconds == 0
+    assert Deadline(-1).expired
+    assert 0 < Deadline(5).remaining() <= 5
+
+
+def test_for_request_prefers_query_then_header_then_default():
+    request = make_request({"X-Request-Timeout": "7"})
+    assert Deadline.for_request(request, 3).seconds == 3
+    assert Deadline.for_request(request).seconds == 7
+    assert Deadline.for_request(make_request()).seconds == min(REQUEST_DEADLINE_S, REQUEST_DEADLINE_MAX_S)
+
+
+@pytest.mark.parametrize("value", ["0", "-2", "soon"])
+def test_for_request_rejects_bad_headers(value):
+    with pytest.raises(ValueError):
+        Deadline.for_request(make_request({"X-Request-Timeout": value}))
+
+
+def test_run_returns_the_stage_result():
+    async def stage():
+        await asyncio.sleep(0.01)
+        return 42
+
+    assert asyncio.run(Deadline(5).run(stage())) == 42
+
+
+def test_run_cancels_a_stage_past_the_deadline():
+    cancelled = []
+
+    async def stage():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        deadline = Deadline(0.05)
+        await deadline.check("ocr")
+        await deadline.run(stage())
+
+    with pytest.raises(RequestAborted) as aborted:
+        asyncio.run(main())
+    assert (aborted.value.reason, aborted.value.stage) == ("deadline", "ocr")
+    assert cancelled
+
+
+def test_check_notices_a_disconnected_client():
+    deadline = Deadline(5, make_request(disconnected=True))
+    with pytest.raises(RequestAborted) as aborted:
+        asyncio.run(deadline.check("decode"))
+    assert aborted.value.reason == "disconnected"
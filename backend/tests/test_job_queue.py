@@ -0,0 +1,152 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from job_queue import JobQueueFullError, JobStore, ProgressWriter
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), max_queued=3, max_attempts=2)
+    yield store
+    store.close()
+
+
+def test_claim_hands_out_the_oldest_job_once(store):
+    first = store.submit("a.png", b"one", {"mode": "fast"}, "hash-a")
+    second = store.submit("b.png", b"two", {"mode": "fast"})
+    assert store.get(second)["queue_position"] == 2
+
+    job = store.claim()
+    assert job["id"] == first
+    assert (job["payload"], job["options"], job["content_hash"]) == (b"one", {"mode": "fast"}, "hash-a")
+    assert store.get(first)["status"] == "running"
+    assert store.get(second)["queue_position"] == 1
+    assert store.claim()["id"] == second
+    assert store.claim() is None
+
+
+def test_submit_refuses_past_max_queued(store):
+    for index in range(3):
+        store.submit(f"{index}.png", b"x", {})
+    with pytest.raises(JobQueueFullError):
+        store.submit("late.png", b"x", {})
+    store.claim()
+    store.submit("late.png", b"x", {})
+
+
+def test_recover_requeues_interrupted_jobs_until_max_attempts(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    crashed = JobStore(path, max_attempts=2, lease_seconds=0)  # Its leases have run out
+    job_id = crashed.submit("a.png", b"one", {})
+    crashed.claim()
+    restarted = JobStore(path, max_attempts=2)
+    assert restarted.recover() == 1
+    assert restarted.get(job_id)["status"] == "queued"
+
+    assert crashed.claim()["payload"] == b"one"  # Second attempt
+    assert restarted.recover() == 0
+    job = restarted.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"]["detail"] == "Job interrupted too many times"
+    crashed.close()
+    restarted.close()
+
+
+def test_recover_leaves_jobs_of_live_processes_alone(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    live = JobStore(path, lease_seconds=0.3)
+    restarting = JobStore(path, lease_seconds=0.3)
+    job_id = live.submit("a.png", b"one", {})
+    assert live.claim()["id"] == job_id
+
+    # Heartbeats keep the job leased well past the lease length
+    for _ in range(4):
+        time.sleep(0.15)
+        assert live.heartbeat() == 1
+        assert restarting.recover() == 0
+        assert restarting.claim() is None
+    assert restarting.heartbeat() == 0  # Not its job
+
+    # Once the live process stops heartbeating, its lease runs out
+    time.sleep(0.35)
+    assert restarting.recover() == 1
+    assert restarting.claim()["id"] == job_id
+    assert live.heartbeat() == 0
+    live.close()
+    restarting.close()
+
+
+def test_old_databases_gain_the_lease_columns(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, options TEXT NOT NULL,"
+        " payload BLOB, content_hash TEXT, attempts INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL,"
+        " started REAL, finished REAL, progress TEXT, result TEXT, error TEXT)"
+    )
+    db.execute("INSERT INTO jobs (id, status, options, payload, attempts, created)"
+               " VALUES ('old', 'running', '{}', x'00', 1, 0)")
+    db.commit()
+    db.close()
+    store = JobStore(path)
+    assert store.recover() == 1  # No lease: left by a process from before leases
+    assert store.claim()["id"] == "old"
+    store.close()
+
+
+def test_finish_and_fail_are_terminal(store):
+    done_id = store.submit("a.png", b"one", {})
+    failed_id = store.submit("b.png", b"two", {})
+    store.claim()
+    store.claim()
+    store.set_progress(done_id, {"passes": 2})
+    assert store.get(done_id)["progress"] == {"passes": 2}
+
+    store.finish(done_id, {"parameters": {}})
+    store.fail(failed_id, 422, "No text found")
+    assert store.get(done_id)["result"] == {"parameters": {}}
+    assert store.get(failed_id)["error"] == {"status_code": 422, "detail": "No text found"}
+    assert store.stats() == {"done": 1, "failed": 1}
+    assert store.recover() == 0
+    assert store.get("missing") is None
+
+
+def test_progress_writes_are_throttled_and_keep_the_loop_free(store, monkeypatch):
+    job_id = store.submit("a.png", b"one", {})
+    store.claim()
+    write = store.set_progress
+
+    def slow_write(job_id, progress):
+        time.sleep(0.2)  # A contended SQLite write
+        write(job_id, progress)
+
+    monkeypatch.setattr(store, "set_progress", slow_write)
+
+    async def main():
+        gaps = []
+
+        async def ticker():
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(0.01)
+                gaps.append(time.monotonic() - started)
+
+        ticking = asyncio.ensure_future(ticker())
+        writer = ProgressWriter(store, job_id, interval=0.25)
+        started = time.monotonic()
+        for index in range(2000):
+            writer.update({"stage": "ocr" if index else "decode", "ocr_passes": index})
+            if index % 20 == 0:
+                await asyncio.sleep(0.005)  # OCR passes finishing
+        passes_time = time.monotonic() - started
+        await writer.close()
+        ticking.cancel()
+        return writer.writes, max(gaps), passes_time
+
+    writes, longest_gap, passes_time = asyncio.run(main())
+    assert longest_gap < 0.1
+    assert writes <= 2 + passes_time / 0.25 + 1
+    assert store.get(job_id)["progress"] == {"stage": "ocr", "ocr_passes": 1999}
@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+from lab_history import LabHistory, parse_report_date
+
+DAY = 86400
+
+
+def report(**values):
+    return {"report_type": {"panel": "CBC"},
+            "parameters": {name: {"value": value, "status": "normal", "confidence": 0.9}
+                           for name, value in values.items()}}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = LabHistory(str(tmp_path / "history.db"))
+    yield history
+    history.close()
+
+
+def test_trends_are_oldest_first_per_parameter(history):
+    # Recorded out of order on purpose
+    history.record("p1", "r3", parse_report_date("2024-03-01"), report(Hemoglobin=12.5, Glucose=95))
+    history.record("p1", "r1", parse_report_date("2024-01-01"), report(Hemoglobin=9.5))
+    history.record("p1", "r2", parse_report_date("2024-02-01"), report(Hemoglobin=11.0, Glucose=110))
+    history.record("p2", "r9", parse_report_date("2024-02-15"), report(Hemoglobin=15.0))
+
+    trends = history.trends("p1")
+    assert [point["value"] for point in trends["Hemoglobin"]] == [9.5, 11.0, 12.5]
+    assert [point["report_id"] for point in trends["Hemoglobin"]] == ["r1", "r2", "r3"]
+    assert trends["Hemoglobin"][0]["date"].startswith("2024-01-01")
+    assert [point["value"] for point in trends["Glucose"]] == [110, 95]
+
+    assert list(history.trends("p1", ["Glucose"])) == ["Glucose"]
+    assert [point["value"] for point in history.trends("p1", limit=2)["Hemoglobin"]] == [11.0, 12.5]
+    assert history.trends("nobody") == {}
+
+
+def test_trends_since_and_until_are_inclusive(history):
+    for month in (1, 2, 3, 4):
+        history.record("p1", f"r{month}", parse_report_date(f"2024-0{month}-01"), report(Hemoglobin=10.0 + month))
+
+    since = history.trends("p1", since=parse_report_date("2024-02-01"))["Hemoglobin"]
+    assert [point["value"] for point in since] == [12.0, 13.0, 14.0]
+    until = history.trends("p1", until=parse_report_date("2024-02-01"))["Hemoglobin"]
+    assert [point["value"] for point in until] == [11.0, 12.0]
+    both = history.trends("p1", since=parse_report_date("2024-01-15"), until=parse_report_date("2024-03-15"))
+    assert [point["value"] for point in both["Hemoglobin"]] == [12.0, 13.0]
+
+
+def test_cohort_below_above_and_since(history):
+    now = time.time()
+    history.record("anemic", "a1", now - 2 * DAY, report(Hemoglobin=8.5))
+    history.record("anemic", "a2", now - DAY, report(Hemoglobin=9.5))
+    history.record("borderline", "b1", now - DAY, report(Hemoglobin=10.0))
+    history.record("high", "h1", now - DAY, report(Hemoglobin=18.0))
+    history.record("old", "o1", now - 60 * DAY, report(Hemoglobin=7.0))
+
+    below = history.cohort("Hemoglobin", below=10)
+    assert [patient["patient_id"] for patient in below] == ["anemic", "old"]
+    assert (below[0]["matches"], below[0]["min"], below[0]["max"]) == (2, 8.5, 9.5)
+
+    recent = history.cohort("Hemoglobin", below=10, since=now - 30 * DAY)
+    assert [patient["patient_id"] for patient in recent] == ["anemic"]
+    assert [patient["patient_id"] for patient in history.cohort("Hemoglobin", above=17)] == ["high"]
+    between = history.cohort("Hemoglobin", below=12, above=9)
+    assert [patient["patient_id"] for patient in between] == ["anemic", "borderline"]
+    assert between[0]["matches"] == 1
+    assert history.cohort("Glucose", below=100) == []
+    assert len(history.cohort("Hemoglobin", above=0, limit=2)) == 2
+
+
+def test_recording_a_report_again_replaces_its_values(history):
+    history.record("p1", "r1", parse_report_date("2024-01-01"), report(Hemoglobin=9.5, Glucose=90))
+    # Same report, corrected date and values; Glucose is gone
+    stored = history.record("p1", "r1", parse_report_date("2024-01-02"), report(Hemoglobin=10.5))
+    assert stored == 1
+
+    trends = history.trends("p1")
+    assert list(trends) == ["Hemoglobin"]
+    assert [(point["date"][:10], point["value"]) for point in trends["Hemoglobin"]] == [("2024-01-02", 10.5)]
+
+
+@pytest.fixture
+def api(client, history, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "lab_history", history)
+    return client
+
+
+def test_history_endpoints(api, history):
+    history.record("p1", "r1", time.time() - DAY, report(Hemoglobin=9.0))
+    history.record("p1", "r2", time.time(), report(Hemoglobin=10.0))
+
+    trends = api.get("/patients/p1/trends", params={"limit": 1}).json()
+    assert [point["value"] for point in trends["parameters"]["Hemoglobin"]["points"]] == [10.0]
+    assert api.get("/patients/p1/trends", params={"since": "yesterday"}).status_code == 400
+
+    cohort = api.get("/cohorts", params={"parameter": "Hemoglobin", "below": 9.5, "days": 0}).json()
+    assert [patient["patient_id"] for patient in cohort["patients"]] == ["p1"]
+    assert api.get("/cohorts", params={"parameter": "Hemoglobin"}).status_code == 400
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/cohorts", {"parameter": "Hemoglobin", "below": 10, "days": -1}),
+    ("/cohorts", {"parameter": "Hemoglobin", "below": 10, "limit": 0}),
+    ("/patients/p1/trends", {"limit": -5}),
+    ("/patients/p1/trends", {"limit": 0}),
+])
+def test_history_endpoints_reject_out_of_range_params(api, path, params):
+    assert api.get(path, params=params).status_code == 422
@@ -0,0 +1,62 @@
+import random
+
+from near_duplicates import MultiIndexHash, NearDuplicateIndex, hamming
+
+
+def flip_bits(key, count, rng):
+    for bit in rng.sample(range(64), count):
+        key ^= 1 << bit
+    return key
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(3)
+    index = MultiIndexHash()
+    keys = {}
+    centres = [rng.getrandbits(64) for _ in range(20)]
+    for value in range(2000):
+        # Clusters, so plenty of entries fall inside the query radius
+        keys[value] = flip_bits(rng.choice(centres), rng.randint(0, 16), rng)
+        index.add(keys[value], value)
+    assert len(index) == 2000
+
+    for _ in range(50):
+        query = flip_bits(rng.choice(centres), rng.randint(0, 6), rng)
+        for radius in (0, 4, 10, 13):
+            expected = sorted((hamming(query, key), value) for value, key in keys.items()
+                              if hamming(query, key) <= radius)
+            found = index.search(query, radius)
+            assert sorted(found) == expected
+            assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_add_replaces_and_remove_forgets():
+    index = MultiIndexHash()
+    index.add(0, "page")
+    index.add((1 << 64) - 1, "page")
+    assert len(index) == 1
+    assert index.search(0, 10) == []
+    assert index.search((1 << 64) - 1, 0) == [(0, "page")]
+
+    index.remove("page")
+    index.remove("missing")
+    assert len(index) == 0
+    assert index.search((1 << 64) - 1, 64) == []
+
+
+def test_index_needs_both_hashes_and_the_same_scope():
+    index = NearDuplicateIndex(max_entries=10, phash_distance=10, dhash_distance=14)
+    index.add(0b1011, 0b1111, "rules-a", "result-1")
+    assert index.lookup(0b1010, 0b1110, "rules-a") == [(1, "result-1")]
+    assert index.lookup(0b1010, 0b1110, "rules-b") == []
+    assert index.lookup(0b1010, (1 << 20) - 1, "rules-a") == []  # dHash 16 bits away
+
+
+def test_index_drops_the_oldest_entries():
+    index = NearDuplicateIndex(max_entries=2)
+    far_apart = [0, (1 << 32) - 1, (1 << 64) - 1]
+    for number, phash in enumerate(far_apart):
+        index.add(phash, 0, "scope", f"result-{number}")
+    assert index.lookup(far_apart[0], 0, "scope") == []
+    assert index.lookup(far_apart[2], 0, "scope") == [(0, "result-2")]
+    assert index.stats()["entries"] == 2
@@ -0,0 +1,100 @@
+import warnings
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+LogisticRegression = pytest.importorskip("sklearn.linear_model").LogisticRegression
+
+from predict import RiskModel, parse_records
+
+
+def fitted_model():
+    """Anemia below Hb 12, fitted on a DataFrame like the shipped model"""
+    frame = pd.DataFrame({"Hb": [7.0, 8.5, 10.0, 11.0, 13.0, 14.0, 15.5, 17.0]})
+    return LogisticRegression().fit(frame, [1, 1, 1, 1, 0, 0, 0, 0])
+
+
+@pytest.fixture
+def model():
+    return RiskModel(fitted_model())
+
+
+@pytest.fixture
+def api(client, model, monkeypatch):
+    from main import app
+
+    monkeypatch.setattr(app.state, "risk_model", model)
+    return client
+
+
+def test_fitted_feature_names_are_kept_and_used(model):
+    assert list(model.model.feature_names_in_) == ["Hb"]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        results = model.predict([{"Hb": 8.0}, {"Hb": 16.0}])
+    assert [result["prediction"] for result in results] == ["Anemia risk", "Normal"]
+
+
+def test_invalid_records_get_errors_and_the_rest_are_scored_together(model, monkeypatch):
+    calls = []
+    predict_proba = model.model.predict_proba
+
+    def counting(features):
+        calls.append(len(features))
+        return predict_proba(features)
+
+    monkeypatch.setattr(model.model, "predict_proba", counting)
+    results = model.predict([{"Hb": 8.0}, "not a record", {"Glucose": 90}, {"Hb": "low"}, {"Hb": 16.0}])
+
+    assert calls == [2]
+    assert results[0]["risk"] == 1 and results[4]["risk"] == 0
+    assert results[1] == {"prediction": None, "error": "Record must be an object"}
+    assert results[2] == {"prediction": None, "error": "Missing or invalid: Hb"}
+    assert results[3]["error"] == "Missing or invalid: Hb"
+    assert 0 <= results[0]["probability"] <= 1
+
+
+@pytest.mark.parametrize("record", [
+    {"Hb": 8.0},
+    {"Hemoglobin": 8.0},
+    {"Haemoglobin": "8.0"},
+    {"Hemoglobin": {"value": 8.0, "unit": "g/dL"}},
+])
+def test_feature_aliases(model, record):
+    assert model.predict([record])[0]["prediction"] == "Anemia risk"
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), "-inf"])
+def test_non_finite_values_are_rejected(model, value):
+    assert model.predict([{"Hb": value}])[0]["error"] == "Missing or invalid: Hb"
+
+
+def test_parse_records_forms():
+    assert parse_records([{"Hb": 8}]) == ([{"Hb": 8}], True)
+    assert parse_records({"records": [{"Hb": 8}]}) == ([{"Hb": 8}], True)
+    assert parse_records({"parameters": {"Hemoglobin": {"value": 8}}}) == ([{"Hemoglobin": {"value": 8}}], False)
+    assert parse_records({"Hb": 8}) == ([{"Hb": 8}], False)
+
+
+def test_predict_batch_forms(api):
+    records = [{"Hb": 8.0}, {"Hemoglobin": 16.0}, {"Hb": None}]
+    for body in (records, {"records": records}):
+        response = api.post("/predict", json=body)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 3
+        assert [p["prediction"] for p in data["predictions"]] == ["Anemia risk", "Normal", None]
+        assert data["predictions"][2]["error"] == "Missing or invalid: Hb"
+
+
+def test_predict_single_forms(api):
+    assert api.post("/predict", json={"Hb": 8.0}).json()["prediction"] == "Anemia risk"
+    response = api.post("/predict", json={"parameters": {"Hemoglobin": {"value": 16.0, "unit": "g/dL"}}})
+    assert response.status_code == 200
+    assert response.json()["prediction"] == "Normal"
+
+
+@pytest.mark.parametrize("body", ['"Hb"', "42", '{"Hb": NaN}', '{"Hb": Infinity}', '{"Hb": "inf"}'])
+def test_predict_rejects_bad_single_records(api, body):
+    response = api.post("/predict", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+import result_cache as result_cache_module
+from result_cache import ResultCache
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache_module.time, "time", clock)
+    return clock
+
+
+def test_memory_tier_evicts_the_least_recently_used(clock):
+    cache = ResultCache(max_entries=2, ttl_seconds=0, disk_path="")
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    assert cache.get("a") == ({"n": 1}, "memory")  # "b" is now the oldest
+    cache.put("c", {"n": 3})
+
+    assert cache.get("b") == (None, None)
+    assert cache.get("a")[0] == {"n": 1}
+    assert cache.get("c")[0] == {"n": 3}
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_the_ttl(clock, tmp_path):
+    cache = ResultCache(max_entries=4, ttl_seconds=60, disk_path=str(tmp_path / "cache.db"))
+    cache.put("key", {"n": 1})
+    clock.now += 59
+    assert cache.get("key")[1] == "memory"
+
+    clock.now += 2
+    assert cache.get("key") == (None, None)
+    stats = cache.stats()
+    assert stats["expired"] >= 1
+    assert stats["misses"] == 1
+    cache.close()
+
+
+def test_disk_hits_are_promoted_into_memory(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResultCache(max_entries=4, ttl_seconds=3600, disk_path=path)
+    first.put("key", {"parameters": {"Hb": 13.5}})
+    first.close()
+
+    # A restart keeps only the disk tier
+    cache = ResultCache(max_entries=4, ttl_seconds=3600, disk_path=path)
+    assert cache.get("key") == ({"parameters": {"Hb": 13.5}}, "disk")
+    assert cache.get("key") == ({"parameters": {"Hb": 13.5}}, "memory")
+    cache.close()
+
+
+def test_values_are_copies():
+    cache = ResultCache(max_entries=4, ttl_seconds=0, disk_path="")
+    value = {"parameters": {"Hb": 13.5}}
+    cache.put("key", value)
+    value["parameters"]["Hb"] = 0
+    cached, _ = cache.get("key")
+    cached["parameters"]["Hb"] = 1
+    assert cache.get("key")[0] == {"parameters": {"Hb": 13.5}}
+
+
+def test_counters_and_hit_rate(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResultCache(disk_path=path).put("on-disk", {"n": 0})
+    cache = ResultCache(max_entries=4, ttl_seconds=0, disk_path=path)
+    cache.put("key", {"n": 1})
+    cache.get("key")
+    cache.get("key")
+    cache.get("on-disk")
+    cache.get("missing")
+
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (2, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(0.75)
+    assert stats["disk_tier"]
+    cache.close()
+
+
+def test_key_joins_every_part():
+    key = ResultCache.make_key("abc", "rules-1", "cascade", 300)
+    assert key == "abc:rules-1:cascade:300"
+    assert key != ResultCache.make_key("abc", "rules-2", "cascade", 300)
+    assert key != ResultCache.make_key("abc", "rules-1", "layout", 300)
+    assert key != ResultCache.make_key("abc", "rules-1", "cascade", 200)
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    """analyze_contents with a fresh cache and fake OCR stages that report the given stop reason"""
+    import main
+
+    cache = ResultCache(max_entries=16, ttl_seconds=0, disk_path="")
+    monkeypatch.setattr(main, "result_cache", cache)
+    calls = []
+    stop_reason = {"value": "complete"}
+
+    async def fake_stage(contents, filename, extraction, *args, **kwargs):
+        calls.append(filename)
+        extraction.add_text("Hemoglobin 13.5 g/dL")
+        return {"ocr_passes": 1, "ocr_stop_reason": stop_reason["value"]}
+
+    monkeypatch.setattr(main, "analyze_image", fake_stage)
+    monkeypatch.setattr(main, "analyze_pdf", fake_stage)
+
+    def analyze(contents=b"image", reason="complete", **kwargs):
+        stop_reason["value"] = reason
+        return asyncio.run(main.analyze_contents(contents, f"report-{len(calls)}", **kwargs))
+
+    analyze.calls = calls
+    analyze.cache = cache
+    return analyze
+
+
+def test_analysis_is_served_from_the_cache(analysis):
+    first = analysis(mode="cascade")
+    second = analysis(mode="cascade")
+    assert first["processing_info"]["cache"] == "miss"
+    assert second["processing_info"]["cache"] == "memory"
+    assert second["parameters"] == first["parameters"]
+    assert len(analysis.calls) == 1
+
+
+def test_mode_dpi_and_rules_version_change_the_key(analysis, monkeypatch):
+    import main
+
+    analysis(mode="cascade")
+    assert analysis(mode="layout")["processing_info"]["cache"] == "miss"
+
+    analysis(b"%PDF-1.4", mode="cascade", dpi=300)
+    assert analysis(b"%PDF-1.4", mode="cascade", dpi=300)["processing_info"]["cache"] == "memory"
+    assert analysis(b"%PDF-1.4", mode="cascade", dpi=200)["processing_info"]["cache"] == "miss"
+
+    monkeypatch.setattr(main, "PIPELINE_VERSION", main.PIPELINE_VERSION + "-next")
+    assert analysis(mode="cascade")["processing_info"]["cache"] == "miss"
+    assert len(analysis.calls) == 5
+
+
+@pytest.mark.parametrize("reason", ["time_budget", "deadline"])
+def test_analyses_cut_short_are_not_stored(analysis, reason):
+    assert analysis(reason=reason)["processing_info"]["ocr_stop_reason"] == reason
+    assert analysis.cache.stats()["entries"] == 0
+    assert analysis()["processing_info"]["cache"] == "miss"
+    assert len(analysis.calls) == 2
@@ -0,0 +1,53 @@
+import asyncio
+import hashlib
+import io
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import UploadFile
+
+from uploads import UnsupportedUploadError, UploadTooLargeError, jpeg_size, read_upload, sniff_kind
+
+PNG = cv2.imencode(".png", np.full((40, 60), 255, np.uint8))[1].tobytes()
+JPEG = cv2.imencode(".jpg", np.full((40, 60, 3), 255, np.uint8))[1].tobytes()
+
+
+def read(data, **kwargs):
+    return asyncio.run(read_upload(UploadFile(io.BytesIO(data), filename="report"), **kwargs))
+
+
+def test_reads_in_chunks_and_hashes():
+    upload = read(PNG, chunk_size=16)
+    assert upload.kind == "png"
+    assert bytes(upload.contents) == PNG
+    assert upload.size == len(PNG)
+    assert upload.sha256 == hashlib.sha256(PNG).hexdigest()
+
+
+def test_rejects_oversized_uploads():
+    with pytest.raises(UploadTooLargeError):
+        read(PNG, max_bytes=len(PNG) - 1, chunk_size=16)
+    assert read(PNG, max_bytes=len(PNG)).size == len(PNG)
+
+
+@pytest.mark.parametrize("data", [b"hello, not an image", b"<svg></svg>", b"PK\x03\x04zip archive"])
+def test_rejects_unsupported_formats(data):
+    with pytest.raises(UnsupportedUploadError):
+        read(data)
+
+
+def test_zip_only_where_allowed():
+    assert read(b"PK\x03\x04rest", kinds=("png", "zip")).kind == "zip"
+
+
+def test_sniff_kind():
+    assert sniff_kind(JPEG[:16]) == "jpeg"
+    assert sniff_kind(b"%PDF-1.7\n") == "pdf"
+    assert sniff_kind(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert sniff_kind(b"GIF89a") is None
+
+
+def test_jpeg_size_reads_the_frame_header():
+    assert jpeg_size(JPEG) == (60, 40)
+    assert jpeg_size(PNG) is None
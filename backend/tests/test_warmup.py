@@ -0,0 +1,54 @@
+import pytest
+
+import main
+from main import app
+
+
+@pytest.fixture
+def warm_up(client, monkeypatch):
+    """Runs warm_up() on the client's event loop with the given OCR pass results, then restores readiness"""
+    ready, startup = app.state.ready, app.state.startup
+
+    def run(ocr_results):
+        async def fake_map(fn, jobs):
+            return ocr_results
+
+        monkeypatch.setattr(main.ocr_pool, "map", fake_map)
+        app.state.ready = False
+        app.state.startup = {**startup, "warmup_ms": {}, "warmup_failures": {}}
+        client.portal.call(main.warm_up)
+        return client.get("/health")
+
+    yield run
+    app.state.ready, app.state.startup = ready, startup
+
+
+def test_ocr_that_reads_nothing_keeps_the_worker_unready(warm_up):
+    response = warm_up([("", 0.1), ("  \n", 0.1), (None, 0.1)])
+    assert response.status_code == 503
+    health = response.json()
+    assert (health["status"], health["ready"]) == ("degraded", False)
+    assert health["startup"]["warmup_failures"] == {"ocr": "no warm-up OCR pass read any text"}
+
+
+def test_ocr_that_crashes_keeps_the_worker_unready(warm_up, monkeypatch):
+    def broken_image():
+        raise RuntimeError("tessdata missing")
+
+    monkeypatch.setattr(main, "warmup_image", broken_image)
+    response = warm_up([])
+    assert response.status_code == 503
+    assert response.json()["startup"]["warmup_failures"] == {"ocr": "tessdata missing"}
+
+
+def test_other_failed_phases_are_recorded_but_do_not_block(warm_up, monkeypatch):
+    async def no_model():
+        raise RuntimeError("model file missing")
+
+    monkeypatch.setattr(app.state, "risk_model", None)
+    monkeypatch.setattr(main, "load_risk_model", no_model)
+    response = warm_up([("Hemoglobin 13.5 g/dl", 0.1)])
+    assert response.status_code == 200
+    health = response.json()
+    assert (health["status"], health["ready"]) == ("healthy", True)
+    assert health["startup"]["warmup_failures"] == {"model": "model file missing"}
@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import os
+from typing import Iterable, Optional, Tuple
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Upload limits (the multipart parser spools bodies to disk, these bound what we pull into memory)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(30 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+# Leading bytes of every format the pipeline can decode
+MAGIC_BYTES = [
+    ("jpeg", 0, b"\xff\xd8\xff"),
+    ("png", 0, b"\x89PNG\r\n\x1a\n"),
+    ("tiff", 0, b"II*\x00"),
+    ("tiff", 0, b"MM\x00*"),
+    ("bmp", 0, b"BM"),
+    ("webp", 8, b"WEBP"),
+    ("jp2", 4, b"jP  "),
+    ("pnm", 0, b"P4"),
+    ("pnm", 0, b"P5"),
+    ("pnm", 0, b"P6"),
+    ("pdf", 0, b"%PDF-"),
+    ("zip", 0, b"PK\x03\x04"),
+]
+
+REPORT_KINDS = ("jpeg", "png", "tiff", "bmp", "webp", "jp2", "pnm", "pdf")
+
+
+class UploadError(Exception):
+    """Base class for rejected uploads"""
+
+
+class UploadTooLargeError(UploadError):
+    """Raised as soon as an upload grows past the size limit"""
+
+
+class UnsupportedUploadError(UploadError):
+    """Raised when the leading bytes don't match a supported format"""
+
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """File format from the leading bytes, or None"""
+    for kind, offset, magic in MAGIC_BYTES:
+        if head[offset:offset + len(magic)] == magic:
+            return kind
+    return None
+
+
+def jpeg_size(buffer) -> Optional[Tuple[int, int]]:
+    """(width, height) from the JPEG frame header, without decoding"""
+    i, n = 2, len(buffer)
+    while i + 9 <= n:
+        if buffer[i] != 0xFF:
+            return None
+        marker = buffer[i + 1]
+        if marker == 0xFF:  # Fill byte
+            i += 1
+            continue
+        # Start-of-frame markers (C4, C8 and CC are tables, not frames)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = (buffer[i + 5] << 8) | buffer[i + 6]
+            width = (buffer[i + 7] << 8) | buffer[i + 8]
+            return width, height
+        i += 2 + ((buffer[i + 2] << 8) | buffer[i + 3])
+    return None
+
+
+class Upload:
+    """An upload read into one buffer, with its format and content hash"""
+
+    def __init__(self, contents: bytearray, kind: str, sha256: str):
+        self.contents = contents
+        self.kind = kind
+        self.sha256 = sha256
+
+    @property
+    def size(self) -> int:
+        return len(self.contents)
+
+
+async def read_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES,
+                      kinds: Iterable[str] = REPORT_KINDS, chunk_size: int = UPLOAD_CHUNK_BYTES) -> Upload:
+    """Read an upload in chunks, checking its format on the first chunk and its size as it grows
+
+    The bytes go into a single bytearray that the decoders read in place,
+    and the sha256 for the result cache is computed along the way.
+    """
+    buffer = bytearray()
+    digest = hashlib.sha256()
+    kind = None
+
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > max_bytes:
+            raise UploadTooLargeError(f"File larger than {max_bytes} bytes")
+        if kind is None:
+            kind = sniff_kind(chunk)
+            if kind not in kinds:
+                raise UnsupportedUploadError("Unsupported file format")
+        digest.update(chunk)
+        buffer += chunk
+
+    return Upload(buffer, kind, digest.hexdigest())